@@ -0,0 +1,103 @@
+import numpy as np
+
+# Rates are quoted on business days
+TRADING_DAYS = 252
+
+VOLATILITY_WINDOW = 20
+SMA_WINDOWS = (20, 50)
+EMA_SPANS = (12, 26)
+
+
+def volatility(log_returns):
+    """Annualized standard deviation of daily log returns"""
+    if len(log_returns) < 2:
+        return None
+    return float(np.std(log_returns, ddof=1) * np.sqrt(TRADING_DAYS))
+
+
+def rolling_volatility(log_returns, window):
+    """Annualized volatility of every ``window`` consecutive returns, from running sums"""
+    if len(log_returns) < window:
+        return np.empty(0)
+    sums = np.concatenate([[0.0], np.cumsum(log_returns)])
+    squares = np.concatenate([[0.0], np.cumsum(log_returns ** 2)])
+    window_sums = sums[window:] - sums[:-window]
+    window_squares = squares[window:] - squares[:-window]
+    variance = (window_squares - window_sums ** 2 / window) / (window - 1)
+    return np.sqrt(np.maximum(variance, 0.0) * TRADING_DAYS)
+
+
+def sma(rates, window):
+    """Mean of the last ``window`` rates"""
+    return float(rates[-window:].mean()) if len(rates) >= window else None
+
+
+def ema(rates, span):
+    """Latest exponential moving average, seeded with the first rate.
+
+    The recursion ``ema = a * rate + (1 - a) * ema`` unrolls to a weighted
+    sum of the rates, computed here as one dot product.
+    """
+    if not len(rates):
+        return None
+    alpha = 2 / (span + 1)
+    weights = (1 - alpha) ** np.arange(len(rates) - 1, -1, -1, dtype=np.float64)
+    weights[1:] *= alpha
+    return float(weights @ rates)
+
+
+def max_drawdown(dates, rates):
+    """Largest fall from a running peak as {'value', 'peak', 'trough'}"""
+    if not len(rates):
+        return None
+    drawdowns = rates / np.maximum.accumulate(rates) - 1
+    trough = int(drawdowns.argmin())
+    peak = int(rates[:trough + 1].argmax())
+    return {
+        'value': float(drawdowns[trough]),
+        'peak': str(dates[peak]),
+        'trough': str(dates[trough]),
+    }
+
+
+def series_stats(dates, rates):
+    """Summary statistics of one pair's daily series"""
+    rates = np.asarray(rates, dtype=np.float64)
+    if not len(rates):
+        return {'points': 0}
+    log_returns = np.diff(np.log(rates))
+    rolling = rolling_volatility(log_returns, VOLATILITY_WINDOW)
+    low, high = int(rates.argmin()), int(rates.argmax())
+    return {
+        'points': len(rates),
+        'start': str(dates[0]),
+        'end': str(dates[-1]),
+        'last': float(rates[-1]),
+        'change': float(rates[-1] / rates[-2] - 1) if len(rates) > 1 else None,
+        'return': float(rates[-1] / rates[0] - 1),
+        'volatility': volatility(log_returns),
+        'rolling_volatility': float(rolling[-1]) if len(rolling) else None,
+        'sma': {str(window): sma(rates, window) for window in SMA_WINDOWS},
+        'ema': {str(span): ema(rates, span) for span in EMA_SPANS},
+        'min': {'rate': float(rates[low]), 'date': str(dates[low])},
+        'max': {'rate': float(rates[high]), 'date': str(dates[high])},
+        'max_drawdown': max_drawdown(dates, rates),
+    }
+
+
+def top_movers(changes, k):
+    """Indices of the ``k`` largest and ``k`` smallest finite changes, largest/smallest first.
+
+    argpartition picks them without sorting the whole array.
+    """
+    finite = np.flatnonzero(np.isfinite(changes))
+    k = min(k, len(finite))
+    if not k:
+        return [], []
+    values = changes[finite]
+    gainers = finite[np.argpartition(-values, k - 1)[:k]]
+    losers = finite[np.argpartition(values, k - 1)[:k]]
+    return (
+        gainers[np.argsort(-changes[gainers], kind='stable')].tolist(),
+        losers[np.argsort(changes[losers], kind='stable')].tolist(),
+    )
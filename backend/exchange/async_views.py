@@ -0,0 +1,163 @@
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+
+from .cache import acached_or_build
+from .formats import SERIES_FORMATS
+from .payloads import (
+    historical_key, historical_payload, latest_key, latest_payload, previous_key, previous_payload,
+)
+from .rate_matrix import aget_rate_matrix, get_rate_matrix
+from .responses import (
+    add_validators, encoded_response, not_modified_response, preferred_encoding, validator_etag, variant_etag,
+    variant_name,
+)
+from .views import (
+    amount_param, as_of_row, converted, currency_param, downsampling_params, period_param, rate_as_of,
+    snapshot_as_of, snapshot_rate,
+)
+
+
+def series_format(request):
+    """The series format asked for with ?format= or Accept, 'json' by default"""
+    fmt = request.GET.get('format')
+    if fmt:
+        if fmt != 'json' and fmt not in SERIES_FORMATS:
+            raise Http404(f'Unsupported format {fmt!r}')
+        return fmt
+    accepted = {media.split(';')[0].strip() for media in request.META.get('HTTP_ACCEPT', '').split(',')}
+    for fmt, (media_type, _) in SERIES_FORMATS.items():
+        if media_type in accepted:
+            return fmt
+    return 'json'
+
+
+async def cached_rates_response(request, cache_key, build_payload, fmt='json'):
+    """ExchangeRateViewSet.cached_rates_response without DRF or renderers.
+
+    Serves the JSON body, or ``fmt`` for payloads cached in series formats.
+
+    Hits are answered on the event loop from the local tier or one round
+    trip over the pooled async Redis client; only building and encoding a
+    payload on a miss, which may load matrix columns, runs in a thread.
+    """
+    def build():
+        return build_payload(get_rate_matrix())
+
+    encoding = preferred_encoding(request)
+    variant = variant_name(fmt, encoding)
+    cached = await acached_or_build(cache_key, variant, build)
+
+    etag = variant_etag(cached.etag, variant)
+    response = (
+        not_modified_response(request, etag, cached.modified)
+        or encoded_response(cached.body, cached.etag, encoding, fmt)
+    )
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    return add_validators(response, etag, cached.modified)
+
+
+async def as_of_response(request, base, offset=0):
+    """ExchangeRateViewSet.as_of_response"""
+    matrix = await aget_rate_matrix()
+    day = matrix.last_date
+    etag = validator_etag(request, day)
+    response = not_modified_response(request, etag, day)
+    if response is None:
+        try:
+            data = await sync_to_async(snapshot_as_of)(matrix, request.GET, base, offset)
+        except ValidationError as error:
+            return JsonResponse(error.detail, status=400)
+        response = JsonResponse(data)
+    return add_validators(response, etag, day)
+
+
+@require_GET
+async def latest(request):
+    try:
+        base = currency_param(request.GET, 'base', await aget_rate_matrix(), 'USD')
+    except ValidationError as error:
+        return JsonResponse(error.detail, status=400)
+    if request.GET.get('as_of'):
+        return await as_of_response(request, base)
+    return await cached_rates_response(
+        request, latest_key(base),
+        lambda matrix: latest_payload(matrix, base),
+    )
+
+
+@require_GET
+async def previous(request):
+    try:
+        base = currency_param(request.GET, 'base', await aget_rate_matrix(), 'USD')
+    except ValidationError as error:
+        return JsonResponse(error.detail, status=400)
+    if request.GET.get('as_of'):
+        return await as_of_response(request, base, offset=1)
+    return await cached_rates_response(
+        request, previous_key(base),
+        lambda matrix: previous_payload(matrix, base),
+    )
+
+
+@require_GET
+async def historical(request):
+    """ExchangeRateViewSet.historical over a period; start/end ranges are only served there"""
+    matrix = await aget_rate_matrix()
+    try:
+        if 'start' in request.GET or 'end' in request.GET:
+            raise ValidationError({'start': 'start/end are only supported by /api/exchange-rates/historical/.'})
+        from_currency = currency_param(request.GET, 'from', matrix, 'USD')
+        to_currency = currency_param(request.GET, 'to', matrix, 'EUR')
+        period = period_param(request.GET)
+        points, resolution = downsampling_params(request.GET)
+    except ValidationError as error:
+        return JsonResponse(error.detail, status=400)
+
+    return await cached_rates_response(
+        request, historical_key(from_currency, to_currency, period, points, resolution),
+        lambda matrix: historical_payload(matrix, from_currency, to_currency, period, points, resolution),
+        series_format(request),
+    )
+
+
+@require_GET
+async def convert(request):
+    """Currency conversion calculator"""
+    matrix = await aget_rate_matrix()
+    day = matrix.last_date
+    etag = validator_etag(request, day)
+    response = not_modified_response(request, etag, day)
+    if response is None:
+        from_currency = request.GET.get('from', 'USD')
+        to_currency = request.GET.get('to', 'EUR')
+
+        try:
+            amount = amount_param(request.GET)
+            i = as_of_row(matrix, request.GET)
+            if i is None:
+                snapshot = matrix.latest_snapshot(build=False) or await sync_to_async(matrix.latest_snapshot)()
+                rate, row_date = snapshot_rate(matrix, snapshot, from_currency, to_currency), snapshot.date
+            else:
+                rate = await sync_to_async(rate_as_of)(matrix, i, from_currency, to_currency)
+                row_date = matrix.date_at(i)
+            result = converted(amount, rate)
+        except ValidationError as error:
+            return JsonResponse(error.detail, status=400)
+        data = {
+            'from': from_currency,
+            'to': to_currency,
+            'amount': float(amount),
+            'rate': float(rate),
+            'result': float(result),
+            'date': row_date,
+        }
+        if i is not None:
+            data['as_of'] = request.GET['as_of']
+        response = JsonResponse(data)
+    if 200 <= response.status_code < 400:
+        add_validators(response, etag, day)
+    return response
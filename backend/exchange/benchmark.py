@@ -0,0 +1,198 @@
+import json
+import platform
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+from django.db import connection
+from django_redis import get_redis_connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .cache import CACHE_INDEX_KEY, CACHE_UNTIL_KEY, _lock_key, _stale_key, local_cache
+from .ingest import load_exchange_rates
+from .payloads import PERIODS
+from .rate_matrix import GENERATION_KEY, _matrix
+
+# Quoted against USD; the first len(...) of these make up a synthetic dataset
+CURRENCIES = (
+    'EUR', 'GBP', 'JPY', 'CHF', 'CAD', 'AUD', 'NZD', 'CNY', 'HKD', 'SGD',
+    'SEK', 'NOK', 'DKK', 'PLN', 'CZK', 'HUF', 'TRY', 'ZAR', 'MXN', 'BRL',
+    'INR', 'KRW', 'THB', 'IDR', 'MYR', 'PHP', 'ILS', 'AED', 'SAR', 'RON',
+    'BGN', 'ISK', 'CLP', 'COP', 'PEN', 'ARS', 'EGP', 'NGN', 'KES', 'VND',
+)
+
+# (name, url, query params) of every benchmarked request
+ENDPOINTS = [
+    ('latest', '/api/exchange-rates/latest/', {'base': 'EUR'}),
+    ('previous', '/api/exchange-rates/previous/', {'base': 'EUR'}),
+    *[
+        (f'historical_{period}', '/api/exchange-rates/historical/', {'from': 'USD', 'to': 'EUR', 'period': period})
+        for period in PERIODS
+    ],
+    ('convert', '/api/exchange-rates/convert/', {'amount': '100', 'from': 'EUR', 'to': 'GBP'}),
+    ('codes_and_names', '/api/currencies/codes_and_names/', {}),
+]
+
+PERCENTILES = (50, 95, 99)
+
+
+def synthetic_days(years, currencies=30, end=None, seed=0):
+    """(base, date, rates) for ``years`` of business days up to ``end``, oldest first.
+
+    Rates are a seeded log-normal random walk per currency, so a dataset
+    is the same on every run and a shorter one is the tail of a longer one.
+    """
+    end = end or date.today()
+    codes = CURRENCIES[:currencies]
+    days = np.arange(
+        np.datetime64(end - timedelta(days=round(years * 365.25)), 'D') + 1, np.datetime64(end, 'D') + 1,
+    )
+    days = days[np.is_busday(days)]
+
+    # Walk backwards from the end, so the draws for the latest days are the
+    # same whatever the length
+    rng = np.random.default_rng(seed)
+    latest = rng.uniform(0.5, 150, len(codes))
+    steps = rng.normal(0, 0.005, (len(days), len(codes)))
+    steps[0] = 0
+    levels = (np.exp(np.cumsum(steps, axis=0)) * latest)[::-1]
+    for day, row in zip(days.tolist(), levels.round(6).tolist()):
+        yield 'USD', day, dict(zip(codes, row))
+
+
+def clear_rate_state(written):
+    """Drop the cached payloads the benchmark wrote and the in-process rate matrix.
+
+    ``written`` collects every payload key indexed so far, so copies that
+    later evictions renamed to ``:stale`` go too. Nothing is published:
+    other processes never hear of the benchmark.
+    """
+    redis_conn = get_redis_connection("default")
+    written.update(
+        key.decode() if isinstance(key, bytes) else key for key in redis_conn.zrange(CACHE_INDEX_KEY, 0, -1)
+    )
+    keys = [variant for key in written for variant in (key, _stale_key(key), _lock_key(key))]
+    if keys:
+        redis_conn.delete(*keys)
+    redis_conn.delete(CACHE_INDEX_KEY, CACHE_UNTIL_KEY, GENERATION_KEY)
+    local_cache().clear()
+    _matrix.reset()
+
+
+def summarize(samples, queries):
+    """Latency percentiles (ms) of ``samples`` (ns) and the most queries one request made"""
+    ms = np.array(samples, dtype=np.float64) / 1e6
+    summary = {f'p{q}': round(float(np.percentile(ms, q)), 3) for q in PERCENTILES}
+    summary.update(mean=round(float(ms.mean()), 3), samples=len(ms), queries=max(queries))
+    return summary
+
+
+def _timed_get(client, url, params):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter_ns()
+        response = client.get(url, params)
+        elapsed = time.perf_counter_ns() - started
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {url} {params} answered {response.status_code}')
+    return elapsed, len(queries)
+
+
+def bench_endpoint(client, url, params, cold_iterations, iterations, written):
+    """{'cold': summary, 'warm': summary} for one request.
+
+    Cold requests start without cached payloads or a loaded rate matrix,
+    as after a deploy; warm ones repeat the request once it's cached.
+    """
+    cold_times, cold_queries = [], []
+    for _ in range(cold_iterations):
+        clear_rate_state(written)
+        elapsed, count = _timed_get(client, url, params)
+        cold_times.append(elapsed)
+        cold_queries.append(count)
+
+    _timed_get(client, url, params)
+    warm_times, warm_queries = [], []
+    for _ in range(iterations):
+        elapsed, count = _timed_get(client, url, params)
+        warm_times.append(elapsed)
+        warm_queries.append(count)
+    return {'cold': summarize(cold_times, cold_queries), 'warm': summarize(warm_times, warm_queries)}
+
+
+def run_benchmarks(years=(1, 10, 50), currencies=30, iterations=50, cold_iterations=5, endpoints=None, progress=None):
+    """Benchmark ENDPOINTS against synthetic datasets of each of ``years``.
+
+    Datasets are loaded shortest first into the current database, each
+    one extending the last back in time. ``endpoints`` limits the run to
+    those names; ``progress(message)`` is called as results come in.
+    Cached payloads go to the configured Redis, so it must be one only the
+    benchmark uses (see the benchmark_rates command); they're deleted at
+    the end. Returns {'meta': {...}, 'results': {'<years>y/<endpoint>/<cold|warm>': summary}}.
+    """
+    client = Client()
+    selected = [endpoint for endpoint in ENDPOINTS if endpoints is None or endpoint[0] in endpoints]
+    results = {}
+    written = set()
+    try:
+        for size in sorted(years):
+            started = time.monotonic()
+            loaded = load_exchange_rates(synthetic_days(size, currencies))
+            clear_rate_state(written)
+            if progress:
+                progress(f'{size}y: loaded {len(loaded)} days in {time.monotonic() - started:.1f}s')
+
+            for name, url, params in selected:
+                timings = bench_endpoint(client, url, params, cold_iterations, iterations, written)
+                for state, summary in timings.items():
+                    results[f'{size}y/{name}/{state}'] = summary
+                if progress:
+                    progress(
+                        f'{size}y {name}: cold p50 {timings["cold"]["p50"]:.2f}ms, '
+                        f'warm p50 {timings["warm"]["p50"]:.2f}ms p99 {timings["warm"]["p99"]:.2f}ms'
+                    )
+    finally:
+        clear_rate_state(written)
+
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'currencies': currencies,
+            'iterations': iterations,
+            'cold_iterations': cold_iterations,
+        },
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold=0.25, min_ms=1.0, metric='p95'):
+    """Regressions of ``results`` against ``baseline`` (both run_benchmarks output).
+
+    A result regresses when its ``metric`` grew by more than ``threshold``
+    (a fraction) and by more than ``min_ms``, which keeps sub-millisecond
+    noise out, or when it made more queries. Results missing on either
+    side are skipped. Returns [(key, what, baseline value, current value)].
+    """
+    regressions = []
+    for key, current in sorted(results['results'].items()):
+        before = baseline['results'].get(key)
+        if before is None:
+            continue
+        if current[metric] > before[metric] * (1 + threshold) and current[metric] - before[metric] > min_ms:
+            regressions.append((key, metric, before[metric], current[metric]))
+        if current['queries'] > before['queries']:
+            regressions.append((key, 'queries', before['queries'], current['queries']))
+    return regressions
+
+
+def write_results(results, path):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def read_results(path):
+    with open(path, 'r') as file:
+        return json.load(file)
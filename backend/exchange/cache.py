@@ -0,0 +1,680 @@
+import asyncio
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import date
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis import WatchError
+from redis import asyncio as aioredis
+
+from .instrumentation import metrics, timed
+from .payloads import (
+    PERIODS, historical_key, historical_payload, latest_key, latest_payload, previous_key, previous_payload,
+)
+from .rate_matrix import GENERATION_KEY, get_rate_matrix, mark_rates_changed, matrix_generation, read_generation
+from .responses import ALL_VARIANTS, encode_payload
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of every cached rates payload, scored by the ordinal of the
+# earliest day the payload was built from
+CACHE_INDEX_KEY = 'rate_cache_index'
+
+# Hash of the ordinal of the last day a payload covers, for the payloads
+# that end before the latest day (calendar-year chunks)
+CACHE_UNTIL_KEY = 'rate_cache_until'
+
+# Evictions are broadcast here so every process drops its local copies
+# (RATES_INVALIDATION_CHANNEL overrides it)
+INVALIDATION_CHANNEL = 'rate_cache_invalidate'
+
+_PROCESS_ID = uuid.uuid4().hex
+
+# How often a request waiting on another worker's rebuild looks for the result
+REBUILD_POLL_INTERVAL = 0.05
+
+# One encoded variant of a cached payload; ``modified`` is its Last-Modified day
+CachedBody = namedtuple('CachedBody', ['body', 'etag', 'modified'])
+
+# Keys written by warm_rate_cache, and payloads it skipped because a
+# currency isn't quoted on the day(s) they need or an invalidation ran
+# while they were built
+WarmResult = namedtuple('WarmResult', ['warmed', 'skipped'])
+
+
+def cache_ttl():
+    return getattr(settings, 'RATES_CACHE_TTL', 60 * 60 * 24 * 7)
+
+
+def warm_periods():
+    """Historical periods warm_rate_cache builds by default, the ones charts open on"""
+    return getattr(settings, 'RATES_WARM_PERIODS', ('1w', '1m'))
+
+
+def invalidation_channel():
+    return getattr(settings, 'RATES_INVALIDATION_CHANNEL', INVALIDATION_CHANNEL)
+
+
+def rebuild_lock_timeout():
+    return getattr(settings, 'RATES_REBUILD_LOCK_TIMEOUT', 30)
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _stale_key(key):
+    return f'{key}:stale'
+
+
+class LocalCache:
+    """Per-process LRU of cached payloads, bounded by total bytes and entry age"""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, size=None):
+        if isinstance(value, str):
+            value = value.encode()
+        size = len(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+_local_cache = None
+_listener = None
+_local_cache_lock = threading.Lock()
+
+
+def local_cache():
+    """This process's LocalCache, subscribing to invalidations on first use"""
+    global _local_cache, _listener
+    if _local_cache is None:
+        with _local_cache_lock:
+            if _local_cache is None:
+                _local_cache = LocalCache(
+                    max_bytes=getattr(settings, 'RATES_LOCAL_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+                    ttl=getattr(settings, 'RATES_LOCAL_CACHE_TTL', 300),
+                )
+            if _listener is None:
+                _listener = threading.Thread(target=_listen_for_invalidations, name='rate-cache-invalidations', daemon=True)
+                _listener.start()
+    return _local_cache
+
+
+def _listen_for_invalidations():
+    while True:
+        try:
+            pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(invalidation_channel())
+            for message in pubsub.listen():
+                apply_invalidation(message['data'])
+        except Exception:
+            logger.exception('Rate cache invalidation listener failed, retrying')
+            # Messages missed while disconnected can't be replayed
+            if _local_cache is not None:
+                _local_cache.clear()
+            time.sleep(1)
+
+
+def apply_invalidation(message):
+    """Handle an invalidation published by another process"""
+    message = json.loads(message)
+    if message['sender'] == _PROCESS_ID:
+        return
+    if _local_cache is not None:
+        _local_cache.delete(_local_keys(message['keys']))
+    changed, through = message['date'], message.get('through')
+    mark_rates_changed(
+        date.fromisoformat(changed) if changed else None,
+        date.fromisoformat(through) if through else None,
+    )
+
+
+def _local_keys(keys):
+    return [f'{key}:{variant}' for key in keys for variant in ALL_VARIANTS]
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def async_redis():
+    """redis.asyncio client of the running event loop, over a pool of its own.
+
+    Connects to the default cache's LOCATION; RATES_ASYNC_REDIS_POOL_KWARGS
+    is passed to the connection pool.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        pool = aioredis.ConnectionPool.from_url(
+            settings.CACHES['default']['LOCATION'],
+            **getattr(settings, 'RATES_ASYNC_REDIS_POOL_KWARGS', {'max_connections': 100}),
+        )
+        client = _async_clients[loop] = aioredis.Redis(connection_pool=pool)
+    return client
+
+
+def _early_refresh_due(expires, delta):
+    """XFetch: rebuild before expiry with a probability that rises as it nears,
+    sooner for payloads that took longer (``delta`` seconds) to build"""
+    if expires is None or delta is None:
+        return False
+    beta = getattr(settings, 'RATES_EARLY_REFRESH_BETA', 1.0)
+    return time.time() - float(delta) * beta * math.log(1.0 - random.random()) >= float(expires)
+
+
+def _parse_cached(fields):
+    etag, modified, expires, delta, body = fields
+    if body is None:
+        return None, False
+    cached = CachedBody(body, etag.decode(), date.fromisoformat(modified.decode()))
+    return cached, _early_refresh_due(expires, delta)
+
+
+def _cached_fields(key, variant):
+    return key, 'etag', 'modified', 'expires', 'delta', variant
+
+
+def get_cached(redis_conn, key, variant='identity'):
+    """Read one encoded variant of a cached payload, local tier first.
+
+    Payloads live in Redis as a hash of their encoded variants plus ETag,
+    so only the requested variant crosses the network.
+    """
+    cache = local_cache()
+    local_key = f'{key}:{variant}'
+    cached = cache.get(local_key)
+    if cached is not None:
+        metrics.observe_cache(key, 'local_hit')
+        return cached
+    with timed('cache'):
+        cached, _ = _parse_cached(redis_conn.hmget(*_cached_fields(key, variant)))
+    metrics.observe_cache(key, 'miss' if cached is None else 'redis_hit')
+    if cached is not None:
+        cache.set(local_key, cached, size=len(cached.body))
+    return cached
+
+
+def _encode(payload):
+    with timed('encode'):
+        return encode_payload(payload.data, payload.modified, payload.formats)
+
+
+def _queue_cache(pipe, payload, delta=0.0, variants=None):
+    if variants is None:
+        variants = _encode(payload)
+    ttl = cache_ttl()
+    pipe.delete(payload.key)
+    pipe.hset(payload.key, mapping={**variants, 'expires': time.time() + ttl, 'delta': delta})
+    pipe.expire(payload.key, ttl)
+    pipe.zadd(CACHE_INDEX_KEY, {payload.key: payload.since.toordinal()})
+    if payload.until:
+        pipe.hset(CACHE_UNTIL_KEY, payload.key, payload.until.toordinal())
+    return variants
+
+
+def _bodies(payload, variants, store_locally=True):
+    cache = local_cache()
+    etag = variants['etag'].decode()
+    bodies = {}
+    for variant in variants.keys() - {'etag', 'modified'}:
+        bodies[variant] = CachedBody(variants[variant], etag, payload.modified)
+        if store_locally:
+            cache.set(f'{payload.key}:{variant}', bodies[variant], size=len(variants[variant]))
+    return bodies
+
+
+def _outdated(payload):
+    logger.info('Not caching %s, built before the last invalidation', payload.key)
+
+
+def cache_rates(redis_conn, payload, delta=0.0, generation=None):
+    """Cache a payloads.Payload in Redis and the local tier.
+
+    ``delta`` is how long the payload took to build, for early refreshes.
+    ``generation`` is the rate matrix's generation it was built from: when
+    an invalidation has bumped GENERATION_KEY past it since, the payload
+    may predate that change and is only returned, not stored.
+    Returns {variant: CachedBody} for every encoded variant.
+    """
+    variants = _encode(payload)
+    with timed('cache'), redis_conn.pipeline() as pipe:
+        try:
+            if generation is not None:
+                pipe.watch(GENERATION_KEY)
+                if read_generation(pipe) > generation:
+                    raise WatchError
+                pipe.multi()
+            _queue_cache(pipe, payload, delta, variants)
+            pipe.execute()
+        except WatchError:
+            _outdated(payload)
+            return _bodies(payload, variants, store_locally=False)
+    return _bodies(payload, variants)
+
+
+async def acache_rates(payload, delta=0.0, variants=None, generation=None):
+    """cache_rates() over the async Redis client.
+
+    Payloads are encoded in a thread, compressing every variant being too
+    slow for the event loop, unless their encoded ``variants`` are given.
+    """
+    if variants is None:
+        variants = await sync_to_async(_encode)(payload)
+    with timed('cache'):
+        async with async_redis().pipeline() as pipe:
+            try:
+                if generation is not None:
+                    await pipe.watch(GENERATION_KEY)
+                    if int(await pipe.get(GENERATION_KEY) or 0) > generation:
+                        raise WatchError
+                    pipe.multi()
+                _queue_cache(pipe, payload, delta, variants)
+                await pipe.execute()
+            except WatchError:
+                _outdated(payload)
+                return _bodies(payload, variants, store_locally=False)
+    return _bodies(payload, variants)
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _single_flight(key, compute):
+    """Run ``compute()`` once for concurrent callers of the same key in this process"""
+    with _flights_lock:
+        future = _flights.get(key)
+        leader = future is None
+        if leader:
+            future = _flights[key] = Future()
+    if not leader:
+        return future.result()
+    try:
+        result = compute()
+        future.set_result(result)
+        return result
+    except BaseException as error:
+        future.set_exception(error)
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+
+
+def _release_lock(redis_conn, lock_key, token):
+    with redis_conn.pipeline() as pipe:
+        try:
+            pipe.watch(lock_key)
+            if pipe.get(lock_key) == token.encode():
+                pipe.multi()
+                pipe.delete(lock_key)
+                pipe.execute()
+        except WatchError:
+            pass  # expired and taken by another builder, theirs to release
+
+
+def _build_and_encode(build_payload):
+    """(payload, encoded variants, build time, matrix generation) of ``build_payload()``"""
+    generation = matrix_generation()
+    started = time.monotonic()
+    with timed('build'):
+        payload = build_payload()
+    delta = time.monotonic() - started
+    return payload, _encode(payload), delta, generation
+
+
+def _build_and_cache(redis_conn, build_payload):
+    generation = matrix_generation()
+    started = time.monotonic()
+    with timed('build'):
+        payload = build_payload()
+    return cache_rates(redis_conn, payload, delta=time.monotonic() - started, generation=generation)
+
+
+def _rebuild(redis_conn, key, variant, build_payload, current):
+    """Build ``key`` while holding its Redis lock, or serve around whoever holds it.
+
+    ``current`` is the copy being refreshed early, if any. Without one,
+    the copy evicted by the last invalidation is served while it lasts,
+    otherwise the caller waits for the other builder's result and takes
+    over if its lock expires.
+    """
+    lock_key = _lock_key(key)
+    token = uuid.uuid4().hex
+    timeout = rebuild_lock_timeout()
+    stale, looked_for_stale = current, current is not None
+    while not redis_conn.set(lock_key, token, nx=True, px=int(timeout * 1000)):
+        if not looked_for_stale:
+            stale, _ = _parse_cached(redis_conn.hmget(*_cached_fields(_stale_key(key), variant)))
+            looked_for_stale = True
+        if stale is not None:
+            return stale
+        time.sleep(REBUILD_POLL_INTERVAL)
+        fresh, _ = _parse_cached(redis_conn.hmget(*_cached_fields(key, variant)))
+        if fresh is not None:
+            local_cache().set(f'{key}:{variant}', fresh, size=len(fresh.body))
+            return fresh
+
+    try:
+        if current is None:
+            # The previous holder may have cached it between our miss and our lock
+            fresh, _ = _parse_cached(redis_conn.hmget(*_cached_fields(key, variant)))
+            if fresh is not None:
+                local_cache().set(f'{key}:{variant}', fresh, size=len(fresh.body))
+                return fresh
+        return _build_and_cache(redis_conn, build_payload)[variant]
+    finally:
+        _release_lock(redis_conn, lock_key, token)
+
+
+def cached_or_build(redis_conn, key, variant, build_payload):
+    """One stored body of ``key``, calling ``build_payload()`` to cache it on a miss.
+
+    ``variant`` names the body, see responses.variant_name.
+
+    Misses are coalesced so a popular key is built once: threads of this
+    process share one build, and processes take turns through a Redis lock
+    (see _rebuild). Hits are occasionally rebuilt ahead of their expiry by
+    whoever gets the lock while everyone else keeps the current copy.
+    """
+    local_key = f'{key}:{variant}'
+    cached = local_cache().get(local_key)
+    if cached is not None:
+        metrics.observe_cache(key, 'local_hit')
+        return cached
+    with timed('cache'):
+        cached, refresh_due = _parse_cached(redis_conn.hmget(*_cached_fields(key, variant)))
+    metrics.observe_cache(key, 'miss' if cached is None else 'redis_hit')
+    if cached is not None and not refresh_due:
+        local_cache().set(local_key, cached, size=len(cached.body))
+        return cached
+    return _single_flight(local_key, partial(_rebuild, redis_conn, key, variant, build_payload, cached))
+
+
+_async_flights = weakref.WeakKeyDictionary()
+
+
+async def _asingle_flight(key, compute):
+    loop = asyncio.get_running_loop()
+    flights = _async_flights.setdefault(loop, {})
+    future = flights.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+    future = flights[key] = loop.create_future()
+    try:
+        result = await compute()
+        future.set_result(result)
+        return result
+    except BaseException as error:
+        future.set_exception(error)
+        future.exception()  # retrieved, so a failure nobody waited for isn't logged
+        raise
+    finally:
+        del flights[key]
+
+
+async def _arelease_lock(redis_conn, lock_key, token):
+    async with redis_conn.pipeline() as pipe:
+        try:
+            await pipe.watch(lock_key)
+            if await pipe.get(lock_key) == token.encode():
+                pipe.multi()
+                pipe.delete(lock_key)
+                await pipe.execute()
+        except WatchError:
+            pass
+
+
+async def _arebuild(key, variant, build_payload, current):
+    redis_conn = async_redis()
+    lock_key = _lock_key(key)
+    token = uuid.uuid4().hex
+    timeout = rebuild_lock_timeout()
+    stale, looked_for_stale = current, current is not None
+    while not await redis_conn.set(lock_key, token, nx=True, px=int(timeout * 1000)):
+        if not looked_for_stale:
+            stale, _ = _parse_cached(await redis_conn.hmget(*_cached_fields(_stale_key(key), variant)))
+            looked_for_stale = True
+        if stale is not None:
+            return stale
+        await asyncio.sleep(REBUILD_POLL_INTERVAL)
+        fresh, _ = _parse_cached(await redis_conn.hmget(*_cached_fields(key, variant)))
+        if fresh is not None:
+            local_cache().set(f'{key}:{variant}', fresh, size=len(fresh.body))
+            return fresh
+
+    try:
+        if current is None:
+            fresh, _ = _parse_cached(await redis_conn.hmget(*_cached_fields(key, variant)))
+            if fresh is not None:
+                local_cache().set(f'{key}:{variant}', fresh, size=len(fresh.body))
+                return fresh
+        payload, variants, delta, generation = await sync_to_async(_build_and_encode)(build_payload)
+        return (await acache_rates(payload, delta, variants, generation))[variant]
+    finally:
+        await _arelease_lock(redis_conn, lock_key, token)
+
+
+async def acached_or_build(key, variant, build_payload):
+    """cached_or_build() over the async Redis client.
+
+    ``build_payload()`` is still a sync callable: on a miss it runs in a
+    thread together with the encoding, so neither blocks the event loop.
+    """
+    local_key = f'{key}:{variant}'
+    cached = local_cache().get(local_key)
+    if cached is not None:
+        metrics.observe_cache(key, 'local_hit')
+        return cached
+    with timed('cache'):
+        cached, refresh_due = _parse_cached(await async_redis().hmget(*_cached_fields(key, variant)))
+    metrics.observe_cache(key, 'miss' if cached is None else 'redis_hit')
+    if cached is not None and not refresh_due:
+        local_cache().set(local_key, cached, size=len(cached.body))
+        return cached
+    return await _asingle_flight(local_key, partial(_arebuild, key, variant, build_payload, cached))
+
+
+def invalidate_rates(changed_date=None, redis_conn=None, through=None):
+    """Evict the cached payloads that a change to ``changed_date`` makes stale.
+
+    latest/previous payloads depend on their own day and historical ones on
+    their whole window, so only keys whose earliest day is on or before the
+    changed day are dropped, unless their last day is before it. When the
+    days from ``changed_date`` to ``through`` changed, keys overlapping that
+    span are. No date evicts everything indexed.
+
+    Evicted payloads are kept under ``<key>:stale`` for RATES_STALE_TTL
+    seconds, for requests that arrive while another worker rebuilds them.
+
+    Other processes are told through INVALIDATION_CHANNEL so they drop the
+    same keys from their local tier and reload their rate matrix.
+    """
+    redis_conn = redis_conn or get_redis_connection("default")
+    max_score = '+inf' if changed_date is None else (through or changed_date).toordinal()
+    keys = [
+        key.decode() if isinstance(key, bytes) else key
+        for key in redis_conn.zrangebyscore(CACHE_INDEX_KEY, '-inf', max_score)
+    ]
+    if keys and changed_date is not None:
+        untils = redis_conn.hmget(CACHE_UNTIL_KEY, keys)
+        first = changed_date.toordinal()
+        keys = [key for key, until in zip(keys, untils) if until is None or int(until) >= first]
+
+    stale_ttl = getattr(settings, 'RATES_STALE_TTL', 300)
+    pipe = redis_conn.pipeline()
+    # Payloads built from matrices older than this change aren't stored from now on
+    pipe.incr(GENERATION_KEY)
+    for key in keys:
+        # Fails for keys that already expired, which is fine
+        pipe.rename(key, _stale_key(key))
+        pipe.expire(_stale_key(key), stale_ttl)
+    if keys:
+        pipe.zrem(CACHE_INDEX_KEY, *keys)
+        pipe.hdel(CACHE_UNTIL_KEY, *keys)
+    pipe.publish(invalidation_channel(), json.dumps({
+        'sender': _PROCESS_ID,
+        'date': changed_date.isoformat() if changed_date else None,
+        'through': through.isoformat() if through else None,
+        'keys': keys,
+    }))
+    pipe.execute(raise_on_error=False)
+    local_cache().delete(_local_keys(keys))
+    # Our own message is ignored, and the matrix must move to the new generation
+    mark_rates_changed(changed_date, through)
+    return keys
+
+
+def _warm_batch(builders, generation, formats=None):
+    """Build and write ``builders``' payloads in one transaction; returns a WarmResult.
+
+    Nothing is written, and every payload counts as skipped, when an
+    invalidation bumped GENERATION_KEY past ``generation`` meanwhile.
+    """
+    built = []
+    for build in builders:
+        started = time.monotonic()
+        try:
+            payload = build()
+        except KeyError:
+            # Currency not quoted on the day(s) the payload needs
+            continue
+        if formats is not None:
+            payload = payload._replace(formats=tuple(fmt for fmt in payload.formats if fmt in formats))
+        built.append((payload, _encode(payload), time.monotonic() - started))
+
+    with get_redis_connection("default").pipeline() as pipe:
+        try:
+            pipe.watch(GENERATION_KEY)
+            if read_generation(pipe) > generation:
+                raise WatchError
+            pipe.multi()
+            for payload, variants, delta in built:
+                _queue_cache(pipe, payload, delta, variants)
+            pipe.execute()
+        except WatchError:
+            return WarmResult(0, len(builders))
+    return WarmResult(len(built), len(builders) - len(built))
+
+
+def warm_rate_cache(bases=None, periods=None, workers=4, batch_size=50, progress=None, keys=None, formats=None):
+    """Build and cache every latest/previous base and historical pair x period.
+
+    Bases default to the currencies quoted on the latest day and periods to
+    warm_periods(); with ``keys`` only the payloads stored under those keys
+    are built, from any period. ``formats`` limits the series formats
+    encoded besides JSON, for a lighter warm: a request for another format
+    rebuilds the payload in full. Payloads are built by ``workers`` threads
+    and written in pipelined batches; ``progress(done, total)`` is called
+    as batches finish, counting skipped payloads as done. Returns a
+    WarmResult.
+    """
+    matrix = get_rate_matrix()
+    if not len(matrix):
+        return WarmResult(0, 0)
+    matrix.values  # load every column before the workers share the matrix
+
+    bases = list(bases or matrix.currencies_at(matrix.latest_index()))
+    periods = list(periods or (PERIODS if keys is not None else warm_periods()))
+    builders = [(latest_key(base), partial(latest_payload, matrix, base)) for base in bases]
+    if len(matrix) > 1:
+        builders += [(previous_key(base), partial(previous_payload, matrix, base)) for base in bases]
+    builders += [
+        (
+            historical_key(from_currency, to_currency, period),
+            partial(historical_payload, matrix, from_currency, to_currency, period),
+        )
+        for from_currency in bases
+        for to_currency in bases
+        if from_currency != to_currency
+        for period in periods
+    ]
+    if keys is not None:
+        keys = set(keys)
+        builders = [(key, build) for key, build in builders if key in keys]
+    builders = [build for _, build in builders]
+
+    total = len(builders)
+    warmed = skipped = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_warm_batch, builders[i:i + batch_size], matrix.generation, formats)
+            for i in range(0, total, batch_size)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            warmed += result.warmed
+            skipped += result.skipped
+            if progress:
+                progress(warmed + skipped, total)
+    return WarmResult(warmed, skipped)
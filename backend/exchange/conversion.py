@@ -0,0 +1,132 @@
+import re
+from decimal import ROUND_HALF_EVEN, Decimal, DecimalException, InvalidOperation
+
+import numpy as np
+
+
+# Dates are taken as YYYY-MM-DD only; numpy and date.fromisoformat also read
+# other forms (2020-01, 20200101) that clients almost never mean
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+class ConversionError(ValueError):
+    """An item of a batch conversion can't be converted"""
+
+    def __init__(self, index, message):
+        super().__init__(f'Item {index}: {message}')
+        self.index = index
+
+
+def _parse_dates(dates, positions):
+    for i in positions:
+        if not ISO_DATE.fullmatch(dates[i]):
+            raise ConversionError(i, f'invalid date {dates[i]!r}')
+    try:
+        return np.array([dates[i] for i in positions], dtype='datetime64[D]')
+    except ValueError:
+        for i in positions:
+            try:
+                np.datetime64(dates[i], 'D')
+            except ValueError:
+                raise ConversionError(i, f'invalid date {dates[i]!r}')
+        raise
+
+
+def _rows_for_dates(matrix, dates, size, as_of=False):
+    """Matrix row of each item's day, the latest row for items without one.
+
+    With ``as_of`` a day resolves to the last stored day on or before it.
+    Distinct days are parsed and searched once, so thousands of them cost
+    one vectorized binary search.
+    """
+    rows = np.full(size, matrix.latest_index())
+    dated = [i for i, day in enumerate(dates or ()) if day]
+    if not dated:
+        return rows
+    for i in dated:
+        if not isinstance(dates[i], str):
+            raise ConversionError(i, f'invalid date {dates[i]!r}')
+
+    _, first, inverse = np.unique(
+        np.array([dates[i] for i in dated], dtype=str), return_index=True, return_inverse=True,
+    )
+    inverse = inverse.reshape(-1)
+    wanted = _parse_dates(dates, [dated[j] for j in first.tolist()])
+    if as_of:
+        positions = matrix.rows_as_of(wanted)
+        missing = np.flatnonzero(positions[inverse] < 0)
+        message = 'no rates stored on or before {}'
+    else:
+        positions = np.searchsorted(matrix.dates, wanted).clip(max=len(matrix.dates) - 1)
+        missing = np.flatnonzero((matrix.dates[positions] != wanted)[inverse])
+        message = 'no rates stored for {}'
+    if len(missing):
+        i = dated[missing[0]]
+        raise ConversionError(i, message.format(dates[i]))
+    rows[dated] = positions[inverse]
+    return rows
+
+
+def convert_batch(matrix, amounts, from_codes, to_codes, dates=None, places=None, as_of=False):
+    """Convert many amounts in one pass over the rate matrix.
+
+    Rates are looked up and divided as arrays; each distinct (day, from, to)
+    rate is turned into a Decimal once, and amounts are multiplied as
+    Decimals exactly like ``convert`` does. ``places`` rounds results
+    half-even. Items without a date use the latest day, items with one
+    that day, or with ``as_of`` the last stored day on or before it.
+
+    Returns (rates, results, row_dates) lists aligned with the input.
+    """
+    size = len(amounts)
+    if not len(from_codes) == len(to_codes) == size or (dates is not None and len(dates) != size):
+        raise ConversionError(0, 'amount, from, to and date lists must have the same length')
+
+    decimal_amounts = []
+    for i, amount in enumerate(amounts):
+        try:
+            decimal_amount = Decimal(str(amount))
+        except InvalidOperation:
+            decimal_amount = None
+        if decimal_amount is None or not decimal_amount.is_finite():
+            raise ConversionError(i, f'invalid amount {amount!r}')
+        decimal_amounts.append(decimal_amount)
+
+    all_codes = list(from_codes) + list(to_codes)
+    for i, code in enumerate(all_codes):
+        if not isinstance(code, str):
+            raise ConversionError(i % size, f'invalid currency {code!r}')
+    codes, inverse = np.unique(np.array(all_codes, dtype=str), return_inverse=True)
+    code_columns = []
+    for code in codes.tolist():
+        if code not in matrix.index:
+            raise ConversionError(all_codes.index(code) % size, f'unknown currency {code!r}')
+        code_columns.append(matrix.index[code])
+    columns = np.array(code_columns, dtype=np.int64)[inverse.reshape(-1)]
+    from_columns, to_columns = columns[:size], columns[size:]
+
+    rows = _rows_for_dates(matrix, dates, size, as_of)
+    values = matrix.values
+    rates = values[rows, to_columns] / values[rows, from_columns]
+    missing = np.flatnonzero(np.isnan(rates))
+    if len(missing):
+        raise ConversionError(int(missing[0]), 'currency not quoted on that day')
+
+    width = values.shape[1]
+    triples = (rows * width + from_columns) * width + to_columns
+    _, first, rate_ids = np.unique(triples, return_index=True, return_inverse=True)
+    decimal_rates = [Decimal(str(rate)) for rate in rates[first].tolist()]
+
+    quantum = Decimal(1).scaleb(-places) if places is not None else None
+    results = []
+    for i, (amount, rate_id) in enumerate(zip(decimal_amounts, rate_ids.reshape(-1).tolist())):
+        try:
+            result = amount * decimal_rates[rate_id]
+            if quantum is not None:
+                result = result.quantize(quantum, rounding=ROUND_HALF_EVEN)
+        except DecimalException:
+            raise ConversionError(i, f'result of {amounts[i]!r} is out of range')
+        results.append(result)
+
+    row_dates = np.datetime_as_string(matrix.dates[rows]).tolist()
+    return rates.tolist(), results, row_dates
@@ -0,0 +1,14 @@
+import numpy as np
+
+
+def cross_rate_table(rates, base):
+    """Full N x N cross table for one day's rates quoted against ``base``.
+
+    Returns (codes, table) where ``table[i, j]`` is the price of one
+    ``codes[i]`` in ``codes[j]``, so row i is the whole day re-based on codes[i].
+    """
+    day_rates = dict(rates)
+    day_rates.setdefault(base, 1.0)
+    codes = sorted(day_rates)
+    values = np.array([day_rates[code] for code in codes], dtype='<f8')
+    return codes, values[np.newaxis, :] / values[:, np.newaxis]
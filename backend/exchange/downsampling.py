@@ -0,0 +1,77 @@
+import numpy as np
+
+RESOLUTIONS = ('weekly', 'monthly')
+
+# Bounds for the ``points`` parameter; each value is cached separately
+MIN_POINTS = 10
+MAX_POINTS = 5000
+
+# 1970-01-05, the first Monday after the datetime64 epoch, as a day number
+_FIRST_MONDAY = 4
+
+
+def lttb(dates, rates, points):
+    """Largest-Triangle-Three-Buckets: ``points`` samples that keep the series' shape.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the average of the next bucket.
+    """
+    size = len(rates)
+    if points >= size or points < 3:
+        return dates, rates
+
+    x = dates.astype('datetime64[D]').astype(np.float64)
+    y = np.asarray(rates, dtype=np.float64)
+    # Bucket edges over the interior points [1, size - 1)
+    edges = np.linspace(1, size - 1, points - 1).astype(np.int64)
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else size
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+
+    return dates[selected], y[selected]
+
+
+def ohlc(dates, rates, resolution):
+    """Open/high/low/close per calendar week (Monday start) or month.
+
+    Returns (bucket_start_dates, open, high, low, close) arrays.
+    """
+    days = dates.astype('datetime64[D]')
+    if resolution == 'weekly':
+        keys = (days.astype(np.int64) - _FIRST_MONDAY) // 7
+        bucket_dates = (keys * 7 + _FIRST_MONDAY).astype('datetime64[D]')
+    elif resolution == 'monthly':
+        keys = days.astype('datetime64[M]')
+        bucket_dates = keys.astype('datetime64[D]')
+    else:
+        raise ValueError(f'Unknown resolution {resolution!r}')
+
+    if not len(days):
+        empty = np.empty(0)
+        return days, empty, empty, empty, empty
+
+    rates = np.asarray(rates, dtype=np.float64)
+    starts = np.concatenate([[0], np.flatnonzero(keys[1:] != keys[:-1]) + 1])
+    ends = np.concatenate([starts[1:], [len(rates)]])
+    return (
+        bucket_dates[starts],
+        rates[starts],
+        np.maximum.reduceat(rates, starts),
+        np.minimum.reduceat(rates, starts),
+        rates[ends - 1],
+    )
@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional, columnar JSON is always available
+    msgpack = None
+
+try:
+    import pyarrow
+except ImportError:  # optional
+    pyarrow = None
+
+COLUMNAR_MEDIA_TYPE = 'application/vnd.rates.columnar+json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+# Per-point values of a historical payload, in column order
+SERIES_FIELDS = ('rate', 'open', 'high', 'low', 'close')
+
+
+def columnar_series(data):
+    """A historical payload with its list of points turned into columns.
+
+    ``first_date`` is the first point's date and ``days`` each point's
+    offset from it, so dates cost a few bytes instead of a repeated ISO
+    string. The payload's own keys, like a requested ``start``, are kept.
+    """
+    points = data['data']
+    series = {key: value for key, value in data.items() if key != 'data'}
+    dates = np.array([point['date'] for point in points], dtype='datetime64[D]')
+    series['first_date'] = str(dates[0]) if len(dates) else None
+    series['days'] = (dates - dates[0]).astype(np.int64).tolist() if len(dates) else []
+    for field in SERIES_FIELDS:
+        if points and field in points[0]:
+            series[field] = [point[field] for point in points]
+    return series
+
+
+def encode_columnar_json(data):
+    return json.dumps(columnar_series(data), separators=(',', ':')).encode()
+
+
+def encode_msgpack(data):
+    return msgpack.packb(columnar_series(data))
+
+
+def encode_arrow(data):
+    """Arrow IPC stream with a date32 ``date`` column and one float64 column per field.
+
+    The payload's other keys (from, to, period, ...) go in the schema metadata.
+    """
+    points = data['data']
+    columns = {'date': pyarrow.array(
+        np.array([point['date'] for point in points], dtype='datetime64[D]'), pyarrow.date32(),
+    )}
+    for field in SERIES_FIELDS:
+        if points and field in points[0]:
+            columns[field] = pyarrow.array([point[field] for point in points], pyarrow.float64())
+    metadata = {key: str(value) for key, value in data.items() if key != 'data'}
+    table = pyarrow.table(columns, metadata=metadata)
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# Compact encodings of historical series: format -> (media type, encoder)
+SERIES_FORMATS = {
+    'columnar': (COLUMNAR_MEDIA_TYPE, encode_columnar_json),
+}
+if msgpack:
+    SERIES_FORMATS['msgpack'] = (MSGPACK_MEDIA_TYPE, encode_msgpack)
+if pyarrow:
+    SERIES_FORMATS['arrow'] = (ARROW_MEDIA_TYPE, encode_arrow)
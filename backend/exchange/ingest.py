@@ -0,0 +1,260 @@
+import json
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .cache import invalidate_rates
+from .models import Currency, DailyRate, ExchangeRate
+from .rate_matrix import mark_rates_changed
+
+
+class JSONStream:
+    """Pull parser for a JSON document read from a file in chunks.
+
+    Only objects are walked member by member, every other value is decoded
+    whole, which keeps memory bounded by the largest single member.
+    """
+
+    def __init__(self, file, chunk_size=64 * 1024):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read_more(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                raise ValueError('Unexpected end of JSON document')
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f'Expected {char!r} at offset {self.pos}, found {found!r}')
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number cut at the chunk boundary still decodes, so only
+                # trust values that end before the buffered text does
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read_more()
+
+    def members(self):
+        """Yield the keys of the next object; the caller must consume each value"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f'Expected \',\' or \'}}\' at offset {self.pos - 1}, found {separator!r}')
+
+
+def iter_daily_rates(path, chunk_size=64 * 1024):
+    """Yield (base, date, rates) for every day of an all_historical_rates.json style file.
+
+    ``base`` is expected before ``rates`` in the document and defaults to USD.
+    """
+    with open(path, 'r') as file:
+        stream = JSONStream(file, chunk_size)
+        base = 'USD'
+        for key in stream.members():
+            if key == 'rates':
+                for date_string in stream.members():
+                    date = datetime.strptime(date_string, '%Y-%m-%d').date()
+                    yield base, date, stream.value()
+            elif key == 'base':
+                base = stream.value()
+            else:
+                stream.value()
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def load_exchange_rates(days, batch_size=500, currency_names=None):
+    """Bulk-insert (base, date, rates) days in one transaction.
+
+    Days that are already stored are skipped, so re-running a load is a
+    no-op. Returns the dates that were inserted.
+    """
+    currency_names = currency_names or {}
+    loaded = []
+    codes = set()
+
+    with transaction.atomic():
+        existing = set(ExchangeRate.objects.values_list('date', flat=True))
+        for batch in _batches(days, batch_size):
+            rows = []
+            for base, date, rates in batch:
+                if date in existing:
+                    continue
+                existing.add(date)
+                rows.append(ExchangeRate(base=base, date=date, rates=rates))
+                codes.update(rates)
+                codes.add(base)
+
+            ExchangeRate.objects.bulk_create(rows)
+            DailyRate.objects.bulk_create(
+                [daily_rate for row in rows for daily_rate in row.to_daily_rates()],
+                batch_size=batch_size * 40,
+            )
+            loaded.extend(row.date for row in rows)
+
+        Currency.objects.bulk_create(
+            [Currency(code=code, name=currency_names.get(code, code)) for code in sorted(codes)],
+            ignore_conflicts=True,
+        )
+
+        if loaded:
+            earliest, latest = min(loaded), max(loaded)
+            transaction.on_commit(lambda: mark_rates_changed(earliest, latest))
+            transaction.on_commit(lambda: invalidate_rates(earliest, through=latest))
+
+    return loaded
+
+
+class RateSource:
+    """Somewhere new days of rates are picked up from by ingest_rates"""
+
+    def days(self, since=None):
+        """Yield (base, date, rates) for the days after ``since``, or every day"""
+        raise NotImplementedError
+
+
+class FileDropSource(RateSource):
+    """One ``<YYYY-MM-DD>.json`` file per day in a directory.
+
+    Each file holds ``{"base": ..., "rates": {...}}`` (base defaults to USD).
+    Only files named after ``since`` are opened, so the drop can keep its history.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or settings.RATES_INGEST_DROP_DIR)
+
+    def days(self, since=None):
+        dated = []
+        for path in self.directory.glob('*.json'):
+            try:
+                day = datetime.strptime(path.stem, '%Y-%m-%d').date()
+            except ValueError:
+                continue
+            if since is None or day > since:
+                dated.append((day, path))
+
+        for day, path in sorted(dated):
+            with open(path, 'r') as file:
+                document = json.load(file)
+            yield document.get('base', 'USD'), day, document['rates']
+
+
+def rate_source(path=None, **kwargs):
+    """Instantiate the RateSource at dotted ``path`` (default: RATES_INGEST_SOURCE)"""
+    return import_string(path or settings.RATES_INGEST_SOURCE)(**kwargs)
+
+
+# ``changed`` are the dates whose rates were inserted or updated and
+# ``evicted`` the cache keys invalidated because of them
+IngestResult = namedtuple('IngestResult', ['changed', 'evicted'])
+
+
+def upsert_exchange_rates(days, currency_names=None):
+    """Insert or update (base, date, rates) days on their (date, base) constraint.
+
+    Each date holds one ExchangeRate, as DailyRate and the rate matrix
+    expect: a day arriving with another base replaces the stored one, and
+    of several for the same date in ``days`` the last wins. Days stored
+    with the same base and rates are left alone. Only the changed days'
+    DailyRate rows are rewritten, and once the transaction commits the rate
+    matrix re-reads and the cache evicts just the span they cover.
+    """
+    currency_names = currency_names or {}
+    incoming = {date: (base, rates) for base, date, rates in days}
+    if not incoming:
+        return IngestResult([], [])
+    evicted = []
+
+    with transaction.atomic():
+        stored = {}
+        replaced = []
+        for pk, date, base, rates in ExchangeRate.objects.filter(
+            date__in=incoming,
+        ).values_list('id', 'date', 'base', 'rates'):
+            stored[date] = (base, rates)
+            if base != incoming[date][0]:
+                replaced.append(pk)
+        rows = []
+        for date, (base, rates) in sorted(incoming.items()):
+            if stored.get(date) == (base, rates):
+                continue
+            rows.append(ExchangeRate(base=base, date=date, rates=rates))
+        if not rows:
+            return IngestResult([], [])
+
+        ExchangeRate.objects.filter(id__in=replaced).delete()
+        ExchangeRate.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['date', 'base'],
+            update_fields=['rates'],
+        )
+        changed = [row.date for row in rows]
+        DailyRate.objects.filter(date__in=changed).delete()
+        DailyRate.objects.bulk_create([daily_rate for row in rows for daily_rate in row.to_daily_rates()])
+
+        codes = {code for row in rows for code in (*row.rates, row.base)}
+        Currency.objects.bulk_create(
+            [Currency(code=code, name=currency_names.get(code, code)) for code in sorted(codes)],
+            ignore_conflicts=True,
+        )
+
+        earliest, latest = changed[0], changed[-1]
+        transaction.on_commit(lambda: mark_rates_changed(earliest, latest))
+        transaction.on_commit(lambda: evicted.extend(invalidate_rates(earliest, through=latest)))
+
+    return IngestResult(changed, evicted)
+
+
+def ingest_new_days(source, since=None, currency_names=None):
+    """Upsert the days ``source`` has after ``since`` (default: the latest stored day)"""
+    if since is None:
+        since = ExchangeRate.objects.order_by('-date').values_list('date', flat=True).first()
+    return upsert_exchange_rates(source.days(since), currency_names=currency_names)
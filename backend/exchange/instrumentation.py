@@ -0,0 +1,203 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Order phases appear in Server-Timing; ``db`` time is also part of ``build``
+PHASES = ('cache', 'db', 'build', 'encode', 'render')
+
+# Prefixes of the cached payload keys (see payloads.py), longest first
+KEY_FAMILIES = (
+    'historical_batch', 'historical_year', 'historical_rates', 'latest_rates', 'previous_rates', 'analytics',
+)
+
+CACHE_OUTCOMES = ('local_hit', 'redis_hit', 'miss')
+
+# Request duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class RequestTimings:
+    """Seconds spent per phase, and the queries run, while serving one request"""
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.queries = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def server_timing(self, total, size=None):
+        """Server-Timing header value, durations in milliseconds"""
+        metrics = []
+        for phase in PHASES:
+            if phase in self.phases:
+                metric = f'{phase};dur={self.phases[phase] * 1000:.2f}'
+                if phase == 'db':
+                    metric += f';desc="{self.queries} queries"'
+                metrics.append(metric)
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        if size is not None:
+            metrics.append(f'size;desc="{size} bytes"')
+        return ', '.join(metrics)
+
+
+_timings = ContextVar('rates_request_timings', default=None)
+
+
+def start_request():
+    """Start collecting RequestTimings for the current request (and what it awaits)"""
+    timings = RequestTimings()
+    return timings, _timings.set(timings)
+
+
+def finish_request(token):
+    _timings.reset(token)
+
+
+def current_timings():
+    return _timings.get()
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to ``phase`` of the current request, if any"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+def time_queries(execute, sql, params, many, context):
+    """Database execute wrapper counting queries and their time per request"""
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - started)
+        timings.queries += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver: time every query made over the connection"""
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
+
+
+def key_family(key):
+    for family in KEY_FAMILIES:
+        if key.startswith(family):
+            return family
+    return 'other'
+
+
+class Metrics:
+    """This process's counters, exposed in the Prometheus text format.
+
+    Each worker process keeps its own; Prometheus sums them across the
+    scraped targets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.duration_buckets = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+            self.duration_sum = defaultdict(float)
+            self.phase_seconds = defaultdict(float)
+            self.queries = defaultdict(int)
+            self.response_bytes = defaultdict(int)
+            self.cache_lookups = defaultdict(int)
+
+    def observe_request(self, view, status, seconds, timings, size):
+        with self._lock:
+            self.requests[view, status] += 1
+            self.duration_buckets[view][bisect_left(DURATION_BUCKETS, seconds)] += 1
+            self.duration_sum[view] += seconds
+            for phase, phase_seconds in timings.phases.items():
+                self.phase_seconds[view, phase] += phase_seconds
+            self.queries[view] += timings.queries
+            if size is not None:
+                self.response_bytes[view] += size
+
+    def observe_cache(self, key, outcome):
+        with self._lock:
+            self.cache_lookups[key_family(key), outcome] += 1
+
+    def hit_ratios(self):
+        """{key family: share of lookups answered from the local tier or Redis}"""
+        with self._lock:
+            totals, hits = defaultdict(int), defaultdict(int)
+            for (family, outcome), count in self.cache_lookups.items():
+                totals[family] += count
+                if outcome != 'miss':
+                    hits[family] += count
+        return {family: hits[family] / total for family, total in totals.items()}
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format (0.0.4)"""
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{label}="{_escape(str(text))}"' for label, text in labels)
+                lines.append(f'{name}{suffix}{{{label_text}}} {_number(value)}')
+
+        with self._lock:
+            family('rates_requests_total', 'counter', 'Requests served, by view and status.', [
+                ('', (('view', view), ('status', status)), count)
+                for (view, status), count in sorted(self.requests.items())
+            ])
+            duration = []
+            for view, counts in sorted(self.duration_buckets.items()):
+                cumulative = 0
+                for bound, count in zip((*DURATION_BUCKETS, '+Inf'), counts):
+                    cumulative += count
+                    duration.append(('_bucket', (('view', view), ('le', bound)), cumulative))
+                duration.append(('_sum', (('view', view),), self.duration_sum[view]))
+                duration.append(('_count', (('view', view),), cumulative))
+            family('rates_request_duration_seconds', 'histogram', 'Time to serve a request.', duration)
+            family('rates_request_phase_seconds_total', 'counter', 'Time spent per request phase.', [
+                ('', (('view', view), ('phase', phase)), seconds)
+                for (view, phase), seconds in sorted(self.phase_seconds.items())
+            ])
+            family('rates_db_queries_total', 'counter', 'Database queries run while serving requests.', [
+                ('', (('view', view),), count) for view, count in sorted(self.queries.items())
+            ])
+            family('rates_response_bytes_total', 'counter', 'Response body bytes sent.', [
+                ('', (('view', view),), size) for view, size in sorted(self.response_bytes.items())
+            ])
+            family('rates_cache_lookups_total', 'counter', 'Cached payload lookups, by key family and outcome.', [
+                ('', (('family', key), ('outcome', outcome)), count)
+                for (key, outcome), count in sorted(self.cache_lookups.items())
+            ])
+        family('rates_cache_hit_ratio', 'gauge', 'Share of lookups served from cache, by key family.', [
+            ('', (('family', key),), ratio) for key, ratio in sorted(self.hit_ratios().items())
+        ])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Metrics()
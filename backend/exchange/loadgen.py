@@ -0,0 +1,244 @@
+import math
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .payloads import PERIODS
+
+
+class LatencyHistogram:
+    """HDR-style histogram of latencies in microseconds.
+
+    Every power of two is split into SUB_BUCKETS linear steps, so any value
+    is kept within 1/SUB_BUCKETS (under 1%) of its true size in fixed
+    memory, and percentiles don't need the raw samples.
+    """
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value):
+        shift = max(value.bit_length() - cls.SUB_BUCKET_BITS - 1, 0)
+        return shift * cls.SUB_BUCKETS + (value >> shift)
+
+    @classmethod
+    def _highest_equivalent(cls, index):
+        shift = max(index // cls.SUB_BUCKETS - 1, 0)
+        sub_bucket = index - shift * cls.SUB_BUCKETS
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, value):
+        value = max(int(value), 0)
+        self.counts[self._index(value)] += 1
+        self.total += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """Value at or below which ``q`` percent of the recorded values fall"""
+        if not self.total:
+            return 0
+        rank = max(math.ceil(q / 100 * self.total), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def buckets(self):
+        """{highest value of a bucket: count}, for plotting or merging elsewhere"""
+        return {self._highest_equivalent(index): count for index, count in sorted(self.counts.items())}
+
+
+# Percentiles reported per endpoint, HdrHistogram-style
+REPORTED_PERCENTILES = (50, 75, 90, 95, 99, 99.9, 99.99, 100)
+
+HISTORICAL_PERIOD_WEIGHTS = {'1w': 2, '1m': 4, '1y': 2, '5y': 1, '10y': 1}
+
+
+def page_view(rng, currencies):
+    """CurrencyDashboard mounting: names, then latest and previous for a base"""
+    base = 'USD' if rng.random() < 0.5 else rng.choice(currencies)
+    return [
+        ('codes_and_names', '/api/currencies/codes_and_names/', {}),
+        ('latest', '/api/exchange-rates/latest/', {'base': base}),
+        ('previous', '/api/exchange-rates/previous/', {'base': base}),
+    ]
+
+
+def chart_view(rng, currencies):
+    """HistoricalRates loading one pair over one period"""
+    from_currency, to_currency = rng.sample(currencies, 2)
+    periods = [period for period in HISTORICAL_PERIOD_WEIGHTS if period in PERIODS]
+    period = rng.choices(periods, weights=[HISTORICAL_PERIOD_WEIGHTS[period] for period in periods])[0]
+    return [('historical', '/api/exchange-rates/historical/', {
+        'from': from_currency, 'to': to_currency, 'period': period,
+    })]
+
+
+def calculator(rng, currencies):
+    """CurrencyCalculator converting one amount"""
+    from_currency, to_currency = rng.sample(currencies, 2)
+    return [('convert', '/api/exchange-rates/convert/', {
+        'amount': str(rng.randint(1, 10_000)), 'from': from_currency, 'to': to_currency,
+    })]
+
+
+# Dashboard interactions: name -> builder of its (endpoint, path, params) requests
+SCENARIOS = {'page': page_view, 'chart': chart_view, 'convert': calculator}
+
+DEFAULT_MIX = {'page': 1, 'chart': 2, 'convert': 1}
+
+
+def parse_mix(value):
+    """{'page': 1, 'chart': 2} from 'page=1,chart=2'"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f'Unknown scenario {name!r}, expected one of {", ".join(SCENARIOS)}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise ValueError(f'Invalid weight {weight!r} for {name}')
+        if mix[name] < 0:
+            raise ValueError(f'Negative weight for {name}')
+    if not any(mix.values()):
+        raise ValueError('At least one scenario needs a positive weight')
+    return mix
+
+
+class EndpointStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.statuses = Counter()
+        self.errors = 0
+
+    def summary(self, elapsed):
+        requests_made = self.histogram.total
+        return {
+            'requests': requests_made,
+            'throughput': round(requests_made / elapsed, 2) if elapsed else 0.0,
+            'errors': self.errors,
+            'error_rate': round(self.errors / requests_made, 4) if requests_made else 0.0,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+            'latency_ms': {
+                f'p{q:g}': round(self.histogram.percentile(q) / 1000, 3) for q in REPORTED_PERCENTILES
+            },
+            'histogram_us': self.histogram.buckets(),
+        }
+
+
+class LoadRun:
+    """One open-loop run of dashboard scenarios against ``base_url``.
+
+    Scenarios start on a Poisson schedule sized so requests average ``rps``
+    per second, whether or not earlier ones finished. Each request's
+    latency counts from when it was due (the scenario's start for its first
+    request, the previous response for the others), so time spent queued
+    behind busy workers is measured instead of hidden.
+    """
+
+    def __init__(self, base_url, rps, duration, concurrency=32, mix=None, currencies=None, timeout=10.0, seed=0):
+        self.base_url = base_url.rstrip('/')
+        self.rps = rps
+        self.duration = duration
+        self.concurrency = concurrency
+        self.mix = mix or DEFAULT_MIX
+        self.currencies = currencies
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._sessions = threading.local()
+
+    def _session(self):
+        session = getattr(self._sessions, 'session', None)
+        if session is None:
+            session = self._sessions.session = requests.Session()
+        return session
+
+    def _record(self, endpoint, started, status):
+        latency_us = (time.perf_counter() - started) * 1e6
+        with self._lock:
+            stats = self.stats.setdefault(endpoint, EndpointStats())
+            stats.histogram.record(latency_us)
+            stats.statuses[status] += 1
+            if status == 'error' or status >= 400:
+                stats.errors += 1
+
+    def _run_scenario(self, requests_to_make, due):
+        session = self._session()
+        for endpoint, path, params in requests_to_make:
+            try:
+                response = session.get(self.base_url + path, params=params, timeout=self.timeout)
+                status = response.status_code
+            except requests.RequestException:
+                status = 'error'
+            self._record(endpoint, due, status)
+            due = time.perf_counter()
+
+    def fetch_currencies(self):
+        """Currencies quoted on the latest day, as the dashboard's dropdowns list them"""
+        response = requests.get(f'{self.base_url}/api/exchange-rates/latest/', timeout=self.timeout)
+        response.raise_for_status()
+        return ['USD', *response.json()['rates']]
+
+    def run(self):
+        """Replay the mix for ``duration`` seconds; returns the report"""
+        currencies = list(self.currencies or self.fetch_currencies())
+        names = [name for name, weight in self.mix.items() if weight > 0]
+        weights = [self.mix[name] for name in names]
+        # Sample the mix to turn the request rate into a scenario rate
+        sampled = [len(SCENARIOS[name](self.rng, currencies)) for name in self.rng.choices(names, weights, k=1000)]
+        scenario_rate = self.rps / (sum(sampled) / len(sampled))
+
+        started = time.perf_counter()
+        next_start = started
+        scheduled = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while next_start < started + self.duration:
+                delay = next_start - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                name = self.rng.choices(names, weights)[0]
+                executor.submit(self._run_scenario, SCENARIOS[name](self.rng, currencies), next_start)
+                scheduled += 1
+                next_start += self.rng.expovariate(scenario_rate)
+        elapsed = time.perf_counter() - started
+        return self.report(elapsed, scheduled)
+
+    def report(self, elapsed, scenarios):
+        total = EndpointStats()
+        for stats in self.stats.values():
+            total.histogram.merge(stats.histogram)
+            total.statuses.update(stats.statuses)
+            total.errors += stats.errors
+        return {
+            'meta': {
+                'url': self.base_url,
+                'target_rps': self.rps,
+                'duration': round(elapsed, 3),
+                'concurrency': self.concurrency,
+                'mix': self.mix,
+                'scenarios': scenarios,
+            },
+            'total': total.summary(elapsed),
+            'endpoints': {endpoint: stats.summary(elapsed) for endpoint, stats in sorted(self.stats.items())},
+        }
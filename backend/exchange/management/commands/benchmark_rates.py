@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django_redis import get_redis_connection
+from exchange.benchmark import CURRENCIES, ENDPOINTS, PERCENTILES, compare, read_results, run_benchmarks, write_results
+
+try:
+    import fakeredis
+    import fakeredis.aioredis
+except ImportError:  # only needed without --redis-url
+    fakeredis = None
+
+class Command(BaseCommand):
+    help = 'Benchmark the rate endpoints against synthetic datasets and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years',
+            nargs='+',
+            type=float,
+            default=[1, 10, 50],
+            help='Dataset sizes in years of business days',
+        )
+        parser.add_argument('--currencies', type=int, default=30, choices=range(1, len(CURRENCIES) + 1), metavar='N')
+        parser.add_argument('--iterations', type=int, default=50, help='Warm requests per endpoint')
+        parser.add_argument('--cold-iterations', type=int, default=5, help='Cold requests per endpoint')
+        parser.add_argument(
+            '--endpoints',
+            nargs='+',
+            choices=[name for name, _, _ in ENDPOINTS],
+            help='Endpoints to benchmark (default: all)',
+        )
+        parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results')
+        parser.add_argument('--baseline', help='Results file to compare against')
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Write the results to --baseline instead of comparing',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Allowed relative slowdown before a result counts as a regression',
+        )
+        parser.add_argument(
+            '--min-ms',
+            type=float,
+            default=1.0,
+            help='Slowdowns smaller than this many milliseconds are never regressions',
+        )
+        parser.add_argument('--metric', default='p95', choices=[f'p{q}' for q in PERCENTILES])
+        parser.add_argument(
+            '--redis-url',
+            help='Cache in this Redis database instead of an in-process fakeredis server; it must be '
+                 'empty and not the configured cache',
+        )
+
+    def handle(self, *args, **options):
+        if options['update_baseline'] and not options['baseline']:
+            raise CommandError('--update-baseline needs --baseline')
+        years = [int(size) if float(size).is_integer() else size for size in options['years']]
+
+        # Requests go through django.test.Client, which sends Host: testserver
+        allowed_hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ALLOWED_HOSTS=allowed_hosts, **self.cache_settings(options['redis_url'])):
+            if options['redis_url'] and get_redis_connection("default").dbsize():
+                raise CommandError(f'{options["redis_url"]} is not empty')
+            # Synthetic data goes into a throwaway test database, never the real one
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                results = run_benchmarks(
+                    years=years,
+                    currencies=options['currencies'],
+                    iterations=options['iterations'],
+                    cold_iterations=options['cold_iterations'],
+                    endpoints=options['endpoints'],
+                    progress=self.stdout.write,
+                )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results['meta']['cache'] = 'redis' if options['redis_url'] else 'fakeredis'
+        write_results(results, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(results["results"])} results to {options["output"]}'))
+
+        if options['update_baseline']:
+            write_results(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'Updated baseline {options["baseline"]}'))
+        elif options['baseline']:
+            regressions = compare(
+                results, read_results(options['baseline']),
+                threshold=options['threshold'], min_ms=options['min_ms'], metric=options['metric'],
+            )
+            for key, what, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f'{key}: {what} {before} -> {after}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
+
+    @staticmethod
+    def cache_settings(redis_url):
+        """Settings pointing the rate cache away from the one live workers use"""
+        cache = dict(settings.CACHES['default'])
+        if redis_url:
+            if redis_url == cache['LOCATION']:
+                raise CommandError('--redis-url must not be the configured cache')
+            cache['LOCATION'] = redis_url
+            # Pub/sub isn't scoped to a database, so evictions get a channel of their own
+            return {
+                'CACHES': {**settings.CACHES, 'default': cache},
+                'RATES_INVALIDATION_CHANNEL': 'rate_cache_invalidate:benchmark',
+            }
+        if fakeredis is None:
+            raise CommandError('Without --redis-url the benchmark needs the fakeredis package')
+
+        server = fakeredis.FakeServer()
+        cache['OPTIONS'] = {
+            **cache.get('OPTIONS', {}),
+            'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeRedisConnection, 'server': server},
+        }
+        return {
+            'CACHES': {**settings.CACHES, 'default': cache},
+            'RATES_ASYNC_REDIS_POOL_KWARGS': {
+                'connection_class': fakeredis.aioredis.FakeAsyncRedisConnection, 'server': server,
+            },
+        }
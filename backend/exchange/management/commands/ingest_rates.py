@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from datetime import date
+import json
+import time
+from exchange.cache import warm_rate_cache
+from exchange.ingest import ingest_new_days, rate_source
+
+class Command(BaseCommand):
+    help = 'Upsert the days a rate source has after the latest stored one'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            help='Dotted path of an exchange.ingest.RateSource (default: RATES_INGEST_SOURCE)',
+        )
+        parser.add_argument(
+            '--drop-dir',
+            help='Directory of <YYYY-MM-DD>.json files for FileDropSource (default: RATES_INGEST_DROP_DIR)',
+        )
+        parser.add_argument(
+            '--since',
+            type=date.fromisoformat,
+            help='Re-read days after this date, to pick up corrections (default: the latest stored day)',
+        )
+        parser.add_argument(
+            '--names-file',
+            default='backend/exchange/historical_data/currency_names.json',
+        )
+        parser.add_argument(
+            '--warm',
+            action='store_true',
+            help='Rebuild the latest, previous and historical keys the new days evicted',
+        )
+
+    def handle(self, *args, **options):
+        start = time.time()
+        try:
+            with open(options['names_file'], 'r') as file:
+                currency_dict = json.load(file)
+        except FileNotFoundError:
+            currency_dict = {}
+
+        try:
+            source_kwargs = {'directory': options['drop_dir']} if options['drop_dir'] else {}
+            source = rate_source(options['source'], **source_kwargs)
+            result = ingest_new_days(source, since=options['since'], currency_names=currency_dict)
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Upserted {len(result.changed)} days, evicted {len(result.evicted)} cache keys '
+                    f'in {(time.time() - start) * 1000:.0f}ms'
+                )
+            )
+
+            if result.evicted and options['warm']:
+                warmed = warm_rate_cache(keys=result.evicted)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Warmed {warmed.warmed} cache keys, skipped {warmed.skipped}'
+                ))
+
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error ingesting rates: {str(e)}')
+            )
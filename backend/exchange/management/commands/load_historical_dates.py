@@ -1,46 +1,56 @@
 from django.core.management.base import BaseCommand
 import json
-from exchange.models import ExchangeRate, Currency
-from datetime import datetime
+from exchange.cache import warm_rate_cache
+from exchange.ingest import iter_daily_rates, load_exchange_rates
 
 class Command(BaseCommand):
     help = 'Load historical exchange rates from JSON file'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rates-file',
+            default='backend/exchange/historical_data/all_historical_rates.json',
+        )
+        parser.add_argument(
+            '--names-file',
+            default='backend/exchange/historical_data/currency_names.json',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Days written per bulk insert',
+        )
+        parser.add_argument(
+            '--warm',
+            action='store_true',
+            help='Warm the rates cache when new days were loaded',
+        )
+
+    def handle(self, *args, **options):
         try:
-            with open('backend/exchange/historical_data/all_historical_rates.json', 'r') as file:
-                data = json.load(file)
-            base_currency = data['base']
-            with open('backend/exchange/historical_data/currency_names.json', 'r') as file:
+            with open(options['names_file'], 'r') as file:
                 currency_dict = json.load(file)
-            
-            for date_string, daily_rates in data['rates'].items():
-                date = datetime.strptime(date_string, '%Y-%m-%d').date()
-                exchange_rate = ExchangeRate.objects.create(
-                    base=base_currency,
-                    date=date,
-                    rates=daily_rates 
-                )
-            
-            unique_currencies = set()
-            for daily_rates in data['rates'].values():
-                unique_currencies.update(daily_rates.keys())
-            unique_currencies.add('USD')
 
-            for currency_code in unique_currencies:
-                currency_name = currency_dict.get(currency_code, currency_code)
-                Currency.objects.get_or_create(
-                    code=currency_code,
-                    defaults={'name': currency_name}
-                )
+            loaded = load_exchange_rates(
+                iter_daily_rates(options['rates_file']),
+                batch_size=options['batch_size'],
+                currency_names=currency_dict,
+            )
             
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'Successfully loaded exchange rates for {len(data["rates"])} days'
+                    f'Successfully loaded exchange rates for {len(loaded)} days'
                 )
             )
+
+            if loaded and options['warm']:
+                result = warm_rate_cache()
+                self.stdout.write(self.style.SUCCESS(
+                    f'Warmed {result.warmed} cache keys, skipped {result.skipped}'
+                ))
             
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error loading data: {str(e)}')
-            )
\ No newline at end of file
+            )
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+import json
+from exchange.loadgen import DEFAULT_MIX, LoadRun, parse_mix
+
+class Command(BaseCommand):
+    help = 'Replay the dashboard request mix against a running server at a target request rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Server to load')
+        parser.add_argument('--rps', type=float, default=50, help='Target requests per second')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to keep starting scenarios')
+        parser.add_argument('--concurrency', type=int, default=32, help='Scenarios in flight at once')
+        parser.add_argument(
+            '--mix',
+            default=','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()),
+            help='Scenario weights: page (names, latest, previous), chart (historical), convert',
+        )
+        parser.add_argument(
+            '--currencies',
+            nargs='+',
+            help='Currencies to pick bases and pairs from (default: those quoted on the latest day)',
+        )
+        parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout in seconds')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the full report, histograms included, as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['rps'] <= 0 or options['duration'] <= 0:
+            raise CommandError('--rps and --duration must be positive')
+
+        run = LoadRun(
+            options['url'],
+            rps=options['rps'],
+            duration=options['duration'],
+            concurrency=options['concurrency'],
+            mix=mix,
+            currencies=options['currencies'],
+            timeout=options['timeout'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f'Loading {options["url"]} at {options["rps"]:g} req/s for {options["duration"]:g}s')
+        report = run.run()
+
+        columns = ('p50', 'p90', 'p99', 'p99.9', 'p100')
+        self.stdout.write(
+            f'{"endpoint":<16}{"requests":>9}{"req/s":>9}{"errors":>8}'
+            + ''.join(f'{column:>10}' for column in columns) + '  (ms)'
+        )
+        for name, summary in [*report['endpoints'].items(), ('total', report['total'])]:
+            self.stdout.write(
+                f'{name:<16}{summary["requests"]:>9}{summary["throughput"]:>9.1f}{summary["errors"]:>8}'
+                + ''.join(f'{summary["latency_ms"][column]:>10.2f}' for column in columns)
+            )
+
+        total = report['total']
+        style = self.style.SUCCESS if not total['errors'] else self.style.WARNING
+        self.stdout.write(style(
+            f'{total["throughput"]:.1f} req/s achieved of {options["rps"]:g} targeted, '
+            f'error rate {total["error_rate"]:.2%}'
+        ))
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote report to {options["output"]}'))
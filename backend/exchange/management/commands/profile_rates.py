@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from exchange.profiling import PROFILE_HEADER, ProfileStore, folded_lines, make_profile_token, merged_stacks
+
+class Command(BaseCommand):
+    help = 'Issue profiling tokens, and list or export the profiles captured by ProfilingMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['token', 'list', 'export'],
+            help='token: print a signed header value; list: show captured profiles; export: write folded stacks',
+        )
+        parser.add_argument('ids', nargs='*', help='Profiles to export (default: all)')
+        parser.add_argument('--label', default='', help='Label stored with profiles the token triggers')
+        parser.add_argument('--view', help='Only profiles of this view name, e.g. exchange-rates-latest')
+        parser.add_argument('--output', help='Where to export to (default: stdout)')
+        parser.add_argument('--dir', help='Profile directory (default: RATES_PROFILE_DIR)')
+
+    def handle(self, *args, **options):
+        if options['action'] == 'token':
+            self.stdout.write(f'{PROFILE_HEADER}: {make_profile_token(options["label"])}')
+            return
+
+        store = ProfileStore(options['dir'])
+        ids = options['ids'] or store.ids()
+        try:
+            profiles = [store.load(profile_id) for profile_id in ids]
+        except FileNotFoundError as e:
+            raise CommandError(f'No such profile: {e.filename}')
+        if options['view']:
+            profiles = [profile for profile in profiles if profile['view'] == options['view']]
+
+        if options['action'] == 'list':
+            self.list(profiles)
+        else:
+            self.export(profiles, options['output'])
+
+    def list(self, profiles):
+        self.stdout.write(
+            f'{"id":<30}{"view":<36}{"status":>7}{"ms":>10}{"samples":>9}  {"trigger":<8} path'
+        )
+        for profile in profiles:
+            self.stdout.write(
+                f'{profile["id"]:<30}{profile["view"]:<36}{profile["status"]:>7}{profile["duration_ms"]:>10.2f}'
+                f'{profile["samples"]:>9}  {profile["trigger"]:<8} {profile["path"]}'
+            )
+        self.stdout.write(f'{len(profiles)} profiles')
+
+    def export(self, profiles, output):
+        if not profiles:
+            raise CommandError('No profiles to export')
+        lines = folded_lines(merged_stacks(profiles))
+        if not output:
+            self.stdout.write('\n'.join(lines))
+            return
+        with open(output, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {sum(profile["samples"] for profile in profiles)} samples of {len(profiles)} profiles to {output}'
+        ))
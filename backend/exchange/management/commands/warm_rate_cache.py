@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+import time
+from exchange.cache import warm_rate_cache
+from exchange.formats import SERIES_FORMATS
+from exchange.payloads import PERIODS
+
+class Command(BaseCommand):
+    help = 'Pre-populate Redis with the latest, previous and hot historical rates payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bases',
+            nargs='+',
+            help='Currencies to warm (default: the currencies quoted on the latest day)',
+        )
+        parser.add_argument(
+            '--periods',
+            nargs='+',
+            choices=list(PERIODS),
+            help='Historical periods to warm (default: RATES_WARM_PERIODS)',
+        )
+        parser.add_argument(
+            '--formats',
+            nargs='*',
+            choices=list(SERIES_FORMATS),
+            default=[],
+            help='Series formats to encode besides JSON (default: none; others are built on first request)',
+        )
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        start = time.time()
+        last_report = [0]
+
+        def progress(done, total):
+            # Report roughly every 10% so long runs stay readable
+            if done == total or done - last_report[0] >= max(total // 10, 1):
+                last_report[0] = done
+                self.stdout.write(f'Built {done}/{total} payloads')
+
+        result = warm_rate_cache(
+            bases=options['bases'],
+            periods=options['periods'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            progress=progress,
+            formats=options['formats'],
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Warmed {result.warmed} cache keys, skipped {result.skipped} '
+                f'in {time.time() - start:.1f}s'
+            )
+        )
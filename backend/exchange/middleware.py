@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from .instrumentation import current_timings, finish_request, metrics, start_request
+from .profiling import PROFILE_ID_HEADER, ProfileStore, Sampler, profile_record, profile_trigger, profiled_app
+
+
+class ServerTimingMiddleware:
+    """Time each request's phases, report them in Server-Timing and aggregate them.
+
+    Phases are recorded by instrumentation.timed() blocks and the query
+    timer while the request is served; this adds DRF rendering and the
+    total. RATES_SERVER_TIMING = False keeps the header out of responses
+    while metrics are still collected.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_request(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this returns
+        timings = current_timings()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda _: timings.add('render', time.perf_counter() - started))
+        return response
+
+    def finish(self, request, response, timings, total):
+        size = None if response.streaming else len(response.content)
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        metrics.observe_request(view, response.status_code, total, timings, size)
+        if getattr(settings, 'RATES_SERVER_TIMING', True):
+            response['Server-Timing'] = timings.server_timing(total, size)
+        return response
+
+
+class ProfilingMiddleware:
+    """Sample the stacks of this app's views for opted-in requests.
+
+    A request is profiled when it carries a valid signed PROFILE_HEADER
+    (see the profile_rates command) or is picked at RATES_PROFILE_SAMPLE_RATE.
+    Its folded stacks are saved to the on-disk ProfileStore, and the
+    response names the profile in PROFILE_ID_HEADER.
+
+    Under ASGI a sync view runs on asgiref's thread-sensitive executor, not
+    on the thread running this middleware, so process_view, which runs on
+    that same thread, calls sync views itself with the sampler watching it.
+    Async views run on the event loop thread, so their samples also catch
+    whatever else it ran.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profiled = self.trigger(request)
+        if profiled is None:
+            return self.get_response(request)
+        trigger, view_func = profiled
+        sampler = self.start_sampler(ProfilingMiddleware.__call__.__code__) if iscoroutinefunction(view_func) else None
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop() if sampler else request._rates_profile_stacks
+        return self.save(request, response, trigger, stacks, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        profiled = self.trigger(request)
+        if profiled is None:
+            return await self.get_response(request)
+        trigger, view_func = profiled
+        sampler = self.start_sampler() if iscoroutinefunction(view_func) else None
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stacks = sampler.stop() if sampler else request._rates_profile_stacks
+        return self.save(request, response, trigger, stacks, time.perf_counter() - started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Skips the process_view of the middleware after this one, none of
+        # which act on this app's views
+        if not hasattr(request, '_rates_profile_stacks') or iscoroutinefunction(view_func):
+            return None
+        sampler = self.start_sampler(ProfilingMiddleware.process_view.__code__)
+        try:
+            return view_func(request, *view_args, **view_kwargs)
+        finally:
+            request._rates_profile_stacks = sampler.stop()
+
+    @staticmethod
+    def trigger(request):
+        """(trigger, view function) when ``request`` is profiled, else None"""
+        trigger = profile_trigger(request)
+        if trigger is None:
+            return None
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return None
+        if not profiled_app(match.func):
+            return None
+        # Filled by process_view for sync views
+        request._rates_profile_stacks = Counter()
+        return trigger, match.func
+
+    @staticmethod
+    def start_sampler(stop_code=None):
+        return Sampler(threading.get_ident(), settings.RATES_PROFILE_INTERVAL, stop_code).start()
+
+    @staticmethod
+    def save(request, response, trigger, stacks, seconds):
+        kind, label = trigger
+        record = profile_record(request, response, kind, label, stacks, seconds, settings.RATES_PROFILE_INTERVAL)
+        response[PROFILE_ID_HEADER] = ProfileStore().save(record)
+        return response
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+
+
+def backfill_daily_rates(apps, schema_editor):
+    ExchangeRate = apps.get_model('exchange', 'ExchangeRate')
+    DailyRate = apps.get_model('exchange', 'DailyRate')
+
+    # Keyed on date so duplicate days keep the row stored last
+    days = {}
+    for day, base, rates in ExchangeRate.objects.order_by('date', 'id').values_list('date', 'base', 'rates').iterator():
+        day_rates = dict(rates)
+        day_rates.setdefault(base, 1.0)
+        days[day] = day_rates
+
+    DailyRate.objects.bulk_create(
+        (
+            DailyRate(date=day, currency=currency, rate=rate)
+            for day, day_rates in days.items()
+            for currency, rate in day_rates.items()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('currency', models.CharField(max_length=3)),
+                ('rate', models.FloatField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('currency', 'date'), include=('rate',), name='unique_daily_rate_currency_date')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+def drop_duplicate_days(apps, schema_editor):
+    # DailyRate follows the row stored last for a day, so that's the one kept
+    ExchangeRate = apps.get_model('exchange', 'ExchangeRate')
+
+    kept = {}
+    duplicates = []
+    for pk, day, base in ExchangeRate.objects.order_by('id').values_list('id', 'date', 'base').iterator():
+        if (day, base) in kept:
+            duplicates.append(kept[day, base])
+        kept[day, base] = pk
+    ExchangeRate.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0002_dailyrate'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_days, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('date', 'base'), name='unique_exchange_rate_date_base'),
+        ),
+    ]
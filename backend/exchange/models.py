@@ -19,6 +19,10 @@ class ExchangeRate(models.Model):
     
     class Meta:
         indexes = [models.Index(fields=['date'])]
+        constraints = [
+            # Incremental ingest upserts on it (see ingest.upsert_exchange_rates)
+            models.UniqueConstraint(fields=['date', 'base'], name='unique_exchange_rate_date_base'),
+        ]
         get_latest_by = 'date'
     
     def get_rate(self, from_currency, to_currency):
@@ -31,19 +35,56 @@ class ExchangeRate(models.Model):
             return self.rates.get(to_currency) / self.rates.get(from_currency)
 
     def get_rates_for_base(self, base_currency):
-        import logging
-        logger = logging.getLogger(__name__)
-
-        
         if base_currency == self.base:
             return self.rates
-            
-        converted_rates = {}
+
         base_rate = self.rates[base_currency]
-        
-        for currency, rate in self.rates.items():
-            if currency != base_currency:
-                converted_rates[currency] = rate / base_rate                        
-                
+        converted_rates = {
+            currency: rate / base_rate
+            for currency, rate in self.rates.items()
+            if currency != base_currency
+        }
         converted_rates[self.base] = 1 / base_rate
         return converted_rates
+
+    def to_daily_rates(self):
+        rates = dict(self.rates)
+        rates.setdefault(self.base, 1.0)
+        return [
+            DailyRate(date=self.date, currency=currency, rate=rate)
+            for currency, rate in rates.items()
+        ]
+
+
+class DailyRate(models.Model):
+    """Narrow (date, currency, rate) copy of ExchangeRate.rates.
+
+    Rates are quoted against that day's ExchangeRate base, which is stored
+    here too with a rate of 1.0, so a pair is always rate[to] / rate[from].
+    Keyed on (currency, date) because a day has one ExchangeRate; ingest
+    replaces a stored day that arrives with another base.
+    """
+    date = models.DateField()
+    currency = models.CharField(max_length=3)
+    rate = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Covering index: a single currency's series is an index-only scan
+            models.UniqueConstraint(
+                fields=['currency', 'date'],
+                include=['rate'],
+                name='unique_daily_rate_currency_date',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.currency} {self.rate}"
+
+    @classmethod
+    def sync_day(cls, day):
+        """Rebuild one day's rows from the ExchangeRate stored last for it"""
+        cls.objects.filter(date=day).delete()
+        exchange_rate = ExchangeRate.objects.filter(date=day).order_by('id').last()
+        if exchange_rate is not None:
+            cls.objects.bulk_create(exchange_rate.to_daily_rates())
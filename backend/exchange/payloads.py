@@ -0,0 +1,154 @@
+import hashlib
+import math
+from collections import namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+
+from .analytics import series_stats
+from .downsampling import lttb, ohlc
+from .formats import SERIES_FORMATS
+
+PERIODS = {
+    '1w': 7,
+    '1m': 30,
+    '1y': 365,
+    '5y': 365 * 5,
+    '10y': 365 * 10
+}
+
+# ``since`` is the earliest day the payload was built from and ``until`` the
+# last one, None for payloads reaching the latest day (see
+# cache.invalidate_rates); ``modified`` is the latest day stored when it was
+# built and ``formats`` the formats.SERIES_FORMATS it's also cached in
+Payload = namedtuple('Payload', ['key', 'data', 'since', 'modified', 'formats', 'until'], defaults=[(), None])
+
+
+def latest_key(base):
+    return f"latest_rates_{base}"
+
+
+def previous_key(base):
+    return f"previous_rates_{base}"
+
+
+def historical_key(from_currency, to_currency, period, points=None, resolution=None):
+    key = f"historical_rates_{from_currency}_{to_currency}_{period}"
+    if resolution:
+        key += f"_{resolution}"
+    elif points:
+        key += f"_p{points}"
+    return key
+
+
+def historical_batch_key(pairs, period):
+    pair_list = ','.join(f'{from_currency}-{to_currency}' for from_currency, to_currency in pairs)
+    return f"historical_batch_{period}_{hashlib.blake2b(pair_list.encode(), digest_size=12).hexdigest()}"
+
+
+def historical_year_key(from_currency, to_currency, year):
+    return f"historical_year_{from_currency}_{to_currency}_{year}"
+
+
+def analytics_key(from_currency, to_currency, period):
+    return f"analytics_{from_currency}_{to_currency}_{period}"
+
+
+def latest_payload(matrix, base):
+    latest = matrix.latest_index()
+    day = matrix.date_at(latest)
+    return Payload(latest_key(base), matrix.snapshot(latest, base), day, day)
+
+
+def previous_payload(matrix, base):
+    previous = matrix.latest_index(offset=1)
+    return Payload(
+        previous_key(base), matrix.snapshot(previous, base),
+        matrix.date_at(previous), matrix.last_date,
+    )
+
+
+def historical_payload(matrix, from_currency, to_currency, period, points=None, resolution=None):
+    """Daily series for a pair, optionally reduced.
+
+    ``resolution`` ('weekly'/'monthly') returns OHLC buckets whose ``rate``
+    is the close; ``points`` keeps that many LTTB-selected daily points.
+    """
+    days = PERIODS[period]
+    dates, rates = matrix.series(from_currency, to_currency, days)
+    data = {
+        'from': from_currency,
+        'to': to_currency,
+        'period': period,
+    }
+
+    if resolution:
+        starts, opens, highs, lows, closes = ohlc(dates, rates, resolution)
+        data['resolution'] = resolution
+        data['data'] = [
+            {'date': day, 'rate': close, 'open': open_, 'high': high, 'low': low, 'close': close}
+            for day, open_, high, low, close in zip(
+                np.datetime_as_string(starts).tolist(),
+                opens.tolist(), highs.tolist(), lows.tolist(), closes.tolist(),
+            )
+        ]
+    else:
+        if points:
+            dates, rates = lttb(dates, rates, points)
+            data['points'] = points
+        data['data'] = [
+            {'date': day, 'rate': rate}
+            for day, rate in zip(np.datetime_as_string(dates).tolist(), rates.tolist())
+        ]
+
+    end_date = matrix.date_at(matrix.latest_index())
+    start_date = end_date - timedelta(days=days)
+    key = historical_key(from_currency, to_currency, period, points, resolution)
+    return Payload(key, data, start_date, end_date, tuple(SERIES_FORMATS))
+
+
+def historical_year_payload(matrix, from_currency, to_currency, year):
+    """One calendar year of a pair's daily rates, the cached chunk of date-range queries"""
+    first_day, last_day = date(year, 1, 1), date(year, 12, 31)
+    dates, rates = matrix.series_between(from_currency, to_currency, first_day, last_day)
+    data = [
+        {'date': day, 'rate': rate}
+        for day, rate in zip(np.datetime_as_string(dates).tolist(), rates.tolist())
+    ]
+    return Payload(
+        historical_year_key(from_currency, to_currency, year), data,
+        first_day, matrix.last_date, until=last_day,
+    )
+
+
+def analytics_payload(matrix, from_currency, to_currency, period):
+    """Returns, volatility, moving averages, extremes and drawdown of a pair over a period"""
+    days = PERIODS[period]
+    dates, rates = matrix.series(from_currency, to_currency, days)
+    end_date = matrix.date_at(matrix.latest_index())
+    return Payload(
+        analytics_key(from_currency, to_currency, period), series_stats(dates, rates),
+        end_date - timedelta(days=days), end_date,
+    )
+
+
+def historical_batch_payload(matrix, pairs, period):
+    """Several pairs over one window in columnar form.
+
+    One shared ``dates`` array and one rate array per pair, keyed
+    ``FROM/TO``; days a pair has no rate for are null.
+    """
+    days = PERIODS[period]
+    dates, block = matrix.series_block(pairs, days)
+    series = {}
+    for (from_currency, to_currency), rates in zip(pairs, block.T):
+        series[f'{from_currency}/{to_currency}'] = [
+            None if math.isnan(rate) else rate for rate in rates.tolist()
+        ]
+    data = {
+        'period': period,
+        'dates': np.datetime_as_string(dates).tolist(),
+        'series': series,
+    }
+    end_date = matrix.date_at(matrix.latest_index())
+    return Payload(historical_batch_key(pairs, period), data, end_date - timedelta(days=days), end_date)
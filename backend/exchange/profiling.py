@@ -0,0 +1,174 @@
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+# Request header carrying a token from make_profile_token()
+PROFILE_HEADER = 'X-Rates-Profile'
+PROFILE_ID_HEADER = 'X-Rates-Profile-Id'
+
+_SALT = 'exchange.profiling'
+
+
+def make_profile_token(label=''):
+    """Signed value for PROFILE_HEADER; ``label`` is stored with the profiles it triggers"""
+    return signing.dumps(label, salt=_SALT)
+
+
+def read_profile_token(token):
+    """The token's label, or None when it's forged or older than RATES_PROFILE_TOKEN_MAX_AGE"""
+    try:
+        return signing.loads(token, salt=_SALT, max_age=settings.RATES_PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
+def profile_trigger(request):
+    """('header', label) or ('sampled', '') when ``request`` should be profiled, else None"""
+    token = request.headers.get(PROFILE_HEADER)
+    if token:
+        label = read_profile_token(token)
+        if label is not None:
+            return 'header', label
+    rate = settings.RATES_PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        return 'sampled', ''
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename):
+    for marker in ('site-packages/', 'dist-packages/'):
+        if marker in filename:
+            return filename.rsplit(marker, 1)[1]
+    try:
+        return str(Path(filename).relative_to(settings.BASE_DIR))
+    except ValueError:
+        return filename
+
+
+def fold(frame, stop_code=None):
+    """Folded stack of ``frame``, outermost first, up to the frame running ``stop_code``"""
+    names = []
+    while frame is not None and frame.f_code is not stop_code:
+        code = frame.f_code
+        names.append(f'{code.co_qualname} ({_short_path(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Samples one thread's stack every ``interval`` seconds from a background thread.
+
+    Nothing runs in the sampled thread itself, so the overhead is a GIL
+    handoff per sample. Stacks are cut at the frame running ``stop_code``
+    (the profiling middleware), keeping the server's frames out.
+    """
+
+    def __init__(self, thread_id, interval, stop_code=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stop_code = stop_code
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rates-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = fold(frame, self.stop_code)
+                # Taken while the thread was already in stop()
+                if not self._stopped.is_set():
+                    self.stacks[stack] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+
+class ProfileStore:
+    """Captured profiles as JSON files in ``directory``, keeping the newest ``max_profiles``.
+
+    Ids sort in capture order, so the ring buffer drops the oldest files
+    whenever a save takes it over the limit.
+    """
+
+    def __init__(self, directory=None, max_profiles=None):
+        self.directory = Path(directory or settings.RATES_PROFILE_DIR)
+        self.max_profiles = max_profiles or settings.RATES_PROFILE_MAX_COUNT
+
+    def ids(self):
+        if not self.directory.is_dir():
+            return []
+        return sorted(path.stem for path in self.directory.glob('*.json'))
+
+    def save(self, profile):
+        """Write ``profile`` under a new id, dropping the oldest ones past the limit; returns the id"""
+        profile_id = f'{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{secrets.token_hex(3)}'
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f'{profile_id}.json'
+        partial = path.with_suffix('.tmp')
+        with open(partial, 'w') as file:
+            json.dump({'id': profile_id, **profile}, file, separators=(',', ':'))
+        os.replace(partial, path)
+
+        for old_id in self.ids()[:-self.max_profiles]:
+            try:
+                (self.directory / f'{old_id}.json').unlink()
+            except FileNotFoundError:  # dropped by another worker
+                pass
+        return profile_id
+
+    def load(self, profile_id):
+        with open(self.directory / f'{profile_id}.json', 'r') as file:
+            return json.load(file)
+
+
+def merged_stacks(profiles):
+    """Folded stack counts summed over ``profiles``"""
+    stacks = Counter()
+    for profile in profiles:
+        stacks.update(profile['stacks'])
+    return stacks
+
+
+def folded_lines(stacks):
+    """``stack count`` lines, the input of flamegraph.pl, speedscope and inferno"""
+    return [f'{stack} {count}' for stack, count in sorted(stacks.items()) if stack]
+
+
+def profile_record(request, response, trigger, label, stacks, seconds, interval):
+    match = request.resolver_match
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': match.view_name if match else '',
+        'status': response.status_code,
+        'duration_ms': round(seconds * 1000, 3),
+        'interval_ms': interval * 1000,
+        'trigger': trigger,
+        'label': label,
+        'samples': sum(stacks.values()),
+        'stacks': dict(stacks),
+    }
+
+
+def profiled_app(view_func):
+    """Whether ``view_func`` is one of this app's views"""
+    return getattr(view_func, '__module__', '').split('.')[0] == __name__.split('.')[0]
@@ -0,0 +1,485 @@
+import math
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from .crossrates import cross_rate_table
+from .models import DailyRate, ExchangeRate
+
+
+# Bumped by cache.invalidate_rates once a change to the stored rates is
+# committed; see read_generation()
+GENERATION_KEY = 'rate_data_generation'
+
+
+def read_generation(redis_conn=None):
+    """How many committed changes to the stored rates have been announced.
+
+    A matrix refreshed after reading this value holds at least those
+    changes, so payloads built from it are only as old as that generation.
+    """
+    redis_conn = redis_conn or get_redis_connection("default")
+    return int(redis_conn.get(GENERATION_KEY) or 0)
+
+
+class LatestSnapshot:
+    """The latest day's rate between every pair of quoted currencies.
+
+    Built once per new latest day; rates in both directions are stored, and
+    their Decimal forms are kept as they are first used, so converting is a
+    dict lookup and a multiply.
+    """
+
+    def __init__(self, day, cross_rates):
+        self.date = day
+        self.rates = cross_rates
+        self._decimals = {}
+
+    def rate(self, from_currency, to_currency):
+        if from_currency == to_currency and from_currency in self.rates:
+            return 1.0
+        return self.rates[from_currency][to_currency]
+
+    def decimal_rate(self, from_currency, to_currency):
+        pair = (from_currency, to_currency)
+        rate = self._decimals.get(pair)
+        if rate is None:
+            rate = self._decimals[pair] = Decimal(str(self.rate(from_currency, to_currency)))
+        return rate
+
+
+class _MatrixState:
+    """One version of the matrix's dates, currencies and loaded columns.
+
+    Refreshes build a new state and swap it in with one assignment, so a
+    reader that doesn't take the lock sees the old rows or the new ones,
+    never a half-built mix. Columns loaded later, and the caches derived
+    from them, are added to the state without changing what it holds.
+    """
+
+    def __init__(self, dates=None, currencies=(), columns=None):
+        self.dates = np.empty(0, dtype='datetime64[D]') if dates is None else dates
+        self.currencies = list(currencies)
+        self.index = {code: i for i, code in enumerate(self.currencies)}
+        self.columns = columns or {}
+        self.values = None
+        self.cross_tables = {}
+        self.latest = None
+        self.growth = {}
+
+
+class RateMatrix:
+    """In-memory (dates x currencies) view of the stored rates.
+
+    Each row holds the rates of one day against that day's base, with the
+    base itself stored as 1.0, so any cross rate is ``values[:, to] / values[:, from]``
+    no matter which base the row was stored with. Missing rates are NaN.
+
+    The date axis is read up front, currency columns are read from DailyRate
+    the first time they are asked for, so a single pair never pulls the other
+    currencies out of the database.
+    """
+
+    # Days whose cross tables are kept built; latest and previous are the hot ones
+    CROSS_TABLE_DAYS = 8
+
+    # Look-back of the movers ranking: the previous stored day for 1d,
+    # the last day on or before that many calendar days ago otherwise
+    MOVER_HORIZONS = {'1d': None, '1w': 7, '1m': 30, '1y': 365}
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changes = 0
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = _MatrixState()
+            # read_generation() as of the last refresh
+            self.generation = 0
+            self._loaded = False
+            self._stale = True
+            self._needs_full_reload = False
+            self._patch = None
+            self._checked_at = 0.0
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def dates(self):
+        return self._state.dates
+
+    @property
+    def currencies(self):
+        return self._state.currencies
+
+    @property
+    def index(self):
+        return self._state.index
+
+    @property
+    def last_date(self):
+        return self.dates[-1].item() if len(self.dates) else None
+
+    def mark_stale(self, changed_date=None, through=None):
+        """Flag the matrix for a reload on next access.
+
+        New trailing dates are appended incrementally and held days from
+        ``changed_date`` to ``through`` (default: that day) are re-read in
+        place. No date forces a full rebuild.
+        """
+        with self._lock:
+            self._stale = True
+            self._changes += 1
+            last = self.last_date
+            if changed_date is None:
+                self._needs_full_reload = True
+            elif last is not None and changed_date <= last:
+                end = min(through or changed_date, last)
+                if self._patch:
+                    changed_date, end = min(changed_date, self._patch[0]), max(end, self._patch[1])
+                self._patch = (changed_date, end)
+
+    def _needs_refresh(self):
+        poll = getattr(settings, 'RATE_MATRIX_POLL_SECONDS', 60)
+        return self._stale or time.monotonic() - self._checked_at >= poll
+
+    def ensure_fresh(self):
+        if self._needs_refresh():
+            self.refresh()
+        return self
+
+    async def aensure_fresh(self):
+        if self._needs_refresh():
+            await self.arefresh()
+        return self
+
+    def refresh(self):
+        """Catch up with the stored rates; the lock is only held to plan and apply it"""
+        with self._lock:
+            full, since, patch, dates, rows = self._refresh_queries()
+            changes = self._changes
+        # Read before the rows, so they hold every change it counts
+        generation = read_generation()
+        dates, rows = list(dates), list(rows)
+        with self._lock:
+            applied = self._apply_refresh(full, since, patch, changes, dates, rows, generation)
+        if not applied:
+            self.refresh()
+
+    async def arefresh(self):
+        """refresh() in the sync thread, so the event loop never waits on the lock"""
+        await sync_to_async(self.refresh)()
+
+    def _refresh_queries(self):
+        """(full, since, patch, dates, rows) for the next refresh.
+
+        A full reload reads every date and the distinct currency codes, an
+        incremental one the dates and (currency, date, rate) rows after
+        ``since`` and within the ``patch`` (start, end) of changed held days.
+        """
+        if self._needs_full_reload or not self._loaded:
+            codes = DailyRate.objects.order_by('currency').values_list('currency', flat=True).distinct()
+            return True, None, None, self._stored_dates(), codes
+        last = self.last_date
+        days = Q(date__gt=last)
+        if self._patch:
+            days |= Q(date__range=self._patch)
+        rows = DailyRate.objects.filter(days).values_list('currency', 'date', 'rate')
+        return False, last, self._patch, self._stored_dates().filter(days), rows
+
+    def _apply_refresh(self, full, since, patch, changes, dates, rows, generation=0):
+        """Apply a refresh's query results; False when a full reload must follow at once"""
+        # Changes announced while the queries ran need another refresh
+        missed = changes != self._changes
+        missed_full_reload = missed and self._needs_full_reload
+        missed_patch = self._patch if missed else None
+        if full:
+            self._state = _MatrixState(np.array(dates, dtype='datetime64[D]'), rows)
+        elif since == self.last_date:
+            new_dates = [day for day in dates if day > since]
+            state = self._updated_state(patch, dates[:len(dates) - len(new_dates)], new_dates, rows)
+            if state is None:
+                # Days were added or removed inside the patch
+                self._needs_full_reload = True
+                return False
+            self._state = state
+        else:
+            # Another refresh got here first, these rows may already be held
+            return True
+        self.generation = generation
+        self._loaded = True
+        self._stale = missed
+        self._needs_full_reload = missed_full_reload
+        self._patch = missed_patch
+        self._checked_at = time.monotonic()
+        return True
+
+    @staticmethod
+    def _stored_dates():
+        return ExchangeRate.objects.order_by('date').values_list('date', flat=True).distinct()
+
+    def _updated_state(self, patch, held, new_dates, rows):
+        """A new state: the current one with ``new_dates`` appended and
+        (currency, date, rate) ``rows`` filled into its loaded columns.
+
+        Loaded rows from patch start to end are blanked first, for
+        re-filling. ``held`` are the stored dates in that span; None when
+        they aren't the dates this matrix has there.
+        """
+        state = self._state
+        rows = list(rows)
+        if not (new_dates or rows or patch):
+            return state
+        if patch:
+            lo, hi = self.date_range(*patch)
+            if state.dates[lo:hi].tolist() != list(held):
+                return None
+
+        dates = np.concatenate([state.dates, np.array(new_dates, dtype='datetime64[D]')])
+        # Copies, so readers of the current state never see the changes
+        columns = {
+            code: np.concatenate([column, np.full(len(new_dates), np.nan)])
+            for code, column in state.columns.items()
+        }
+        if patch:
+            for column in columns.values():
+                column[lo:hi] = np.nan
+        self._fill(dates, columns, rows)
+        currencies = dict.fromkeys(state.currencies)
+        currencies.update(dict.fromkeys(code for code, _, _ in rows))
+        return _MatrixState(dates, currencies, columns)
+
+    @staticmethod
+    def _fill(dates, columns, rows):
+        grouped = {}
+        for code, day, rate in rows:
+            if code in columns:
+                days, rates = grouped.setdefault(code, ([], []))
+                days.append(day)
+                rates.append(rate)
+
+        for code, (days, rates) in grouped.items():
+            days = np.array(days, dtype='datetime64[D]')
+            positions = np.searchsorted(dates, days).clip(max=len(dates) - 1)
+            known = dates[positions] == days
+            columns[code][positions[known]] = np.array(rates)[known]
+
+    def load_columns(self, codes):
+        """Read the given currency columns with one query over the covering index"""
+        codes = list(codes)
+        with self._lock:
+            state = self._state
+            missing = [code for code in dict.fromkeys(codes) if code not in state.columns]
+            if not missing:
+                return
+            for code in missing:
+                state.index[code]  # unknown currencies raise KeyError
+            # Filled before they're added, so no reader sees a blank column
+            columns = {code: np.full(len(state.dates), np.nan) for code in missing}
+            if len(state.dates):
+                self._fill(
+                    state.dates, columns,
+                    DailyRate.objects.filter(currency__in=missing, date__lte=state.dates[-1].item())
+                    .values_list('currency', 'date', 'rate')
+                    .iterator(),
+                )
+            state.columns.update(columns)
+
+    @property
+    def values(self):
+        with self._lock:
+            state = self._state
+            if state.values is None:
+                self.load_columns(state.currencies)
+                state.values = (
+                    np.column_stack([state.columns[code] for code in state.currencies])
+                    if state.currencies else np.empty((len(state.dates), 0))
+                )
+            return state.values
+
+    def latest_index(self, offset=0):
+        """Row index of the latest day, or ``offset`` days before it"""
+        if len(self.dates) <= offset:
+            raise ExchangeRate.DoesNotExist('ExchangeRate matching query does not exist.')
+        return len(self.dates) - 1 - offset
+
+    def index_as_of(self, day):
+        """Row index of the last stored day on or before ``day``"""
+        i = int(np.searchsorted(self.dates, np.datetime64(day, 'D'), side='right')) - 1
+        if i < 0:
+            raise ExchangeRate.DoesNotExist(f'No rates stored on or before {day}.')
+        return i
+
+    def rows_as_of(self, days):
+        """index_as_of for an array of datetime64[D] days at once, -1 where none is stored"""
+        return np.searchsorted(self.dates, days, side='right') - 1
+
+    def date_at(self, i):
+        return self.dates[i].item()
+
+    def currencies_at(self, i):
+        """Currencies with a rate on row ``i``"""
+        return [code for code, value in zip(self.currencies, self.values[i].tolist()) if not math.isnan(value)]
+
+    def column(self, code):
+        column = self._state.columns.get(code)
+        if column is None:
+            with self._lock:
+                self.load_columns([code])
+                column = self._state.columns[code]
+        return column
+
+    def rate(self, i, from_currency, to_currency):
+        with self._lock:
+            return float(self.column(to_currency)[i] / self.column(from_currency)[i])
+
+    def cross_rates(self, i):
+        """Every base's rates for row ``i``, as {base: {currency: rate}}.
+
+        Built from the day's cross table the first time the day is asked
+        for, so re-basing on the request path is a dict lookup.
+        """
+        with self._lock:
+            cross_tables = self._state.cross_tables
+            tables = cross_tables.get(i)
+            if tables is None:
+                row = self.values[i]
+                rates = {
+                    code: value
+                    for code, value in zip(self.currencies, row.tolist())
+                    if not math.isnan(value)
+                }
+                codes, table = cross_rate_table(rates, next(iter(rates), 'USD'))
+                tables = {
+                    base: {code: rate for code, rate in zip(codes, rates_row) if code != base}
+                    for base, rates_row in zip(codes, table.tolist())
+                }
+                if len(cross_tables) >= self.CROSS_TABLE_DAYS:
+                    cross_tables.pop(next(iter(cross_tables)))
+                cross_tables[i] = tables
+            return tables
+
+    def latest_snapshot(self, build=True):
+        """LatestSnapshot of the latest day, rebuilt when a newer day arrives.
+
+        With ``build=False`` returns None rather than building it, without
+        taking the lock, for callers that can't block on loading columns.
+        """
+        if not build:
+            return self._state.latest
+        with self._lock:
+            state = self._state
+            if state.latest is None:
+                i = self.latest_index()
+                state.latest = LatestSnapshot(self.date_at(i), self.cross_rates(i))
+            return state.latest
+
+    def growth(self, horizon):
+        """(since_row, growth) of the latest day over a MOVER_HORIZONS look-back.
+
+        ``growth`` is every currency's latest stored value over its value on
+        ``since_row`` (NaN where either is missing). The change of any
+        base's rate for currency X is then ``growth[X] / growth[base] - 1``.
+        Built once per new latest day.
+        """
+        with self._lock:
+            state = self._state
+            cached = state.growth.get(horizon)
+            if cached is None:
+                latest = self.latest_index()
+                days = self.MOVER_HORIZONS[horizon]
+                if days is None:
+                    since = max(latest - 1, 0)
+                else:
+                    since_date = self.dates[latest] - np.timedelta64(days, 'D')
+                    since = max(int(np.searchsorted(self.dates, since_date, side='right')) - 1, 0)
+                values = self.values
+                cached = state.growth[horizon] = (since, values[latest] / values[since])
+            return cached
+
+    def rates_for_base(self, i, base_currency):
+        if base_currency not in self.index:
+            raise KeyError(base_currency)
+        return self.cross_rates(i)[base_currency]
+
+    def snapshot(self, i, base_currency):
+        """Same shape as ExchangeRateSerializer output"""
+        return {
+            'date': self.date_at(i).isoformat(),
+            'rates': self.rates_for_base(i, base_currency),
+            'base': base_currency,
+        }
+
+    def window_start(self, days):
+        """Index of the first row within ``days`` days of the latest one"""
+        end = self.latest_index()
+        start_date = self.dates[end] - np.timedelta64(days, 'D')
+        return int(np.searchsorted(self.dates, start_date, side='left'))
+
+    def date_range(self, start, end):
+        """Row bounds [lo, hi) of the days from ``start`` to ``end``, both included"""
+        lo = int(np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left'))
+        hi = int(np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right'))
+        return lo, hi
+
+    def series_between(self, from_currency, to_currency, start, end):
+        """Daily from/to rates from ``start`` to ``end`` as (dates, rates)"""
+        with self._lock:
+            lo, hi = self.date_range(start, end)
+            self.load_columns([from_currency, to_currency])
+            rates = self.column(to_currency)[lo:hi] / self.column(from_currency)[lo:hi]
+            dates = self.dates[lo:hi]
+        present = ~np.isnan(rates)
+        return dates[present], rates[present]
+
+    def series_block(self, pairs, days):
+        """Rates of several (from, to) pairs over one window as (dates, rates[dates x pairs])"""
+        with self._lock:
+            lo = self.window_start(days)
+            self.load_columns(code for pair in pairs for code in pair)
+            numerators = np.column_stack([self.column(to_currency)[lo:] for _, to_currency in pairs])
+            denominators = np.column_stack([self.column(from_currency)[lo:] for from_currency, _ in pairs])
+            return self.dates[lo:], numerators / denominators
+
+    def series(self, from_currency, to_currency, days):
+        """Daily from/to rates over the last ``days`` days as (dates, rates)"""
+        with self._lock:
+            lo = self.window_start(days)
+            self.load_columns([from_currency, to_currency])
+            rates = self.column(to_currency)[lo:] / self.column(from_currency)[lo:]
+            dates = self.dates[lo:]
+        present = ~np.isnan(rates)
+        return dates[present], rates[present]
+
+
+_matrix = RateMatrix()
+
+
+def get_rate_matrix():
+    return _matrix.ensure_fresh()
+
+
+async def aget_rate_matrix():
+    return await _matrix.aensure_fresh()
+
+
+def get_latest_snapshot():
+    return get_rate_matrix().latest_snapshot()
+
+
+def matrix_generation():
+    """read_generation() as of this process's last matrix refresh, without refreshing"""
+    return _matrix.generation
+
+
+def mark_rates_changed(changed_date=None, through=None):
+    """Tell this process's matrix that stored rates changed from ``changed_date`` to ``through``"""
+    _matrix.mark_stale(changed_date, through)
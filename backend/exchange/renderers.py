@@ -0,0 +1,41 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .formats import ARROW_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, SERIES_FORMATS
+
+
+class SeriesRenderer(BaseRenderer):
+    """Renders a historical payload in one of formats.SERIES_FORMATS.
+
+    Anything else, such as validation errors, goes out as JSON.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict) or 'data' not in data:
+            response = (renderer_context or {}).get('response')
+            if response is not None:
+                response['Content-Type'] = 'application/json'
+            return JSONRenderer().render(data)
+        return SERIES_FORMATS[self.format][1](data)
+
+
+class ColumnarRenderer(SeriesRenderer):
+    media_type = COLUMNAR_MEDIA_TYPE
+    format = 'columnar'
+
+
+class MessagePackRenderer(SeriesRenderer):
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+
+
+class ArrowRenderer(SeriesRenderer):
+    media_type = ARROW_MEDIA_TYPE
+    format = 'arrow'
+
+
+# Renderers whose format's optional dependency is installed
+SERIES_RENDERERS = [
+    renderer for renderer in (ColumnarRenderer, MessagePackRenderer, ArrowRenderer)
+    if renderer.format in SERIES_FORMATS
+]
@@ -0,0 +1,113 @@
+import calendar
+import gzip
+import hashlib
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .formats import SERIES_FORMATS
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+# Pre-compressed variants stored next to the raw JSON, in order of preference
+CONTENT_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+VARIANTS = ('identity',) + CONTENT_ENCODINGS
+
+
+def variant_name(fmt, encoding):
+    """Name of a stored body: the encoding for JSON, ``<format>[.<encoding>]`` otherwise"""
+    if fmt == 'json':
+        return encoding
+    return fmt if encoding == 'identity' else f'{fmt}.{encoding}'
+
+
+# Every body a cached payload can have
+ALL_VARIANTS = VARIANTS + tuple(variant_name(fmt, encoding) for fmt in SERIES_FORMATS for encoding in VARIANTS)
+
+
+def _encoded(fmt, raw):
+    variants = {
+        variant_name(fmt, 'identity'): raw,
+        variant_name(fmt, 'gzip'): gzip.compress(raw, compresslevel=9, mtime=0),
+    }
+    if brotli:
+        variants[variant_name(fmt, 'br')] = brotli.compress(raw, quality=9)
+    return variants
+
+
+def encode_payload(data, modified, formats=()):
+    """JSON body of a payload, its compressed copies, ETag and Last-Modified day.
+
+    ``formats`` (keys of SERIES_FORMATS) are encoded and compressed too.
+    """
+    raw = json.dumps(data, default=str, separators=(',', ':')).encode()
+    variants = {
+        'etag': hashlib.blake2b(raw, digest_size=16).hexdigest().encode(),
+        'modified': modified.isoformat().encode(),
+        **_encoded('json', raw),
+    }
+    for fmt in formats:
+        variants.update(_encoded(fmt, SERIES_FORMATS[fmt][1](data)))
+    return variants
+
+
+def preferred_encoding(request):
+    accepted = set()
+    for token in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = token.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(name.strip())
+    for encoding in CONTENT_ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return 'identity'
+
+
+def variant_etag(etag, variant):
+    # Each variant is a different byte sequence, so each gets its own strong ETag
+    return f'"{etag}"' if variant == 'identity' else f'"{etag}-{variant}"'
+
+
+def day_timestamp(day):
+    """Last-Modified timestamp for data whose latest day is ``day`` (midnight UTC)"""
+    return calendar.timegm(day.timetuple())
+
+
+def validator_etag(request, day):
+    """Strong ETag for a response determined by the request and the latest stored day"""
+    validator = f'{request.get_full_path()}|{day.isoformat() if day else ""}'
+    return f'"{hashlib.blake2b(validator.encode(), digest_size=16).hexdigest()}"'
+
+
+def not_modified_response(request, etag, day):
+    """304 (or 412) response when the request's validators match, else None"""
+    return get_conditional_response(
+        request, etag=etag, last_modified=day_timestamp(day) if day else None,
+    )
+
+
+def add_validators(response, etag, day):
+    """Attach ETag, Last-Modified and Cache-Control to a rates response"""
+    response['ETag'] = etag
+    if day:
+        response['Last-Modified'] = http_date(day_timestamp(day))
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'RATES_HTTP_MAX_AGE', 300))
+    return response
+
+
+def encoded_response(body, etag, encoding, fmt='json'):
+    """Send already-encoded bytes as they are, skipping DRF rendering"""
+    content_type = 'application/json' if fmt == 'json' else SERIES_FORMATS[fmt][0]
+    response = HttpResponse(body, content_type=content_type)
+    response['ETag'] = variant_etag(etag, variant_name(fmt, encoding))
+    response['Content-Length'] = str(len(body))
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    return response
@@ -23,20 +23,3 @@ class ExchangeRateSerializer(serializers.ModelSerializer):
             representation['base'] = base_currency
             
         return representation
-    
-class HistoricalRateSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = ExchangeRate
-        fields = ['date', 'rates']
-
-    def to_representation(self, instance):
-      
-        request = self.context.get('request')
-        from_currency = request.query_params.get('from', 'USD')
-        to_currency = request.query_params.get('to')
-        rate = instance.get_rate(from_currency, to_currency)
-        
-        return {
-            'date': instance.date,
-            'rate': rate
-        }
@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_rates
+from .models import DailyRate, ExchangeRate
+from .rate_matrix import mark_rates_changed
+
+
+@receiver(post_save, sender=ExchangeRate)
+def exchange_rate_saved(sender, instance, **kwargs):
+    DailyRate.sync_day(instance.date)
+    mark_rates_changed(instance.date)
+    transaction.on_commit(lambda: invalidate_rates(instance.date))
+
+
+@receiver(post_delete, sender=ExchangeRate)
+def exchange_rate_deleted(sender, instance, **kwargs):
+    DailyRate.sync_day(instance.date)
+    mark_rates_changed()
+    transaction.on_commit(lambda: invalidate_rates(instance.date))
@@ -0,0 +1,31 @@
+import pytest
+from datetime import date, timedelta
+from django_redis import get_redis_connection
+from exchange.cache import local_cache
+from exchange.instrumentation import metrics
+from exchange.models import ExchangeRate
+from exchange.rate_matrix import _matrix
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_state():
+    # Rolled back test transactions don't fire signals, so start every test clean
+    _matrix.reset()
+    get_redis_connection("default").flushdb()
+    local_cache().clear()
+    metrics.reset()
+    yield
+    _matrix.reset()
+
+
+@pytest.fixture
+def rate_days():
+    today = date.today()
+    days = [
+        (today - timedelta(days=2), {"EUR": 0.80, "GBP": 0.70}),
+        (today - timedelta(days=1), {"EUR": 0.82, "GBP": 0.71, "JPY": 109.0}),
+        (today, {"EUR": 0.85, "GBP": 0.73, "JPY": 110.0}),
+    ]
+    for day, rates in days:
+        ExchangeRate.objects.create(date=day, rates=rates, base="USD")
+    return days
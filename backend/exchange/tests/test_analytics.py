@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from django_redis import get_redis_connection
+from exchange.analytics import TRADING_DAYS, ema, max_drawdown, rolling_volatility, series_stats, sma, top_movers
+from exchange.cache import CACHE_INDEX_KEY
+from exchange.models import ExchangeRate
+from datetime import date, timedelta
+
+
+@pytest.fixture
+def eur_days():
+    today = date.today()
+    eur = [0.80, 0.82, 0.85, 0.83, 0.79, 0.81, 0.84]
+    for offset, rate in enumerate(eur):
+        ExchangeRate.objects.create(
+            date=today - timedelta(days=len(eur) - 1 - offset),
+            rates={"EUR": rate, "GBP": 0.70, "JPY": 110.0},
+            base="USD",
+        )
+    return today, eur
+
+
+def test_ema_matches_recursion():
+    rates = np.array([1.0, 1.2, 0.9, 1.1, 1.3, 1.25])
+    alpha = 2 / (3 + 1)
+    expected = rates[0]
+    for rate in rates[1:]:
+        expected = alpha * rate + (1 - alpha) * expected
+    assert ema(rates, 3) == pytest.approx(expected)
+    assert ema(np.array([]), 3) is None
+
+
+def test_rolling_volatility_matches_std():
+    returns = np.random.default_rng(0).normal(0, 0.01, 60)
+    rolling = rolling_volatility(returns, 20)
+    assert len(rolling) == 41
+    assert rolling[-1] == pytest.approx(np.std(returns[-20:], ddof=1) * np.sqrt(TRADING_DAYS))
+    assert rolling[0] == pytest.approx(np.std(returns[:20], ddof=1) * np.sqrt(TRADING_DAYS))
+    assert len(rolling_volatility(returns[:5], 20)) == 0
+
+
+def test_sma_and_drawdown():
+    dates = np.arange('2024-01-01', '2024-01-07', dtype='datetime64[D]')
+    rates = np.array([1.0, 1.5, 1.2, 0.9, 1.6, 1.4])
+    assert sma(rates, 2) == pytest.approx(1.5)
+    assert sma(rates, 10) is None
+    assert max_drawdown(dates, rates) == {'value': pytest.approx(-0.4), 'peak': '2024-01-02', 'trough': '2024-01-04'}
+
+
+def test_top_movers():
+    changes = np.array([0.01, np.nan, -0.03, 0.05, 0.0, -0.01])
+    assert top_movers(changes, 2) == ([3, 0], [2, 5])
+    assert top_movers(changes, 10) == ([3, 0, 4, 5, 2], [2, 5, 4, 0, 3])
+    assert top_movers(np.array([np.nan]), 3) == ([], [])
+
+
+def test_series_stats_without_points():
+    assert series_stats(np.array([], dtype='datetime64[D]'), np.array([])) == {'points': 0}
+
+
+@pytest.mark.django_db
+class TestAnalyticsEndpoint:
+    url = '/api/exchange-rates/analytics/'
+
+    def test_stats_for_many_pairs(self, client, eur_days):
+        today, eur = eur_days
+        response = client.get(self.url, {'base': 'USD', 'targets': 'EUR,GBP,JPY', 'period': '1w'})
+        assert response.status_code == 200
+        data = response.json()
+
+        assert data['period'] == '1w'
+        assert list(data['pairs']) == ['USD/EUR', 'USD/GBP', 'USD/JPY']
+        stats = data['pairs']['USD/EUR']
+        assert stats['points'] == 7
+        assert stats['end'] == today.isoformat()
+        assert stats['last'] == eur[-1]
+        assert stats['change'] == pytest.approx(eur[-1] / eur[-2] - 1)
+        assert stats['return'] == pytest.approx(eur[-1] / eur[0] - 1)
+        assert stats['max'] == {'rate': 0.85, 'date': (today - timedelta(days=4)).isoformat()}
+        assert stats['max_drawdown']['value'] == pytest.approx(0.79 / 0.85 - 1)
+        assert stats['sma'] == {'20': None, '50': None}
+        assert data['pairs']['USD/GBP']['volatility'] == 0.0
+
+    def test_cached_per_pair_and_period(self, client, eur_days):
+        client.get(self.url, {'pairs': 'USD-EUR,EUR-GBP', 'period': '1w'})
+        client.get(self.url, {'pairs': 'EUR-GBP', 'period': '1w'})
+        keys = {key.decode() for key in get_redis_connection("default").zrange(CACHE_INDEX_KEY, 0, -1)}
+        assert keys == {'analytics_USD_EUR_1w', 'analytics_EUR_GBP_1w'}
+
+    def test_conditional_get(self, client, eur_days):
+        first = client.get(self.url, {'pairs': 'USD-EUR'})
+        assert client.get(self.url, {'pairs': 'USD-EUR'}, HTTP_IF_NONE_MATCH=first['ETag']).status_code == 304
+
+    @pytest.mark.parametrize('params', [
+        {'pairs': 'USD-EUR', 'period': '2w'},
+        {'pairs': 'USD-XXX'},
+        {'base': 'USD'},
+    ])
+    def test_invalid_requests(self, client, eur_days, params):
+        assert client.get(self.url, params).status_code == 400
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import pytest
+from asgiref.sync import async_to_sync
+from exchange.models import ExchangeRate
+from exchange.responses import encode_payload as real_encode_payload
+from datetime import date, timedelta
+
+
+@pytest.mark.django_db
+class TestAsyncViews:
+    @pytest.mark.parametrize('endpoint, params', [
+        ('latest', {'base': 'EUR'}),
+        ('previous', {'base': 'GBP'}),
+        ('historical', {'from': 'GBP', 'to': 'JPY', 'period': '1w'}),
+        ('historical', {'from': 'USD', 'to': 'EUR', 'period': '1m', 'resolution': 'weekly'}),
+        ('convert', {'amount': '3', 'from': 'GBP', 'to': 'EUR'}),
+        ('convert', {'amount': '3', 'from': 'GBP', 'to': 'JPY', 'as_of': (date.today() - timedelta(days=1)).isoformat()}),
+        ('latest', {'base': 'EUR', 'as_of': (date.today() - timedelta(days=1)).isoformat()}),
+        ('previous', {'as_of': date.today().isoformat()}),
+    ])
+    def test_matches_sync_endpoint(self, client, rate_days, endpoint, params):
+        sync = client.get(f'/api/exchange-rates/{endpoint}/', params)
+        asynchronous = client.get(f'/api/async/exchange-rates/{endpoint}/', params)
+
+        assert asynchronous.status_code == 200
+        assert asynchronous.json() == sync.json()
+        if endpoint != 'convert' and 'as_of' not in params:
+            # convert's and as_of validators are derived from the request path
+            assert asynchronous['ETag'] == sync['ETag']
+
+    def test_serves_entries_cached_by_sync_views(self, client, rate_days):
+        client.get('/api/exchange-rates/latest/', {'base': 'EUR'})
+        ExchangeRate.objects.filter(date=rate_days[-1][0]).update(rates={"EUR": 2.0})
+
+        # The update bypassed the signals, so only the cached body has the old rate
+        response = client.get('/api/async/exchange-rates/latest/', {'base': 'EUR'})
+        assert response.json()['rates']['USD'] == 1 / 0.85
+
+    def test_conditional_get(self, client, rate_days):
+        first = client.get('/api/async/exchange-rates/latest/')
+        second = client.get('/api/async/exchange-rates/latest/', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert second.status_code == 304
+
+        first = client.get('/api/async/exchange-rates/convert/')
+        second = client.get('/api/async/exchange-rates/convert/', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert second.status_code == 304
+
+    @pytest.mark.parametrize('endpoint, params', [
+        ('historical', {'points': 'many'}),
+        ('historical', {'points': '50', 'resolution': 'weekly'}),
+        ('historical', {'period': '2w'}),
+        ('historical', {'to': 'XXX'}),
+        ('historical', {'start': '2024-01-01'}),
+        ('latest', {'base': 'XXX'}),
+        ('previous', {'base': 'XXX'}),
+        ('convert', {'from': 'XXX'}),
+        ('convert', {'to': 'XXX'}),
+        ('convert', {'amount': 'abc'}),
+        ('convert', {'amount': '1e999999'}),
+    ])
+    def test_invalid_params_match_sync_view(self, client, rate_days, endpoint, params):
+        response = client.get(f'/api/async/exchange-rates/{endpoint}/', params)
+        assert response.status_code == 400
+        if 'start' not in params:
+            assert client.get(f'/api/exchange-rates/{endpoint}/', params).json() == response.json()
+
+    def test_invalid_convert_under_asgi(self, async_client, rate_days):
+        response = async_to_sync(async_client.get)('/api/async/exchange-rates/convert/', {'amount': 'abc', 'to': 'XXX'})
+        assert response.status_code == 400
+        assert set(response.json()) == {'amount'}
+        response = async_to_sync(async_client.get)('/api/async/exchange-rates/convert/', {'to': 'XXX'})
+        assert response.json() == {'to': "Unknown currency 'XXX'."}
+
+    def test_miss_encoded_off_event_loop(self, async_client, rate_days, monkeypatch):
+        threads = []
+
+        def encode_payload(*args):
+            threads.append(threading.get_ident())
+            return real_encode_payload(*args)
+
+        async def fetch():
+            loop_thread = threading.get_ident()
+            response = await async_client.get('/api/async/exchange-rates/latest/')
+            return loop_thread, response
+
+        monkeypatch.setattr('exchange.cache.encode_payload', encode_payload)
+        loop_thread, response = async_to_sync(fetch)()
+        assert response.status_code == 200
+        assert threads and loop_thread not in threads
+
+    def test_concurrent_requests(self, async_client, rate_days):
+        async def fetch_all():
+            return await asyncio.gather(*[
+                async_client.get('/api/async/exchange-rates/latest/', {'base': base})
+                for base in ['USD', 'EUR', 'GBP', 'JPY'] * 5
+            ])
+
+        responses = async_to_sync(fetch_all)()
+        assert [response.status_code for response in responses] == [200] * 20
+        assert {response.json()['base'] for response in responses} == {'USD', 'EUR', 'GBP', 'JPY'}
@@ -0,0 +1,68 @@
+import json
+import numpy as np
+import pytest
+from django_redis import get_redis_connection
+from exchange.cache import INVALIDATION_CHANNEL
+from exchange.benchmark import compare, run_benchmarks, synthetic_days
+from datetime import date
+
+
+def test_synthetic_days_are_nested_business_days():
+    end = date(2024, 3, 15)
+    short = list(synthetic_days(0.1, currencies=3, end=end))
+    long = list(synthetic_days(1, currencies=3, end=end))
+
+    assert all(np.is_busday(day) for _, day, _ in long)
+    assert long[-1][1] == end
+    assert long[-len(short):] == short
+    assert list(short[0][2]) == ['EUR', 'GBP', 'JPY']
+
+
+def test_compare_flags_slowdowns_and_queries():
+    baseline = {'results': {
+        '1y/latest/warm': {'p95': 10.0, 'queries': 0},
+        '1y/convert/warm': {'p95': 0.5, 'queries': 1},
+        '1y/previous/warm': {'p95': 10.0, 'queries': 0},
+    }}
+    results = {'results': {
+        '1y/latest/warm': {'p95': 13.0, 'queries': 0},
+        '1y/convert/warm': {'p95': 1.2, 'queries': 2},
+        '1y/previous/warm': {'p95': 12.0, 'queries': 0},
+        '10y/latest/warm': {'p95': 100.0, 'queries': 5},
+    }}
+    assert compare(results, baseline, threshold=0.25, min_ms=1.0) == [
+        ('1y/convert/warm', 'queries', 1, 2),
+        ('1y/latest/warm', 'p95', 10.0, 13.0),
+    ]
+
+
+@pytest.mark.django_db
+def test_run_benchmarks():
+    results = run_benchmarks(years=(0.1,), currencies=3, iterations=3, cold_iterations=2,
+                             endpoints=['latest', 'historical_1m'])
+    assert set(results['results']) == {
+        '0.1y/latest/cold', '0.1y/latest/warm', '0.1y/historical_1m/cold', '0.1y/historical_1m/warm',
+    }
+    cold, warm = results['results']['0.1y/latest/cold'], results['results']['0.1y/latest/warm']
+    assert cold['samples'] == 2 and warm['samples'] == 3
+    assert warm['p50'] <= warm['p95'] <= warm['p99']
+    # Warm requests are answered from cache without touching the database
+    assert cold['queries'] > 0 and warm['queries'] == 0
+
+
+@pytest.mark.django_db
+def test_run_benchmarks_leaves_other_keys_alone():
+    redis_conn = get_redis_connection("default")
+    redis_conn.set('unrelated', 'kept')
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(INVALIDATION_CHANNEL)
+    pubsub.get_message(timeout=0.1)
+
+    run_benchmarks(years=(0.1,), currencies=3, iterations=1, cold_iterations=1, endpoints=['latest'])
+    assert redis_conn.keys('*') == [b'unrelated']
+
+    # No global invalidation goes out to live workers
+    messages = []
+    while (message := pubsub.get_message(timeout=0.1)) is not None:
+        messages.append(json.loads(message['data']))
+    assert all(message['date'] is not None for message in messages)
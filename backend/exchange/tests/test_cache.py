@@ -0,0 +1,328 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from asgiref.sync import async_to_sync
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from django.core.management import call_command
+from django_redis import get_redis_connection
+from exchange.cache import (
+    CACHE_INDEX_KEY, LocalCache, acached_or_build, apply_invalidation, cache_rates, cached_or_build, get_cached,
+    invalidate_rates, local_cache, warm_rate_cache,
+)
+from exchange.models import ExchangeRate
+from exchange.payloads import Payload
+from exchange.rate_matrix import GENERATION_KEY, get_rate_matrix
+from datetime import date, timedelta
+
+
+@pytest.fixture
+def eleven_days():
+    today = date.today()
+    for offset in range(10, -1, -1):
+        ExchangeRate.objects.create(
+            date=today - timedelta(days=offset),
+            rates={"EUR": 0.8 + offset / 100, "GBP": 0.7},
+            base="USD",
+        )
+    return today
+
+
+@pytest.fixture
+def redis_conn():
+    return get_redis_connection("default")
+
+
+def warm(client):
+    for url in (
+        '/api/exchange-rates/latest/',
+        '/api/exchange-rates/previous/',
+        '/api/exchange-rates/historical/?from=USD&to=EUR&period=1w',
+        '/api/exchange-rates/historical/?from=USD&to=EUR&period=1m',
+    ):
+        assert client.get(url).status_code == 200
+
+
+def cached_keys(redis_conn):
+    return {key.decode() for key in redis_conn.zrange(CACHE_INDEX_KEY, 0, -1)}
+
+
+@pytest.mark.django_db
+class TestCacheInvalidation:
+    def test_responses_are_indexed(self, client, eleven_days, redis_conn):
+        warm(client)
+        assert cached_keys(redis_conn) == {
+            'latest_rates_USD',
+            'previous_rates_USD',
+            'historical_rates_USD_EUR_1w',
+            'historical_rates_USD_EUR_1m',
+        }
+        assert redis_conn.ttl('latest_rates_USD') > 3600
+
+    def test_new_day_evicts_everything(self, client, eleven_days, redis_conn, django_capture_on_commit_callbacks):
+        warm(client)
+        with django_capture_on_commit_callbacks(execute=True):
+            ExchangeRate.objects.create(date=eleven_days + timedelta(days=1), rates={"EUR": 0.5})
+
+        assert cached_keys(redis_conn) == set()
+        assert not redis_conn.exists('latest_rates_USD')
+        assert client.get('/api/exchange-rates/latest/').json()['rates'] == {"EUR": 0.5}
+
+    def test_old_day_only_evicts_windows_covering_it(self, client, eleven_days, redis_conn, django_capture_on_commit_callbacks):
+        warm(client)
+        row = ExchangeRate.objects.get(date=eleven_days - timedelta(days=9))
+        row.rates = {"EUR": 0.1, "GBP": 0.7}
+        with django_capture_on_commit_callbacks(execute=True):
+            row.save()
+
+        assert cached_keys(redis_conn) == {
+            'latest_rates_USD',
+            'previous_rates_USD',
+            'historical_rates_USD_EUR_1w',
+        }
+        assert not redis_conn.exists('historical_rates_USD_EUR_1m')
+        assert redis_conn.exists('historical_rates_USD_EUR_1w')
+
+    def test_invalidate_without_date_evicts_all(self, client, eleven_days, redis_conn):
+        warm(client)
+        assert len(invalidate_rates()) == 4
+        assert not redis_conn.exists('latest_rates_USD')
+
+
+@pytest.mark.django_db
+class TestWarmRateCache:
+    def test_warms_every_base_and_pair(self, client, eleven_days, redis_conn):
+        out = StringIO()
+        call_command('warm_rate_cache', '--periods', '1w', '1m', '--workers', '2', '--batch-size', '3', stdout=out)
+
+        # 3 currencies: 3 latest + 3 previous + 6 pairs x 2 periods
+        assert 'Warmed 18 cache keys, skipped 0' in out.getvalue()
+        assert len(cached_keys(redis_conn)) == 18
+
+        cached = json.loads(redis_conn.hget('historical_rates_GBP_EUR_1m', 'identity'))
+        response = client.get('/api/exchange-rates/historical/?from=GBP&to=EUR&period=1m')
+        assert response.json() == cached
+        assert json.loads(redis_conn.hget('latest_rates_EUR', 'identity'))['base'] == 'EUR'
+
+    def test_command_defaults_to_hot_json_payloads(self, client, eleven_days, redis_conn, settings):
+        settings.RATES_WARM_PERIODS = ('1m',)
+        call_command('warm_rate_cache', stdout=StringIO())
+
+        # 3 latest + 3 previous + 6 pairs x 1m
+        assert len(cached_keys(redis_conn)) == 12
+        assert not redis_conn.exists('historical_rates_USD_EUR_1w')
+        assert redis_conn.hexists('historical_rates_USD_EUR_1m', 'gzip')
+        assert not redis_conn.hexists('historical_rates_USD_EUR_1m', 'columnar')
+
+        params = {'from': 'USD', 'to': 'EUR', 'period': '1m'}
+        columnar = client.get('/api/exchange-rates/historical/', {**params, 'format': 'columnar'})
+        assert columnar.status_code == 200
+        assert redis_conn.hexists('historical_rates_USD_EUR_1m', 'columnar')
+
+    def test_reports_skipped_payloads(self, eleven_days, redis_conn):
+        ExchangeRate.objects.create(date=eleven_days - timedelta(days=11), rates={"EUR": 0.9, "CHF": 0.95})
+
+        # CHF isn't quoted on the latest or previous day: its pairs are built, its snapshots skipped
+        result = warm_rate_cache(bases=["USD", "CHF"], periods=["1m"])
+        assert result == (4, 2)
+        assert len(cached_keys(redis_conn)) == result.warmed
+
+    def test_empty_table(self, redis_conn):
+        assert warm_rate_cache() == (0, 0)
+
+
+class TestLocalCache:
+    def test_lru_eviction_by_size(self):
+        cache = LocalCache(max_bytes=10, ttl=60)
+        cache.set('a', b'1234')
+        cache.set('b', b'1234')
+        assert cache.get('a') == b'1234'
+        cache.set('c', b'1234')
+
+        # 'b' was least recently used
+        assert cache.get('b') is None
+        assert cache.get('a') == b'1234'
+        assert cache.get('c') == b'1234'
+        assert cache.stats()['evictions'] == 1
+        assert cache.stats()['bytes'] == 8
+
+    def test_ttl_expiry(self):
+        cache = LocalCache(max_bytes=100, ttl=0)
+        cache.set('a', 'value')
+        assert cache.get('a') is None
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['evictions']) == (0, 1, 1)
+
+    def test_oversized_values_are_not_kept(self):
+        cache = LocalCache(max_bytes=2, ttl=60)
+        cache.set('a', b'123')
+        assert cache.get('a') is None
+
+
+@pytest.mark.django_db
+class TestTwoTierCache:
+    def test_hit_served_without_redis(self, client, eleven_days, redis_conn):
+        warm(client)
+        redis_conn.delete('latest_rates_USD')
+        hits = local_cache().stats()['hits']
+
+        response = client.get('/api/exchange-rates/latest/')
+        assert response.json()['date'] == eleven_days.isoformat()
+        assert local_cache().stats()['hits'] == hits + 1
+
+    def test_redis_hit_fills_local_tier(self, redis_conn):
+        redis_conn.hset('latest_rates_EUR', mapping={
+            'identity': b'{"base":"EUR"}', 'etag': b'abc', 'modified': b'2024-01-02',
+        })
+        expected = (b'{"base":"EUR"}', 'abc', date(2024, 1, 2))
+        assert get_cached(redis_conn, 'latest_rates_EUR') == expected
+        assert local_cache().get('latest_rates_EUR:identity') == expected
+
+    def test_invalidation_from_other_process(self, eleven_days):
+        local_cache().set('latest_rates_USD:identity', b'{}')
+        matrix = get_rate_matrix()
+
+        apply_invalidation(json.dumps({
+            'sender': 'another-process',
+            'date': (eleven_days + timedelta(days=1)).isoformat(),
+            'keys': ['latest_rates_USD'],
+        }))
+        assert local_cache().get('latest_rates_USD:identity') is None
+        assert matrix._stale
+
+    def test_cache_stats_endpoint(self, client):
+        response = client.get('/api/exchange-rates/cache_stats/')
+        assert response.status_code == 200
+        assert set(response.json()['local']) >= {'hits', 'misses', 'evictions', 'hit_ratio'}
+
+
+@pytest.mark.django_db
+class TestGenerations:
+    key = 'historical_rates_USD_EUR_1w'
+
+    def test_invalidation_between_build_and_write(self, eleven_days, redis_conn):
+        get_rate_matrix()
+        build = CountingBuilder(self.key)
+
+        def build_then_invalidate():
+            payload = build()
+            invalidate_rates()  # another process's ingest committing meanwhile
+            return payload
+
+        assert cached_or_build(redis_conn, self.key, 'identity', build_then_invalidate).body == b'{"built":1}'
+        assert not redis_conn.exists(self.key)
+        assert local_cache().get(f'{self.key}:identity') is None
+
+        # Once the matrix has caught up, builds are stored again
+        assert get_rate_matrix().generation == 1
+        assert cached_or_build(redis_conn, self.key, 'identity', build).body == b'{"built":2}'
+        assert redis_conn.exists(self.key)
+
+    def test_lagging_matrix_not_stored(self, eleven_days, redis_conn):
+        matrix = get_rate_matrix()
+        # Invalidation of another process whose message hasn't arrived yet
+        redis_conn.incr(GENERATION_KEY)
+
+        build = CountingBuilder(self.key)
+        assert cached_or_build(redis_conn, self.key, 'identity', build).body == b'{"built":1}'
+        assert not redis_conn.exists(self.key)
+        assert warm_rate_cache(periods=['1w']) == (0, 12)
+        assert cached_keys(redis_conn) == set()
+
+        matrix.mark_stale()
+        assert get_rate_matrix().generation == 1
+        assert warm_rate_cache(periods=['1w']).warmed == 12
+
+    def test_async_invalidation_between_build_and_write(self, eleven_days, redis_conn):
+        get_rate_matrix()
+        build = CountingBuilder(self.key)
+
+        def build_then_invalidate():
+            payload = build()
+            invalidate_rates()
+            return payload
+
+        result = async_to_sync(acached_or_build)(self.key, 'identity', build_then_invalidate)
+        assert result.body == b'{"built":1}'
+        assert not redis_conn.exists(self.key)
+
+
+class CountingBuilder:
+    def __init__(self, key, delay=0.0):
+        self.key = key
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return Payload(self.key, {'built': self.calls}, date(2024, 1, 1), date(2024, 1, 2))
+
+
+class TestSingleFlight:
+    key = 'historical_rates_USD_EUR_10y'
+
+    def test_concurrent_misses_build_once(self, redis_conn):
+        build = CountingBuilder(self.key, delay=0.1)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda _: cached_or_build(redis_conn, self.key, 'identity', build), range(8),
+            ))
+        assert build.calls == 1
+        assert {result.body for result in results} == {b'{"built":1}'}
+        assert not redis_conn.exists(f'{self.key}:lock')
+
+    def test_stale_copy_served_while_another_process_rebuilds(self, redis_conn):
+        cache_rates(redis_conn, CountingBuilder(self.key)())
+        invalidate_rates()
+        redis_conn.set(f'{self.key}:lock', 'other-process')
+
+        build = CountingBuilder(self.key)
+        assert cached_or_build(redis_conn, self.key, 'identity', build).body == b'{"built":1}'
+        assert build.calls == 0
+        assert 0 < redis_conn.ttl(f'{self.key}:stale') <= 300
+
+    def test_waits_for_another_process_without_stale_copy(self, redis_conn):
+        redis_conn.set(f'{self.key}:lock', 'other-process')
+        build = CountingBuilder(self.key)
+
+        def other_process_finishes():
+            time.sleep(0.1)
+            redis_conn.delete(f'{self.key}:lock')
+            cache_rates(redis_conn, Payload(self.key, {'built': 'elsewhere'}, date(2024, 1, 1), date(2024, 1, 2)))
+
+        threading.Thread(target=other_process_finishes).start()
+        assert cached_or_build(redis_conn, self.key, 'identity', build).body == b'{"built":"elsewhere"}'
+        assert build.calls == 0
+
+    def test_early_refresh_near_expiry(self, redis_conn):
+        cache_rates(redis_conn, CountingBuilder(self.key)())
+        local_cache().clear()
+        # Expiring now after a very slow build: a refresh is certainly due
+        redis_conn.hset(self.key, mapping={'expires': time.time(), 'delta': 10 ** 6})
+
+        redis_conn.set(f'{self.key}:lock', 'other-process')
+        build = CountingBuilder(self.key)
+        assert cached_or_build(redis_conn, self.key, 'identity', build).body == b'{"built":1}'
+        assert build.calls == 0
+
+        redis_conn.delete(f'{self.key}:lock')
+        build.calls = 1
+        assert cached_or_build(redis_conn, self.key, 'identity', build).body == b'{"built":2}'
+        assert json.loads(redis_conn.hget(self.key, 'identity')) == {'built': 2}
+
+    def test_async_concurrent_misses_build_once(self, redis_conn):
+        build = CountingBuilder(self.key)
+
+        def slow_build():
+            time.sleep(0.05)
+            return build()
+
+        async def fetch_all():
+            return await asyncio.gather(*[acached_or_build(self.key, 'identity', slow_build) for _ in range(8)])
+
+        results = async_to_sync(fetch_all)()
+        assert build.calls == 1
+        assert {result.body for result in results} == {b'{"built":1}'}
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from exchange.downsampling import lttb, ohlc
+from exchange.models import ExchangeRate
+from datetime import date, timedelta
+
+
+def daily(start, rates):
+    dates = np.arange(np.datetime64(start), np.datetime64(start) + len(rates), dtype='datetime64[D]')
+    return dates, np.array(rates, dtype=float)
+
+
+class TestLTTB:
+    def test_keeps_endpoints_and_extremes(self):
+        rates = [1.0] * 100
+        rates[37] = 5.0
+        rates[71] = -3.0
+        dates, values = lttb(*daily('2024-01-01', rates), 10)
+
+        assert len(dates) == 10
+        assert dates[0] == np.datetime64('2024-01-01')
+        assert dates[-1] == np.datetime64('2024-04-09')
+        assert 5.0 in values and -3.0 in values
+        assert (np.diff(dates.astype(np.int64)) > 0).all()
+
+    def test_short_series_unchanged(self):
+        dates, rates = daily('2024-01-01', [1.0, 2.0, 3.0])
+        out_dates, out_rates = lttb(dates, rates, 10)
+        assert out_rates.tolist() == [1.0, 2.0, 3.0]
+
+
+class TestOHLC:
+    def test_weekly_buckets_start_on_monday(self):
+        # 2024-01-03 is a Wednesday
+        starts, opens, highs, lows, closes = ohlc(*daily('2024-01-03', [1, 3, 2, 5, 4, 0.5, 6]), 'weekly')
+        assert starts.tolist() == [date(2024, 1, 1), date(2024, 1, 8)]
+        assert opens.tolist() == [1, 0.5]
+        assert highs.tolist() == [5, 6]
+        assert lows.tolist() == [1, 0.5]
+        assert closes.tolist() == [4, 6]
+
+    def test_monthly_buckets(self):
+        starts, opens, highs, lows, closes = ohlc(*daily('2024-01-30', [1, 2, 3, 4]), 'monthly')
+        assert starts.tolist() == [date(2024, 1, 1), date(2024, 2, 1)]
+        assert (opens.tolist(), closes.tolist()) == ([1, 3], [2, 4])
+
+
+@pytest.mark.django_db
+class TestHistoricalDownsampling:
+    @pytest.fixture(autouse=True)
+    def daily_history(self):
+        today = date.today()
+        for offset in range(120):
+            ExchangeRate.objects.create(
+                date=today - timedelta(days=offset),
+                rates={"EUR": 0.8 + (offset % 7) / 100},
+                base="USD",
+            )
+
+    def test_points(self, client):
+        response = client.get('/api/exchange-rates/historical/?from=USD&to=EUR&period=1y&points=20')
+        data = response.json()
+        assert data['points'] == 20
+        assert len(data['data']) == 20
+        assert data['data'][-1]['date'] == date.today().isoformat()
+
+    def test_monthly_resolution(self, client):
+        response = client.get('/api/exchange-rates/historical/?from=USD&to=EUR&period=1y&resolution=monthly')
+        data = response.json()['data']
+        assert 4 <= len(data) <= 5
+        assert set(data[0]) == {'date', 'rate', 'open', 'high', 'low', 'close'}
+        assert all(point['rate'] == point['close'] for point in data)
+
+    def test_cached_per_resolution(self, client):
+        base = '/api/exchange-rates/historical/?from=USD&to=EUR&period=1y'
+        full = client.get(base).json()['data']
+        weekly = client.get(base + '&resolution=weekly').json()['data']
+        assert len(full) == 120
+        assert len(weekly) < len(full)
+        assert client.get(base).json()['data'] == full
+
+    @pytest.mark.parametrize('query', [
+        'points=abc', 'points=2', 'resolution=hourly', 'points=50&resolution=weekly',
+    ])
+    def test_invalid_params(self, client, query):
+        response = client.get('/api/exchange-rates/historical/?from=USD&to=EUR&period=1y&' + query)
+        assert response.status_code == 400
@@ -0,0 +1,110 @@
+import gzip
+import json
+import pytest
+from exchange.formats import SERIES_FORMATS, columnar_series, msgpack, pyarrow
+from exchange.models import ExchangeRate
+from datetime import date, timedelta
+
+URL = '/api/exchange-rates/historical/'
+
+
+@pytest.fixture
+def gapped_days():
+    today = date.today()
+    days = [today - timedelta(days=offset) for offset in (9, 8, 7, 4, 3, 2, 1, 0)]
+    for i, day in enumerate(days):
+        ExchangeRate.objects.create(date=day, rates={"EUR": 0.80 + i / 100, "GBP": 0.70}, base="USD")
+    return days
+
+
+def test_columnar_series():
+    data = {
+        'from': 'USD', 'to': 'EUR', 'period': '1w',
+        'data': [
+            {'date': '2024-01-05', 'rate': 0.9},
+            {'date': '2024-01-08', 'rate': 0.91},
+            {'date': '2024-01-09', 'rate': 0.92},
+        ],
+    }
+    assert columnar_series(data) == {
+        'from': 'USD', 'to': 'EUR', 'period': '1w',
+        'first_date': '2024-01-05', 'days': [0, 3, 4], 'rate': [0.9, 0.91, 0.92],
+    }
+    assert columnar_series({**data, 'data': []})['days'] == []
+
+
+@pytest.mark.django_db
+class TestSeriesFormats:
+    params = {'from': 'USD', 'to': 'EUR', 'period': '1m'}
+
+    def test_columnar_matches_json(self, client, gapped_days):
+        rows = client.get(URL, self.params).json()['data']
+        response = client.get(URL, {**self.params, 'format': 'columnar'})
+
+        assert response['Content-Type'] == SERIES_FORMATS['columnar'][0]
+        series = response.json()
+        first = date.fromisoformat(series['first_date'])
+        assert [(first + timedelta(days=offset)).isoformat() for offset in series['days']] == [
+            row['date'] for row in rows
+        ]
+        assert series['rate'] == [row['rate'] for row in rows]
+
+    def test_range_keeps_requested_start(self, client, gapped_days):
+        start, end = gapped_days[0] - timedelta(days=3), gapped_days[-1]
+        params = {'from': 'USD', 'to': 'EUR', 'start': start.isoformat(), 'end': end.isoformat(), 'format': 'columnar'}
+        series = client.get(URL, params).json()
+        assert (series['start'], series['end']) == (start.isoformat(), end.isoformat())
+        assert series['first_date'] == gapped_days[0].isoformat()
+
+    def test_selected_by_accept_header(self, client, gapped_days):
+        response = client.get(URL, self.params, HTTP_ACCEPT=SERIES_FORMATS['columnar'][0])
+        assert response['Content-Type'] == SERIES_FORMATS['columnar'][0]
+        assert 'Accept' in response['Vary']
+
+    def test_compressed_and_conditional(self, client, gapped_days):
+        params = {**self.params, 'format': 'columnar'}
+        first = client.get(URL, params, HTTP_ACCEPT_ENCODING='gzip')
+        assert first['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(first.content))['rate']
+
+        second = client.get(URL, params, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert second.status_code == 304
+        # Other formats of the same payload don't share its validator
+        assert client.get(URL, self.params, HTTP_IF_NONE_MATCH=first['ETag']).status_code == 200
+
+    def test_ohlc_columns(self, client, gapped_days):
+        series = client.get(URL, {**self.params, 'resolution': 'weekly', 'format': 'columnar'}).json()
+        assert set(series) >= {'first_date', 'days', 'rate', 'open', 'high', 'low', 'close'}
+        assert series['rate'] == series['close']
+
+    @pytest.mark.skipif(msgpack is None, reason='msgpack not installed')
+    def test_msgpack(self, client, gapped_days):
+        response = client.get(URL, {**self.params, 'format': 'msgpack'})
+        assert response['Content-Type'] == 'application/msgpack'
+        assert msgpack.unpackb(response.content) == client.get(URL, {**self.params, 'format': 'columnar'}).json()
+
+    @pytest.mark.skipif(pyarrow is None, reason='pyarrow not installed')
+    def test_arrow(self, client, gapped_days):
+        rows = client.get(URL, self.params).json()['data']
+        response = client.get(URL, self.params, HTTP_ACCEPT='application/vnd.apache.arrow.stream')
+
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        assert [day.isoformat() for day in table.column('date').to_pylist()] == [row['date'] for row in rows]
+        assert table.column('rate').to_pylist() == [row['rate'] for row in rows]
+        assert table.schema.metadata[b'period'] == b'1m'
+
+    def test_errors_stay_json(self, client, gapped_days):
+        response = client.get(URL, {**self.params, 'points': 'many', 'format': 'columnar'})
+        assert response.status_code == 400
+        assert response['Content-Type'] == 'application/json'
+        assert 'points' in response.json()
+
+    def test_other_endpoints_unchanged(self, client, gapped_days):
+        assert client.get('/api/exchange-rates/latest/', {'format': 'columnar'}).status_code == 404
+
+    def test_async_endpoint(self, client, gapped_days):
+        params = {**self.params, 'format': 'columnar'}
+        response = client.get('/api/async/exchange-rates/historical/', params)
+        assert response['Content-Type'] == SERIES_FORMATS['columnar'][0]
+        assert response.content == client.get(URL, params).content
+        assert client.get('/api/async/exchange-rates/historical/', {'format': 'xml'}).status_code == 404
@@ -0,0 +1,179 @@
+import json
+import pytest
+from django.core.management import call_command
+from django_redis import get_redis_connection
+from exchange.cache import CACHE_INDEX_KEY
+from exchange.ingest import FileDropSource, RateSource, ingest_new_days, iter_daily_rates, upsert_exchange_rates
+from exchange.models import Currency, DailyRate, ExchangeRate
+from exchange.rate_matrix import _matrix, get_rate_matrix
+from datetime import date, timedelta
+
+
+@pytest.fixture
+def rates_file(tmp_path):
+    path = tmp_path / "rates.json"
+    path.write_text(json.dumps({
+        "amount": 1.0,
+        "base": "USD",
+        "start_date": "2024-01-02",
+        "rates": {
+            "2024-01-02": {"EUR": 0.91234, "GBP": 0.78},
+            "2024-01-03": {"EUR": 0.915, "GBP": 0.79},
+            "2024-01-05": {"EUR": 0.9, "GBP": 0.785, "JPY": 144.5},
+        },
+    }, indent=4))
+    return path
+
+
+@pytest.fixture
+def names_file(tmp_path):
+    path = tmp_path / "names.json"
+    path.write_text(json.dumps({"EUR": "Euro", "GBP": "British Pound", "USD": "US Dollar"}))
+    return path
+
+
+def test_stream_matches_json_load(rates_file):
+    expected = json.loads(rates_file.read_text())["rates"]
+    # Tiny chunks force values to straddle chunk boundaries
+    days = list(iter_daily_rates(rates_file, chunk_size=7))
+    assert [(base, day.isoformat(), rates) for base, day, rates in days] == [
+        ("USD", day, rates) for day, rates in expected.items()
+    ]
+
+
+@pytest.mark.django_db
+class TestLoadHistoricalDates:
+    def load(self, rates_file, names_file, **options):
+        call_command(
+            'load_historical_dates',
+            rates_file=str(rates_file),
+            names_file=str(names_file),
+            **options,
+        )
+
+    def test_loads_days_rates_and_currencies(self, rates_file, names_file):
+        self.load(rates_file, names_file, batch_size=2)
+
+        assert ExchangeRate.objects.count() == 3
+        assert ExchangeRate.objects.get(date=date(2024, 1, 5)).rates["JPY"] == 144.5
+        assert DailyRate.objects.filter(date=date(2024, 1, 5)).count() == 4
+        assert ExchangeRate.objects.get(date=date(2024, 1, 5)).get_rates_for_base("EUR")["JPY"] == 144.5 / 0.9
+        assert dict(Currency.objects.values_list('code', 'name')) == {
+            "EUR": "Euro", "GBP": "British Pound", "JPY": "JPY", "USD": "US Dollar",
+        }
+
+        matrix = get_rate_matrix()
+        assert matrix.date_at(matrix.latest_index()) == date(2024, 1, 5)
+
+    def test_rerun_is_idempotent(self, rates_file, names_file):
+        self.load(rates_file, names_file)
+        self.load(rates_file, names_file)
+
+        assert ExchangeRate.objects.count() == 3
+        assert DailyRate.objects.count() == 10
+        assert Currency.objects.count() == 4
+
+
+class StubSource(RateSource):
+    def __init__(self, days):
+        self.rows = days
+        self.asked_since = None
+
+    def days(self, since=None):
+        self.asked_since = since
+        return [row for row in self.rows if since is None or row[1] > since]
+
+
+@pytest.fixture
+def stored_days():
+    today = date.today()
+    days = [today - timedelta(days=offset) for offset in (3, 2, 1)]
+    for i, day in enumerate(days):
+        ExchangeRate.objects.create(date=day, rates={"EUR": 0.80 + i / 100, "GBP": 0.70}, base="USD")
+    return days
+
+
+def cached_keys():
+    return {key.decode() for key in get_redis_connection("default").zrange(CACHE_INDEX_KEY, 0, -1)}
+
+
+@pytest.mark.django_db
+class TestIncrementalIngest:
+    def test_reads_only_days_after_latest(self, stored_days):
+        today = date.today()
+        source = StubSource([
+            ("USD", stored_days[-1], {"EUR": 0.1}),
+            ("USD", today, {"EUR": 0.83, "GBP": 0.71, "CHF": 0.9}),
+        ])
+        result = ingest_new_days(source)
+
+        assert source.asked_since == stored_days[-1]
+        assert result.changed == [today]
+        assert ExchangeRate.objects.get(date=stored_days[-1]).rates["EUR"] == pytest.approx(0.82)
+        assert DailyRate.objects.filter(date=today).count() == 4
+        assert Currency.objects.filter(code="CHF").exists()
+
+    def test_upserts_on_date_and_base(self, stored_days):
+        rates = {"EUR": 0.5, "GBP": 0.70}
+        result = upsert_exchange_rates([
+            ("USD", stored_days[0], {"EUR": 0.80, "GBP": 0.70}),
+            ("USD", stored_days[1], rates),
+        ])
+
+        assert result.changed == [stored_days[1]]
+        assert ExchangeRate.objects.count() == 3
+        row = ExchangeRate.objects.get(date=stored_days[1])
+        assert row.rates == rates
+        assert row.get_rates_for_base("EUR")["GBP"] == 0.70 / 0.5
+        assert dict(DailyRate.objects.filter(date=stored_days[1]).values_list('currency', 'rate')) == {
+            "EUR": 0.5, "GBP": 0.70, "USD": 1.0,
+        }
+        assert upsert_exchange_rates([("USD", stored_days[1], rates)]).changed == []
+
+    def test_other_base_replaces_the_day(self, stored_days):
+        result = upsert_exchange_rates([
+            ("EUR", stored_days[1], {"USD": 2.0, "GBP": 1.5}),
+            ("USD", stored_days[2], {"EUR": 0.9}),
+            ("EUR", stored_days[2], {"USD": 1.25}),
+        ])
+
+        assert result.changed == stored_days[1:]
+        assert ExchangeRate.objects.count() == 3
+        assert list(ExchangeRate.objects.filter(date__in=stored_days[1:]).values_list('base', flat=True)) == ["EUR", "EUR"]
+        assert dict(DailyRate.objects.filter(date=stored_days[1]).values_list('currency', 'rate')) == {
+            "EUR": 1.0, "GBP": 1.5, "USD": 2.0,
+        }
+        assert upsert_exchange_rates([("EUR", stored_days[1], {"USD": 2.0, "GBP": 1.5})]).changed == []
+
+    def test_patches_matrix_and_evicts_changed_span(self, client, stored_days, django_capture_on_commit_callbacks):
+        client.get('/api/exchange-rates/latest/')
+        client.get('/api/exchange-rates/historical/', {'from': 'USD', 'to': 'EUR', 'period': '1w'})
+        client.get('/api/exchange-rates/historical/', {
+            'from': 'USD', 'to': 'EUR', 'start': stored_days[0].isoformat(), 'end': stored_days[0].isoformat(),
+        })
+        before = cached_keys()
+        matrix = get_rate_matrix()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            result = upsert_exchange_rates([("USD", stored_days[1], {"EUR": 0.5, "GBP": 0.70})])
+
+        # latest only depends on the day after the change
+        assert 'latest_rates_USD' in before
+        assert set(result.evicted) == before - {'latest_rates_USD'}
+        assert matrix._patch == (stored_days[1], stored_days[1]) and not matrix._needs_full_reload
+        matrix = get_rate_matrix()
+        assert matrix is _matrix and matrix._patch is None
+        assert matrix.rate(matrix.latest_index(1), "USD", "EUR") == 0.5
+        assert matrix.rate(matrix.latest_index(), "USD", "EUR") == pytest.approx(0.82)
+
+    def test_command_reads_drop_directory(self, tmp_path, stored_days):
+        today = date.today()
+        for day, eur in [(stored_days[0], 0.1), (today, 0.84)]:
+            (tmp_path / f'{day.isoformat()}.json').write_text(json.dumps({"rates": {"EUR": eur, "GBP": 0.7}}))
+        (tmp_path / 'notes.json').write_text('{}')
+
+        assert [day for _, day, _ in FileDropSource(tmp_path).days(stored_days[-1])] == [today]
+        call_command('ingest_rates', drop_dir=str(tmp_path), names_file=str(tmp_path / 'missing.json'))
+
+        assert ExchangeRate.objects.get(date=today).rates == {"EUR": 0.84, "GBP": 0.7}
+        assert ExchangeRate.objects.get(date=stored_days[0]).rates["EUR"] == 0.80
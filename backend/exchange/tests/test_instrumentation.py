@@ -0,0 +1,83 @@
+import pytest
+from asgiref.sync import async_to_sync
+from exchange.instrumentation import RequestTimings, key_family, metrics
+
+
+def server_timing(response):
+    """{metric: {param: value}} of a Server-Timing header"""
+    timings = {}
+    for metric in response['Server-Timing'].split(', '):
+        name, *params = metric.split(';')
+        timings[name] = dict(param.split('=', 1) for param in params)
+    return timings
+
+
+class TestRequestTimings:
+    def test_header_lists_recorded_phases_in_order(self):
+        timings = RequestTimings()
+        timings.add('encode', 0.002)
+        timings.add('cache', 0.0005)
+        timings.add('cache', 0.0005)
+        assert timings.server_timing(0.01, 512) == (
+            'cache;dur=1.00, encode;dur=2.00, total;dur=10.00, size;desc="512 bytes"'
+        )
+
+    def test_key_family(self):
+        assert key_family('historical_batch_1w_USD-EUR') == 'historical_batch'
+        assert key_family('latest_rates_EUR') == 'latest_rates'
+        assert key_family('something_else') == 'other'
+
+
+@pytest.mark.django_db
+class TestServerTiming:
+    def test_miss_then_hit(self, client, rate_days):
+        miss = server_timing(client.get('/api/exchange-rates/latest/', {'base': 'EUR'}))
+        assert {'cache', 'db', 'build', 'encode', 'total', 'size'} <= set(miss)
+        assert int(miss['db']['desc'].strip('"').split()[0]) > 0
+
+        # The second request is answered by the local tier, without touching the database
+        hit = server_timing(client.get('/api/exchange-rates/latest/', {'base': 'EUR'}))
+        assert 'db' not in hit and 'build' not in hit
+
+    def test_render_phase(self, client, rate_days):
+        timings = server_timing(client.get('/api/exchange-rates/', HTTP_ACCEPT='application/json'))
+        assert 'render' in timings
+        assert 'db' in timings
+
+    def test_async_view(self, async_client, rate_days):
+        response = async_to_sync(async_client.get)('/api/async/exchange-rates/latest/', {'base': 'GBP'})
+        assert response.status_code == 200
+        assert {'cache', 'build', 'total'} <= set(server_timing(response))
+
+    def test_disabled(self, client, settings, rate_days):
+        settings.RATES_SERVER_TIMING = False
+        response = client.get('/api/exchange-rates/latest/')
+        assert 'Server-Timing' not in response
+        assert metrics.requests['exchange-rates-latest', 200] == 1
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    def test_hit_ratio_per_family(self, client, rate_days):
+        for _ in range(4):
+            client.get('/api/exchange-rates/latest/', {'base': 'EUR'})
+        client.get('/api/exchange-rates/historical/', {'from': 'USD', 'to': 'EUR', 'period': '1w'})
+        ratios = metrics.hit_ratios()
+        assert ratios['latest_rates'] == 0.75
+        assert ratios['historical_rates'] == 0.0
+
+    def test_exposition(self, client, rate_days):
+        client.get('/api/exchange-rates/latest/', {'base': 'EUR'})
+        client.get('/api/exchange-rates/latest/', {'base': 'EUR'})
+        response = client.get('/api/metrics/')
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        lines = response.content.decode().splitlines()
+
+        assert 'rates_requests_total{view="exchange-rates-latest",status="200"} 2' in lines
+        assert 'rates_request_duration_seconds_count{view="exchange-rates-latest"} 2' in lines
+        assert 'rates_request_duration_seconds_bucket{view="exchange-rates-latest",le="+Inf"} 2' in lines
+        assert 'rates_cache_lookups_total{family="latest_rates",outcome="local_hit"} 1' in lines
+        assert 'rates_cache_lookups_total{family="latest_rates",outcome="miss"} 1' in lines
+        assert 'rates_cache_hit_ratio{family="latest_rates"} 0.5' in lines
+        assert any(line.startswith('rates_request_phase_seconds_total{view="exchange-rates-latest",phase="build"}')
+                   for line in lines)
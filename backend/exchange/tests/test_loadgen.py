@@ -0,0 +1,59 @@
+import random
+import pytest
+from exchange.loadgen import SCENARIOS, LatencyHistogram, LoadRun, parse_mix
+from exchange.models import ExchangeRate
+from datetime import date, timedelta
+
+
+def test_histogram_percentiles_within_resolution():
+    values = list(range(1, 100_001))
+    random.Random(0).shuffle(values)
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    assert histogram.total == 100_000
+    for q in (50, 90, 99, 99.9):
+        exact = q / 100 * 100_000
+        assert exact <= histogram.percentile(q) <= exact * (1 + 1 / LatencyHistogram.SUB_BUCKETS)
+    assert histogram.percentile(100) == 100_000
+    assert sum(histogram.buckets().values()) == 100_000
+
+
+def test_histogram_merge():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    for value in (5, 10, 15):
+        first.record(value)
+    second.record(2_000_000)
+    first.merge(second)
+    assert first.total == 4
+    assert first.percentile(50) == 10
+    assert first.percentile(100) == 2_000_000
+
+
+def test_parse_mix():
+    assert parse_mix('page=1,chart=2.5') == {'page': 1.0, 'chart': 2.5}
+    for value in ('page=1,feed=2', 'page=x', 'page=0'):
+        with pytest.raises(ValueError):
+            parse_mix(value)
+
+
+def test_page_scenario_matches_dashboard():
+    requests_made = SCENARIOS['page'](random.Random(1), ['USD', 'EUR', 'GBP'])
+    assert [endpoint for endpoint, _, _ in requests_made] == ['codes_and_names', 'latest', 'previous']
+    assert requests_made[1][2] == requests_made[2][2]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_against_live_server(live_server):
+    today = date.today()
+    for offset in range(40):
+        ExchangeRate.objects.create(date=today - timedelta(days=offset), rates={"EUR": 0.9, "GBP": 0.8})
+
+    report = LoadRun(live_server.url, rps=40, duration=1, concurrency=4).run()
+
+    assert report['total']['requests'] > 0
+    assert report['total']['errors'] == 0
+    assert set(report['endpoints']) <= {'codes_and_names', 'latest', 'previous', 'historical', 'convert'}
+    latencies = report['total']['latency_ms']
+    assert 0 < latencies['p50'] <= latencies['p99'] <= latencies['p100']
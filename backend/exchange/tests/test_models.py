@@ -154,4 +154,22 @@ class TestExchangeRateViewSet:
         assert data['result'] == 85.0 
         assert data['rate'] == 0.85
 
+    @pytest.mark.parametrize('url, params, field', [
+        ('latest', {'base': 'XXX'}, 'base'),
+        ('previous', {'base': 'XXX'}, 'base'),
+        ('historical', {'period': '2w'}, 'period'),
+        ('historical', {'to': 'XXX'}, 'to'),
+        ('historical', {'from': 'XXX', 'start': '2024-01-01'}, 'from'),
+        ('convert', {'from': 'XXX'}, 'from'),
+        ('convert', {'to': 'XXX'}, 'to'),
+        ('convert', {'amount': 'abc'}, 'amount'),
+        ('convert', {'amount': 'NaN'}, 'amount'),
+        ('convert', {'amount': '1e999999'}, 'amount'),
+        ('convert', {'amount': '1e307', 'to': 'JPY'}, 'amount'),
+    ])
+    def test_invalid_params(self, client, exchange_rate, url, params, field):
+        response = client.get(f'/api/exchange-rates/{url}/', params)
+        assert response.status_code == 400
+        assert set(response.json()) == {field}
+
     
\ No newline at end of file
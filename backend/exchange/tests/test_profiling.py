@@ -0,0 +1,127 @@
+import time
+import threading
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from exchange.payloads import latest_payload
+from exchange.profiling import PROFILE_ID_HEADER, ProfileStore, Sampler, folded_lines, make_profile_token
+
+
+@pytest.fixture
+def store(settings, tmp_path):
+    settings.RATES_PROFILE_DIR = tmp_path
+    return ProfileStore()
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestSampler:
+    def test_samples_running_thread(self):
+        sampler = Sampler(threading.get_ident(), 0.001).start()
+        busy(0.05)
+        stacks = sampler.stop()
+        assert sum(stacks.values()) > 0
+        assert any('busy (backend/exchange/tests/test_profiling.py' in stack for stack in stacks)
+
+    def test_stacks_cut_at_stop_code(self):
+        sampler = Sampler(threading.get_ident(), 0.001, TestSampler.test_stacks_cut_at_stop_code.__code__).start()
+        busy(0.05)
+        stacks = sampler.stop()
+        assert any(stack.startswith('busy ') for stack in stacks)
+        assert not any('test_stacks_cut_at_stop_code' in stack or 'pytest' in stack for stack in stacks)
+
+
+class TestProfileStore:
+    def test_keeps_newest(self, tmp_path):
+        store = ProfileStore(tmp_path, max_profiles=3)
+        ids = [store.save({'n': n}) for n in range(5)]
+        assert store.ids() == ids[2:]
+        assert store.load(ids[-1])['n'] == 4
+
+    def test_folded_lines(self):
+        assert folded_lines({'a;b': 2, 'a': 1, '': 4}) == ['a 1', 'a;b 2']
+
+
+@pytest.mark.django_db
+class TestProfilingMiddleware:
+    def test_signed_header(self, client, store, rate_days):
+        response = client.get(
+            '/api/exchange-rates/latest/', {'base': 'EUR'}, HTTP_X_RATES_PROFILE=make_profile_token('checkout'),
+        )
+        profile = store.load(response[PROFILE_ID_HEADER])
+        assert profile['view'] == 'exchange-rates-latest'
+        assert profile['path'] == '/api/exchange-rates/latest/?base=EUR'
+        assert (profile['trigger'], profile['label'], profile['status']) == ('header', 'checkout', 200)
+        assert profile['samples'] == sum(profile['stacks'].values())
+
+    def test_forged_header_ignored(self, client, store, rate_days):
+        response = client.get('/api/exchange-rates/latest/', HTTP_X_RATES_PROFILE=make_profile_token() + 'x')
+        assert PROFILE_ID_HEADER not in response
+        assert store.ids() == []
+
+    def test_sample_rate(self, client, store, settings, rate_days):
+        client.get('/api/exchange-rates/latest/')
+        assert store.ids() == []
+
+        settings.RATES_PROFILE_SAMPLE_RATE = 1.0
+        response = client.get('/api/exchange-rates/latest/')
+        assert store.load(response[PROFILE_ID_HEADER])['trigger'] == 'sampled'
+        # Only this app's views are profiled
+        assert PROFILE_ID_HEADER not in client.get('/admin/login/')
+
+    def test_async_view(self, async_client, store, rate_days):
+        response = async_to_sync(async_client.get)(
+            '/api/async/exchange-rates/latest/', headers={'X-Rates-Profile': make_profile_token()},
+        )
+        assert store.load(response[PROFILE_ID_HEADER])['view'] == 'async-exchange-rates-latest'
+
+    @pytest.mark.parametrize('asgi', [False, True])
+    def test_samples_sync_view_thread(self, client, async_client, store, monkeypatch, rate_days, asgi):
+        def slow_latest_payload(matrix, base):
+            busy(0.05)
+            return latest_payload(matrix, base)
+
+        monkeypatch.setattr('exchange.views.latest_payload', slow_latest_payload)
+        headers = {'X-Rates-Profile': make_profile_token()}
+        if asgi:
+            response = async_to_sync(async_client.get)('/api/exchange-rates/latest/', headers=headers)
+        else:
+            response = client.get('/api/exchange-rates/latest/', headers=headers)
+
+        stacks = store.load(response[PROFILE_ID_HEADER])['stacks']
+        # Every sample is inside the view, none of them the event loop waiting
+        assert all('APIView.dispatch (' in stack for stack in stacks)
+        assert any('exchange/cache.py:' in stack and 'slow_latest_payload' in stack for stack in stacks)
+
+
+@pytest.mark.django_db
+class TestProfileRatesCommand:
+    def test_list_and_export(self, store, tmp_path, capsys):
+        first = store.save({'view': 'a', 'path': '/a', 'status': 200, 'duration_ms': 3.0, 'samples': 3,
+                            'trigger': 'header', 'stacks': {'x;y': 2, 'x': 1}})
+        store.save({'view': 'b', 'path': '/b', 'status': 200, 'duration_ms': 1.0, 'samples': 1,
+                    'trigger': 'sampled', 'stacks': {'x;y': 1}})
+
+        call_command('profile_rates', 'list')
+        listing = capsys.readouterr().out
+        assert first in listing and '2 profiles' in listing
+
+        output = tmp_path / 'out.folded'
+        call_command('profile_rates', 'export', '--output', str(output))
+        assert output.read_text().splitlines() == ['x 1', 'x;y 3']
+        capsys.readouterr()
+
+        call_command('profile_rates', 'export', first)
+        assert capsys.readouterr().out.splitlines() == ['x 1', 'x;y 2']
+
+        with pytest.raises(CommandError):
+            call_command('profile_rates', 'export', 'missing')
+
+    def test_token(self, capsys):
+        call_command('profile_rates', 'token', '--label', 'slow')
+        assert capsys.readouterr().out.startswith('X-Rates-Profile: ')
@@ -0,0 +1,131 @@
+import pytest
+import numpy as np
+from exchange.models import DailyRate, ExchangeRate
+from exchange.rate_matrix import get_latest_snapshot, get_rate_matrix
+from datetime import date, timedelta
+
+
+@pytest.mark.django_db
+class TestRateMatrix:
+    def test_matches_model_rates(self, rate_days):
+        matrix = get_rate_matrix()
+        latest = ExchangeRate.objects.latest('date')
+        i = matrix.latest_index()
+
+        assert matrix.date_at(i) == latest.date
+        assert matrix.rate(i, "USD", "EUR") == latest.get_rate("USD", "EUR")
+        assert matrix.rate(i, "EUR", "GBP") == latest.get_rate("EUR", "GBP")
+        assert matrix.rates_for_base(i, "EUR") == latest.get_rates_for_base("EUR")
+        assert matrix.rates_for_base(i, "USD") == latest.rates
+
+    def test_missing_currency_is_skipped(self, rate_days):
+        matrix = get_rate_matrix()
+        assert "JPY" not in matrix.rates_for_base(0, "USD")
+
+        dates, rates = matrix.series("USD", "JPY", 7)
+        assert len(dates) == 2
+        assert rates.tolist() == [109.0, 110.0]
+
+    def test_series_window(self, rate_days):
+        dates, rates = get_rate_matrix().series("EUR", "USD", 1)
+        assert [d.item() for d in dates] == [day for day, _ in rate_days[1:]]
+        assert rates.tolist() == [1 / 0.82, 1 / 0.85]
+
+    def test_incremental_reload_on_new_day(self, rate_days):
+        matrix = get_rate_matrix()
+        tomorrow = date.today() + timedelta(days=1)
+        ExchangeRate.objects.create(date=tomorrow, rates={"EUR": 0.9, "CHF": 0.95})
+
+        matrix = get_rate_matrix()
+        assert len(matrix) == 4
+        assert matrix.date_at(matrix.latest_index()) == tomorrow
+        assert matrix.rate(matrix.latest_index(), "USD", "CHF") == 0.95
+
+    def test_updated_day_reloaded_in_place(self, rate_days):
+        get_rate_matrix().values
+        row = ExchangeRate.objects.get(date=date.today())
+        row.rates = {"EUR": 0.5}
+        row.save()
+
+        matrix = get_rate_matrix()
+        assert not matrix._needs_full_reload
+        assert matrix.rates_for_base(matrix.latest_index(), "USD") == {"EUR": 0.5}
+        assert matrix.rate(0, "USD", "GBP") == 0.70
+
+    def test_full_reload_on_day_inserted_before_last(self, rate_days):
+        matrix = get_rate_matrix()
+        ExchangeRate.objects.create(date=date.today() - timedelta(days=3), rates={"EUR": 0.81})
+
+        matrix = get_rate_matrix()
+        assert len(matrix) == 4
+        assert matrix.rate(0, "USD", "EUR") == 0.81
+
+    def test_empty_table(self):
+        with pytest.raises(ExchangeRate.DoesNotExist):
+            get_rate_matrix().latest_index()
+
+    def test_pair_loads_only_its_columns(self, rate_days):
+        matrix = get_rate_matrix()
+        matrix.series("EUR", "GBP", 7)
+        assert set(matrix._state.columns) == {"EUR", "GBP"}
+
+    def test_refresh_swaps_in_new_state(self, rate_days):
+        matrix = get_rate_matrix()
+        matrix.series("USD", "EUR", 7)
+        held = matrix._state
+        eur = held.columns["EUR"].copy()
+
+        ExchangeRate.objects.create(date=date.today() - timedelta(days=3), rates={"EUR": 0.81})
+        matrix = get_rate_matrix()
+        assert matrix._state is not held
+        assert len(held.dates) == 3
+        np.testing.assert_array_equal(held.columns["EUR"], eur)
+        assert len(matrix) == 4
+
+
+@pytest.mark.django_db
+class TestLatestSnapshot:
+    def test_rates_both_ways(self, rate_days):
+        snapshot = get_latest_snapshot()
+        latest = ExchangeRate.objects.latest('date')
+
+        assert snapshot.date == latest.date
+        assert snapshot.rate("USD", "EUR") == latest.get_rate("USD", "EUR")
+        assert snapshot.rate("JPY", "GBP") == latest.get_rate("JPY", "GBP")
+        assert snapshot.rate("EUR", "EUR") == 1.0
+        with pytest.raises(KeyError):
+            snapshot.rate("USD", "XXX")
+
+    def test_convert_without_queries(self, client, rate_days, django_assert_num_queries):
+        client.get('/api/exchange-rates/convert/?from=GBP&to=JPY')
+        with django_assert_num_queries(0):
+            response = client.get('/api/exchange-rates/convert/?amount=2&from=GBP&to=JPY')
+        assert response.json()['result'] == 2 * 110.0 / 0.73
+
+    def test_replaced_on_new_day(self, rate_days):
+        before = get_latest_snapshot()
+        assert get_latest_snapshot() is before
+
+        tomorrow = date.today() + timedelta(days=1)
+        ExchangeRate.objects.create(date=tomorrow, rates={"EUR": 0.9}, base="USD")
+        snapshot = get_latest_snapshot()
+        assert snapshot.date == tomorrow
+        assert snapshot.rate("EUR", "USD") == 1 / 0.9
+
+
+@pytest.mark.django_db
+class TestDailyRate:
+    def test_synced_on_save(self, rate_days):
+        today = date.today()
+        rows = dict(DailyRate.objects.filter(date=today).values_list('currency', 'rate'))
+        assert rows == {"EUR": 0.85, "GBP": 0.73, "JPY": 110.0, "USD": 1.0}
+
+    def test_duplicate_day_keeps_last_row(self, rate_days):
+        today = date.today()
+        ExchangeRate.objects.create(date=today, rates={"EUR": 0.9}, base="GBP")
+        rows = dict(DailyRate.objects.filter(date=today).values_list('currency', 'rate'))
+        assert rows == {"EUR": 0.9, "GBP": 1.0}
+
+    def test_removed_with_exchange_rate(self, rate_days):
+        ExchangeRate.objects.filter(date=date.today()).get().delete()
+        assert not DailyRate.objects.filter(date=date.today()).exists()
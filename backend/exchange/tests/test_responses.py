@@ -0,0 +1,111 @@
+import gzip
+import json
+import pytest
+from exchange.models import ExchangeRate
+from exchange.responses import brotli, preferred_encoding
+from datetime import date, timedelta
+from django.test import RequestFactory
+
+
+@pytest.fixture
+def exchange_rate():
+    return ExchangeRate.objects.create(
+        date=date.today(),
+        rates={"EUR": 0.85, "GBP": 0.73, "JPY": 110.0},
+        base="USD"
+    )
+
+
+def encoding_for(header):
+    return preferred_encoding(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=header))
+
+
+def test_preferred_encoding():
+    assert encoding_for('') == 'identity'
+    assert encoding_for('gzip, deflate') == 'gzip'
+    assert encoding_for('gzip;q=0, deflate') == 'identity'
+    assert encoding_for('gzip, br') == ('br' if brotli else 'gzip')
+
+
+@pytest.mark.django_db
+class TestEncodedResponses:
+    url = '/api/exchange-rates/latest/?base=EUR'
+
+    def test_miss_and_hit_send_same_bytes(self, client, exchange_rate):
+        first = client.get(self.url)
+        second = client.get(self.url)
+
+        assert first.status_code == second.status_code == 200
+        assert first['Content-Type'] == 'application/json'
+        assert first.content == second.content
+        assert first['ETag'] == second['ETag']
+        assert first['Content-Length'] == str(len(first.content))
+        assert json.loads(first.content)['base'] == 'EUR'
+
+    def test_gzip_variant(self, client, exchange_rate):
+        plain = client.get(self.url)
+        response = client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+
+        assert response['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response['Vary']
+        assert gzip.decompress(response.content) == plain.content
+        assert response['ETag'] != plain['ETag']
+
+    @pytest.mark.skipif(brotli is None, reason='brotli not installed')
+    def test_brotli_variant(self, client, exchange_rate):
+        plain = client.get(self.url)
+        response = client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+
+        assert response['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.content) == plain.content
+
+    def test_browsable_api_still_renders(self, client, exchange_rate):
+        client.get(self.url)
+        response = client.get(self.url + '&format=api')
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/html')
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    def test_cached_endpoint_not_modified(self, client, exchange_rate):
+        url = '/api/exchange-rates/historical/?from=USD&to=EUR&period=1w'
+        first = client.get(url)
+        assert first['Last-Modified']
+        assert 'max-age=300' in first['Cache-Control']
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert response.status_code == 304
+        assert response.content == b''
+        assert response['ETag'] == first['ETag']
+
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        assert response.status_code == 304
+
+    def test_etag_changes_with_new_day(self, client, exchange_rate, django_capture_on_commit_callbacks):
+        url = '/api/exchange-rates/latest/'
+        first = client.get(url)
+        with django_capture_on_commit_callbacks(execute=True):
+            ExchangeRate.objects.create(date=date.today() + timedelta(days=1), rates={"EUR": 0.9})
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert response.status_code == 200
+        assert response.json()['rates'] == {"EUR": 0.9}
+
+    def test_currency_views_not_modified_without_queries(self, client, exchange_rate, django_assert_num_queries):
+        url = '/api/currencies/codes_and_names/'
+        first = client.get(url)
+        assert first.status_code == 200
+
+        with django_assert_num_queries(0):
+            response = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert response.status_code == 304
+
+    def test_convert_not_modified(self, client, exchange_rate):
+        url = '/api/exchange-rates/convert/?amount=10&from=USD&to=EUR'
+        first = client.get(url)
+        assert first.json()['result'] == 8.5
+
+        assert client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code == 304
+        other = client.get(url.replace('amount=10', 'amount=20'), HTTP_IF_NONE_MATCH=first['ETag'])
+        assert other.status_code == 200
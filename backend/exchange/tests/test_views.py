@@ -0,0 +1,298 @@
+import pytest
+from django_redis import get_redis_connection
+from exchange.cache import CACHE_INDEX_KEY
+from exchange.models import ExchangeRate
+from datetime import date, timedelta
+
+
+@pytest.mark.django_db
+class TestHistoricalBatch:
+    url = '/api/exchange-rates/historical_batch/'
+
+    def test_pairs_share_one_date_axis(self, client, rate_days):
+        response = client.get(self.url, {'pairs': 'USD-EUR,GBP-JPY,EUR-USD', 'period': '1w'})
+        assert response.status_code == 200
+        data = response.json()
+
+        assert data['dates'] == [day.isoformat() for day, _ in rate_days]
+        assert data['series']['USD/EUR'] == [0.80, 0.82, 0.85]
+        assert data['series']['EUR/USD'] == [1 / 0.80, 1 / 0.82, 1 / 0.85]
+        assert data['series']['GBP/JPY'] == [None, 109.0 / 0.71, 110.0 / 0.73]
+
+    def test_base_against_targets(self, client, rate_days):
+        response = client.get(self.url, {'base': 'EUR', 'targets': 'USD,GBP', 'period': '1w'})
+        assert list(response.json()['series']) == ['EUR/USD', 'EUR/GBP']
+
+    def test_matches_single_pair_endpoint(self, client, rate_days):
+        single = client.get('/api/exchange-rates/historical/?from=GBP&to=EUR&period=1w').json()['data']
+        batch = client.get(self.url, {'pairs': 'GBP-EUR', 'period': '1w'}).json()
+        assert [point['rate'] for point in single] == batch['series']['GBP/EUR']
+
+    @pytest.mark.parametrize('params', [
+        {'pairs': 'USD-EUR', 'period': '2w'},
+        {'pairs': 'USDEUR'},
+        {'pairs': 'USD-XXX'},
+        {'base': 'USD'},
+    ])
+    def test_invalid_requests(self, client, rate_days, params):
+        assert client.get(self.url, params).status_code == 400
+
+
+@pytest.mark.django_db
+class TestConvertBatch:
+    url = '/api/exchange-rates/convert_batch/'
+
+    def post(self, client, payload):
+        return client.post(self.url, payload, content_type='application/json')
+
+    def test_items_match_single_convert(self, client, rate_days):
+        items = [
+            {'amount': '10', 'from': 'USD', 'to': 'EUR'},
+            {'amount': 2.5, 'from': 'GBP', 'to': 'JPY'},
+            {'amount': '100', 'from': 'EUR', 'to': 'GBP'},
+        ]
+        response = self.post(client, {'items': items})
+        assert response.status_code == 200
+        converted = response.json()['items']
+
+        for item, result in zip(items, converted):
+            single = client.get('/api/exchange-rates/convert/', {
+                'amount': item['amount'], 'from': item['from'], 'to': item['to'],
+            }).json()
+            assert result['rate'] == single['rate']
+            assert float(result['result']) == single['result']
+            assert result['date'] == single['date']
+
+    def test_dates_and_rounding(self, client, rate_days):
+        first_day = rate_days[0][0].isoformat()
+        response = self.post(client, {
+            'amount': ['1', '1'],
+            'from': ['USD', 'USD'],
+            'to': ['EUR', 'EUR'],
+            'date': [first_day, None],
+            'places': 1,
+        })
+        data = response.json()
+        assert data['date'] == [first_day, rate_days[-1][0].isoformat()]
+        assert data['rate'] == [0.80, 0.85]
+        # 0.85 rounds half-even to 0.8
+        assert data['result'] == ['0.8', '0.8']
+
+    @pytest.mark.parametrize('payload', [
+        {'items': [{'amount': '1', 'from': 'USD', 'to': 'XXX'}]},
+        {'items': [{'amount': 'ten', 'from': 'USD', 'to': 'EUR'}]},
+        {'items': [{'amount': '1', 'from': 'USD'}]},
+        {'items': [{'amount': '1', 'from': 'USD', 'to': 'JPY', 'date': '2000-01-01'}]},
+        {'items': []},
+        {'amount': ['1'], 'from': ['USD'], 'to': ['EUR', 'GBP']},
+        {'items': [{'amount': '1', 'from': 'USD', 'to': 'EUR'}], 'places': -1},
+        {'items': [{'amount': '1', 'from': 5, 'to': 'EUR'}]},
+        {'amount': ['1'], 'from': ['USD'], 'to': [['EUR']]},
+        [{'amount': '1', 'from': 'USD', 'to': 'EUR'}],
+        {'items': [{'amount': '1e999999', 'from': 'USD', 'to': 'EUR'}], 'places': 2},
+        {'items': [{'amount': 'NaN', 'from': 'USD', 'to': 'EUR'}]},
+    ])
+    def test_invalid_requests(self, client, rate_days, payload):
+        assert self.post(client, payload).status_code == 400
+
+    def test_currency_missing_on_day(self, client, rate_days):
+        response = self.post(client, {'items': [
+            {'amount': '1', 'from': 'USD', 'to': 'EUR'},
+            {'amount': '1', 'from': 'USD', 'to': 'JPY', 'date': rate_days[0][0].isoformat()},
+        ]})
+        assert response.status_code == 400
+        assert response.json()['items'].startswith('Item 1:')
+
+
+@pytest.mark.django_db
+class TestAsOf:
+    @pytest.fixture
+    def week_days(self):
+        # Friday, then nothing until Monday
+        days = [date(2024, 3, 7), date(2024, 3, 8), date(2024, 3, 11)]
+        for i, day in enumerate(days):
+            ExchangeRate.objects.create(date=day, rates={"EUR": 0.90 + i / 100, "GBP": 0.78}, base="USD")
+        return days
+
+    def test_convert_on_weekend_uses_friday(self, client, week_days):
+        data = client.get('/api/exchange-rates/convert/', {
+            'amount': '10', 'from': 'USD', 'to': 'EUR', 'as_of': '2024-03-10',
+        }).json()
+        assert data['date'] == '2024-03-08'
+        assert data['as_of'] == '2024-03-10'
+        assert data['rate'] == 0.91
+        assert data['result'] == pytest.approx(9.1)
+
+    def test_convert_as_of_latest_matches_default(self, client, week_days):
+        params = {'amount': '3', 'from': 'GBP', 'to': 'EUR'}
+        latest = client.get('/api/exchange-rates/convert/', params).json()
+        as_of = client.get('/api/exchange-rates/convert/', {**params, 'as_of': '2030-01-01'}).json()
+        assert {**latest, 'as_of': '2030-01-01'} == as_of
+
+    def test_latest_and_previous(self, client, week_days):
+        latest = client.get('/api/exchange-rates/latest/', {'base': 'USD', 'as_of': '2024-03-09'}).json()
+        assert latest['date'] == '2024-03-08'
+        assert latest['rates'] == {"EUR": 0.91, "GBP": 0.78}
+        previous = client.get('/api/exchange-rates/previous/', {'as_of': '2024-03-09'}).json()
+        assert previous['date'] == '2024-03-07'
+
+    def test_batch_resolves_many_dates(self, client, week_days):
+        dates = ['2024-03-07', '2024-03-09', '2024-03-10', '2024-03-11', '2024-03-20', '2024-03-09']
+        response = client.post('/api/exchange-rates/convert_batch/', {
+            'amount': ['1'] * len(dates), 'from': ['USD'] * len(dates), 'to': ['EUR'] * len(dates),
+            'date': dates, 'as_of': True,
+        }, content_type='application/json')
+        data = response.json()
+        assert data['date'] == ['2024-03-07', '2024-03-08', '2024-03-08', '2024-03-11', '2024-03-11', '2024-03-08']
+        assert data['rate'] == [0.90, 0.91, 0.91, 0.92, 0.92, 0.91]
+
+    @pytest.mark.parametrize('url, params, field', [
+        ('convert', {'as_of': '2024-03-06'}, 'as_of'),
+        ('convert', {'as_of': 'friday'}, 'as_of'),
+        ('convert', {'as_of': '20240308'}, 'as_of'),
+        ('convert', {'as_of': '2024-03-08', 'from': 'XXX'}, 'from'),
+        ('convert', {'as_of': '2024-03-08', 'to': 'XXX'}, 'to'),
+        ('latest', {'as_of': '2024-03'}, 'as_of'),
+        ('latest', {'as_of': '2024-03-06'}, 'as_of'),
+        ('previous', {'as_of': '2024-03-07'}, 'as_of'),
+        ('latest', {'as_of': '2024-03-08', 'base': 'XXX'}, 'base'),
+    ])
+    def test_invalid_requests(self, client, week_days, url, params, field):
+        response = client.get(f'/api/exchange-rates/{url}/', params)
+        assert response.status_code == 400
+        assert set(response.json()) == {field}
+
+    def test_batch_date_before_first_day(self, client, week_days):
+        response = client.post('/api/exchange-rates/convert_batch/', {'items': [
+            {'amount': '1', 'from': 'USD', 'to': 'EUR', 'date': '2024-03-09'},
+            {'amount': '1', 'from': 'USD', 'to': 'EUR', 'date': '2024-03-01'},
+        ], 'as_of': True}, content_type='application/json')
+        assert response.status_code == 400
+        assert response.json()['items'].startswith('Item 1:')
+
+    @pytest.mark.parametrize('day', [20240308, '20240308', '2024-03'])
+    def test_batch_non_iso_date(self, client, week_days, day):
+        response = client.post('/api/exchange-rates/convert_batch/', {'items': [
+            {'amount': '1', 'from': 'USD', 'to': 'EUR', 'date': day},
+        ], 'as_of': True}, content_type='application/json')
+        assert response.status_code == 400
+        assert response.json()['items'].startswith('Item 0: invalid date')
+
+
+@pytest.fixture
+def year_days():
+    days = [date(2022, 12, 29), date(2022, 12, 30), date(2023, 1, 2), date(2023, 6, 1),
+            date(2023, 12, 29), date(2024, 1, 2), date(2024, 1, 3)]
+    for i, day in enumerate(days):
+        ExchangeRate.objects.create(date=day, rates={"EUR": 0.80 + i / 100, "GBP": 0.70}, base="USD")
+    return days
+
+
+@pytest.mark.django_db
+class TestHistoricalRange:
+    url = '/api/exchange-rates/historical/'
+
+    def dates(self, client, **params):
+        response = client.get(self.url, {'from': 'USD', 'to': 'EUR', **params})
+        assert response.status_code == 200
+        return [point['date'] for point in response.json()['data']]
+
+    def test_inclusive_bounds_across_years(self, client, year_days):
+        assert self.dates(client, start='2022-12-30', end='2024-01-02') == [
+            '2022-12-30', '2023-01-02', '2023-06-01', '2023-12-29', '2024-01-02',
+        ]
+        assert self.dates(client, start='2023-01-01', end='2023-12-31') == [
+            '2023-01-02', '2023-06-01', '2023-12-29',
+        ]
+        assert self.dates(client, start='2023-06-02', end='2023-12-28') == []
+
+    def test_defaults_to_all_stored_days(self, client, year_days):
+        assert self.dates(client, start='2000-01-01') == [day.isoformat() for day in year_days]
+        assert self.dates(client, end='2022-12-29') == ['2022-12-29']
+
+    def test_ranges_share_year_chunks(self, client, year_days):
+        redis_conn = get_redis_connection("default")
+        self.dates(client, start='2023-02-01', end='2024-01-02')
+        self.dates(client, start='2023-06-01', end='2024-01-03')
+        assert {key.decode() for key in redis_conn.zrange(CACHE_INDEX_KEY, 0, -1)} == {
+            'historical_year_USD_EUR_2023', 'historical_year_USD_EUR_2024',
+        }
+
+    def test_rates_match_period_series(self, client, year_days):
+        response = client.get(self.url, {'from': 'GBP', 'to': 'EUR', 'start': '2023-12-27'}).json()
+        period = client.get(self.url, {'from': 'GBP', 'to': 'EUR', 'period': '1w'}).json()
+        assert response['data'] == period['data']
+        assert (response['start'], response['end']) == ('2023-12-27', '2024-01-03')
+
+    def test_only_chunks_covering_a_change_are_evicted(self, client, year_days, django_capture_on_commit_callbacks):
+        redis_conn = get_redis_connection("default")
+        self.dates(client, start='2022-01-01')
+
+        row = ExchangeRate.objects.get(date=date(2023, 6, 1))
+        row.rates = {"EUR": 0.5, "GBP": 0.7}
+        with django_capture_on_commit_callbacks(execute=True):
+            row.save()
+
+        assert {key.decode() for key in redis_conn.zrange(CACHE_INDEX_KEY, 0, -1)} == {
+            'historical_year_USD_EUR_2022', 'historical_year_USD_EUR_2024',
+        }
+        response = client.get(self.url, {'from': 'USD', 'to': 'EUR', 'start': '2023-06-01', 'end': '2023-06-01'})
+        assert response.json()['data'] == [{'date': '2023-06-01', 'rate': 0.5}]
+
+    def test_series_formats(self, client, year_days):
+        response = client.get(self.url, {'start': '2023-01-01', 'format': 'columnar'})
+        assert response.json()['days'] == [0, 150, 361, 365, 366]
+
+    @pytest.mark.parametrize('params', [
+        {'start': '2023-13-01'},
+        {'start': '2024-01-03', 'end': '2023-01-01'},
+        {'start': '2023-01-01', 'to': 'XXX'},
+        {'start': '2023-01-01', 'points': '50'},
+    ])
+    def test_invalid_requests(self, client, year_days, params):
+        assert client.get(self.url, params).status_code == 400
+
+
+@pytest.mark.django_db
+class TestMovers:
+    url = '/api/exchange-rates/movers/'
+
+    @pytest.fixture
+    def mover_days(self):
+        today = date.today()
+        days = [
+            (today - timedelta(days=8), {"EUR": 0.90, "GBP": 0.70, "JPY": 100.0, "CHF": 0.90}),
+            (today - timedelta(days=1), {"EUR": 0.80, "GBP": 0.75, "JPY": 110.0, "CHF": 0.90}),
+            (today, {"EUR": 0.88, "GBP": 0.75, "JPY": 99.0, "CHF": 0.90}),
+        ]
+        for day, rates in days:
+            ExchangeRate.objects.create(date=day, rates=rates, base="USD")
+        return days
+
+    def test_daily_movers(self, client, mover_days):
+        data = client.get(self.url, {'k': 2}).json()
+        assert data['since'] == mover_days[1][0].isoformat()
+        assert [(m['currency'], m['change']) for m in data['gainers']] == [
+            ('EUR', pytest.approx(0.1)), ('CHF', 0.0),
+        ]
+        assert [m['currency'] for m in data['losers']] == ['JPY', 'CHF']
+        assert data['losers'][0]['rate'] == 99.0
+        assert data['losers'][0]['previous_rate'] == 110.0
+
+    def test_other_base_and_horizon(self, client, mover_days):
+        data = client.get(self.url, {'base': 'EUR', 'horizon': '1w', 'k': 1}).json()
+        # A week before today is before the middle day, so the first day is compared
+        assert data['since'] == mover_days[0][0].isoformat()
+        assert data['gainers'][0]['currency'] == 'GBP'
+        assert data['gainers'][0]['change'] == pytest.approx((0.75 / 0.88) / (0.70 / 0.90) - 1)
+        assert data['losers'][0]['currency'] == 'JPY'
+        assert 'EUR' not in {m['currency'] for m in data['gainers'] + data['losers']}
+
+    @pytest.mark.parametrize('params', [
+        {'horizon': '2d'},
+        {'base': 'XXX'},
+        {'k': '0'},
+        {'k': 'all'},
+    ])
+    def test_invalid_requests(self, client, mover_days, params):
+        assert client.get(self.url, params).status_code == 400
@@ -1,9 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ExchangeRateViewSet, CurrencyViewSet
+from . import async_views
+from .views import ExchangeRateViewSet, CurrencyViewSet, metrics_view
 
 router = DefaultRouter()
 router.register(r'exchange-rates', ExchangeRateViewSet, basename='exchange-rates')
 router.register(r'currencies', CurrencyViewSet, basename='currencies')
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = router.urls + [
+    path('metrics/', metrics_view, name='metrics'),
+    path('async/exchange-rates/latest/', async_views.latest, name='async-exchange-rates-latest'),
+    path('async/exchange-rates/previous/', async_views.previous, name='async-exchange-rates-previous'),
+    path('async/exchange-rates/historical/', async_views.historical, name='async-exchange-rates-historical'),
+    path('async/exchange-rates/convert/', async_views.convert, name='async-exchange-rates-convert'),
+]
@@ -1,18 +1,227 @@
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from decimal import Decimal
-from .serializers import CurrencySerializer, ExchangeRateSerializer, HistoricalRateSerializer
+from rest_framework.settings import api_settings
+from bisect import bisect_left, bisect_right
+from datetime import date
+from decimal import Decimal, DecimalException
+from django.http import HttpResponse
+from .serializers import CurrencySerializer, ExchangeRateSerializer
 from .models import Currency, ExchangeRate
-from datetime import timedelta
+from .analytics import top_movers
+from .rate_matrix import RateMatrix, get_latest_snapshot, get_rate_matrix
+from .conversion import ISO_DATE, ConversionError, convert_batch
+from .cache import cached_or_build, local_cache
+from .instrumentation import metrics
+from .downsampling import MAX_POINTS, MIN_POINTS, RESOLUTIONS
+from .payloads import (
+    PERIODS, analytics_key, analytics_payload, historical_batch_key, historical_batch_payload, historical_key, historical_payload,
+    historical_year_key, historical_year_payload, latest_key, latest_payload, previous_key, previous_payload,
+)
+from .formats import SERIES_FORMATS
+from .renderers import SERIES_RENDERERS
+from .responses import (
+    add_validators, encoded_response, not_modified_response, preferred_encoding, validator_etag, variant_etag,
+    variant_name,
+)
+from django.utils.cache import patch_vary_headers
 from django_redis import get_redis_connection
+import functools
 import json
+import math
+
+# Upper bound on pairs per historical_batch request
+MAX_BATCH_PAIRS = 100
+
+# Upper bound on movers' ``k``
+MAX_MOVERS = 50
+
+# Upper bound on items per convert_batch request and on its ``places``
+MAX_CONVERT_ITEMS = 100_000
+MAX_CONVERT_PLACES = 12
+
+
+def rates_conditional(view_method):
+    """Answer conditional GETs for a view whose output only changes with new days.
+
+    The ETag and Last-Modified come from the latest day held by the
+    in-process rate matrix, so a matching request gets its 304 before the
+    view runs.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        day = get_rate_matrix().last_date
+        etag = validator_etag(request, day)
+        response = not_modified_response(request, etag, day) or view_method(self, request, *args, **kwargs)
+        if 200 <= response.status_code < 400:
+            add_validators(response, etag, day)
+        return response
+    return wrapper
+
+
+def downsampling_params(params):
+    """Validated (points, resolution) query params for historical"""
+    resolution = params.get('resolution') or None
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise ValidationError({'resolution': f'Must be one of {", ".join(RESOLUTIONS)}.'})
+
+    points = params.get('points') or None
+    if points is not None:
+        try:
+            points = int(points)
+        except ValueError:
+            raise ValidationError({'points': 'Must be an integer.'})
+        if not MIN_POINTS <= points <= MAX_POINTS:
+            raise ValidationError({'points': f'Must be between {MIN_POINTS} and {MAX_POINTS}.'})
+        if resolution is not None:
+            raise ValidationError({'points': 'points and resolution cannot be combined.'})
+    return points, resolution
+
+
+def pairs_param(params, matrix):
+    """Validated (from, to) pairs from ?pairs=USD-EUR,GBP-JPY or ?base=USD&targets=EUR,GBP"""
+    if 'pairs' in params:
+        pairs = []
+        for pair in params['pairs'].split(','):
+            from_currency, _, to_currency = pair.strip().partition('-')
+            if not from_currency or not to_currency:
+                raise ValidationError({'pairs': f'Invalid pair {pair!r}, expected FROM-TO.'})
+            pairs.append((from_currency, to_currency))
+    else:
+        base = params.get('base', 'USD')
+        targets = [code for code in params.get('targets', '').split(',') if code]
+        pairs = [(base, target) for target in targets]
+
+    if not 0 < len(pairs) <= MAX_BATCH_PAIRS:
+        raise ValidationError({'pairs': f'Between 1 and {MAX_BATCH_PAIRS} pairs are required.'})
+    unknown = sorted({code for pair in pairs for code in pair} - set(matrix.currencies))
+    if unknown:
+        raise ValidationError({'pairs': f'Unknown currencies: {", ".join(unknown)}.'})
+    return pairs
+
+
+def currency_param(params, name, matrix, default):
+    """?<name>= currency code, which must be one the matrix holds"""
+    code = params.get(name, default)
+    if code not in matrix.index:
+        raise ValidationError({name: f'Unknown currency {code!r}.'})
+    return code
+
+
+def period_param(params):
+    period = params.get('period', '1w')
+    if period not in PERIODS:
+        raise ValidationError({'period': f'Must be one of {", ".join(PERIODS)}.'})
+    return period
+
+
+def date_param(params, name, default=None):
+    value = params.get(name)
+    if not value:
+        return default
+    try:
+        parsed = date.fromisoformat(value) if ISO_DATE.fullmatch(value) else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Must be a date as YYYY-MM-DD.'})
+    return parsed
+
+
+def as_of_row(matrix, params):
+    """Matrix row of the last stored day on or before ?as_of=, None without one"""
+    day = date_param(params, 'as_of')
+    if day is None:
+        return None
+    try:
+        return matrix.index_as_of(day)
+    except ExchangeRate.DoesNotExist:
+        raise ValidationError({'as_of': f'No rates stored on or before {day}.'})
+
+
+def snapshot_as_of(matrix, params, base, offset=0):
+    """latest's payload (previous's with ``offset=1``) as of ?as_of=, None without it"""
+    i = as_of_row(matrix, params)
+    if i is None:
+        return None
+    if i < offset:
+        raise ValidationError({'as_of': 'No earlier day is stored.'})
+    try:
+        return {**matrix.snapshot(i - offset, base), 'as_of': params['as_of']}
+    except KeyError:
+        raise ValidationError({'base': f'Unknown currency {base!r}.'})
+
+
+def amount_param(params):
+    """?amount= as a Decimal, which must fit the float the response carries"""
+    value = params.get('amount', '1.0')
+    try:
+        amount = Decimal(value)
+    except DecimalException:
+        amount = None
+    if amount is None or not math.isfinite(float(amount)):
+        raise ValidationError({'amount': f'Invalid amount {value!r}.'})
+    return amount
+
+
+def converted(amount, rate):
+    result = amount * rate
+    if not math.isfinite(float(result)):
+        raise ValidationError({'amount': f'Result of {str(amount)!r} is out of range.'})
+    return result
+
+
+def snapshot_rate(matrix, snapshot, from_currency, to_currency):
+    """Decimal from/to rate of the latest day's LatestSnapshot"""
+    try:
+        return snapshot.decimal_rate(from_currency, to_currency)
+    except KeyError:
+        name, code = ('from', from_currency) if from_currency not in snapshot.rates else ('to', to_currency)
+        if code in matrix.index:
+            raise ValidationError({name: 'Currency not quoted on that day.'})
+        raise ValidationError({name: f'Unknown currency {code!r}.'})
+
+
+def rate_as_of(matrix, i, from_currency, to_currency):
+    """Decimal from/to rate on row ``i``, as LatestSnapshot.decimal_rate gives for the latest one"""
+    try:
+        rate = matrix.rate(i, from_currency, to_currency)
+    except KeyError:
+        name, code = ('from', from_currency) if from_currency not in matrix.index else ('to', to_currency)
+        raise ValidationError({name: f'Unknown currency {code!r}.'})
+    if math.isnan(rate):
+        raise ValidationError({'to': 'Currency not quoted on that day.'})
+    return Decimal(str(rate))
+
+
+def metrics_view(request):
+    """This process's request, phase and cache metrics for Prometheus to scrape"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def slice_rows(body, start, end):
+    """Rows of a cached year chunk from ``start`` to ``end``, as JSON without brackets"""
+    rows = json.loads(body)
+    lo = bisect_left(rows, start.isoformat(), key=lambda row: row['date'])
+    hi = bisect_right(rows, end.isoformat(), key=lambda row: row['date'])
+    return json.dumps(rows[lo:hi], separators=(',', ':')).encode()[1:-1]
+
 
 class CurrencyViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Currency.objects.filter(is_active=True)
     serializer_class = CurrencySerializer
 
+    @rates_conditional
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @rates_conditional
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=['get'])
+    @rates_conditional
     def codes_and_names(self, request):
         """Return dictionary of currency codes and names"""
         currencies = self.get_queryset()
@@ -26,118 +235,332 @@ class ExchangeRateViewSet(viewsets.ModelViewSet):
     queryset = ExchangeRate.objects.all()
     serializer_class = ExchangeRateSerializer
     
+    def cached_rates_response(self, request, cache_key, build_payload):
+        """Serve a rates payload from cache, building and caching it on a miss.
+
+        JSON requests, and requests for a series format the payload is
+        cached in, get the stored bytes (pre-compressed when the client
+        accepts it) without decoding or re-rendering them, or a 304 when
+        their If-None-Match/If-Modified-Since still match the cached entry.
+        Concurrent misses on one key share a single build (see
+        cache.cached_or_build).
+        """
+        redis_conn = get_redis_connection("default")
+        fmt = request.accepted_renderer.format
+        serves_bytes = fmt == 'json' or fmt in SERIES_FORMATS
+        encoding = preferred_encoding(request) if serves_bytes else 'identity'
+        variant = variant_name(fmt, encoding) if serves_bytes else 'identity'
+
+        cached = cached_or_build(redis_conn, cache_key, variant, build_payload)
+
+        if not serves_bytes:
+            return Response(json.loads(cached.body))
+
+        etag = variant_etag(cached.etag, variant)
+        response = (
+            not_modified_response(request, etag, cached.modified)
+            or encoded_response(cached.body, cached.etag, encoding, fmt)
+        )
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return add_validators(response, etag, cached.modified)
+
+    def assembled_response(self, request, build_body):
+        """Response whose JSON body ``build_body()`` puts together from cached pieces.
+
+        Its validators come from the latest stored day, as with
+        rates_conditional; other renderers get the decoded body.
+        """
+        day = get_rate_matrix().last_date
+        etag = validator_etag(request, day)
+        response = not_modified_response(request, etag, day)
+        if response is None:
+            body = build_body()
+            if request.accepted_renderer.format == 'json':
+                response = HttpResponse(body, content_type='application/json')
+            else:
+                response = Response(json.loads(body))
+        patch_vary_headers(response, ['Accept'])
+        return add_validators(response, etag, day)
+
+    @rates_conditional
+    def as_of_response(self, request, base, offset=0):
+        """latest/previous for ?as_of=, built from the matrix rather than cached per day"""
+        return Response(snapshot_as_of(get_rate_matrix(), request.query_params, base, offset))
 
     @action(detail=False, methods=['get'])
     def latest(self, request):
-
-        redis_conn = get_redis_connection("default")
-        base = request.query_params.get('base', 'USD')
-        cache_key = f"latest_rates_{base}"
-        cached_data = redis_conn.get(cache_key)
-        
-        if cached_data:
-            return Response(json.loads(cached_data))
-
-        latest_rate = self.get_queryset().latest('date')
-        serializer = self.get_serializer(latest_rate, context={'request': request})
-        data =serializer.data
-        redis_conn.setex(cache_key, 3600, json.dumps(data))
-        return Response(data)
+        """Rates of the latest day, or of the last day on or before ?as_of="""
+        matrix = get_rate_matrix()
+        base = currency_param(request.query_params, 'base', matrix, 'USD')
+        if request.query_params.get('as_of'):
+            return self.as_of_response(request, base)
+        return self.cached_rates_response(
+            request, latest_key(base),
+            lambda: latest_payload(matrix, base),
+        )
     
     @action(detail=False, methods=['get'])
     def previous(self, request):
+        matrix = get_rate_matrix()
+        base = currency_param(request.query_params, 'base', matrix, 'USD')
+        if request.query_params.get('as_of'):
+            return self.as_of_response(request, base, offset=1)
+        return self.cached_rates_response(
+            request, previous_key(base),
+            lambda: previous_payload(matrix, base),
+        )
+    
 
-        redis_conn = get_redis_connection("default")
-        base = request.query_params.get('base', 'USD')
-        cache_key = f"previous_rates_{base}"
-        cached_data = redis_conn.get(cache_key)
+    @action(detail=False, methods=['get'], renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + SERIES_RENDERERS)
+    def historical(self, request):
+        """Daily rates of a pair; ?format= or Accept also offer columnar JSON, msgpack and Arrow IPC"""
+        matrix = get_rate_matrix()
+        from_currency = currency_param(request.query_params, 'from', matrix, 'USD')
+        to_currency = currency_param(request.query_params, 'to', matrix, 'EUR')
+        if 'start' in request.query_params or 'end' in request.query_params:
+            return self.historical_range(request, matrix, from_currency, to_currency)
+        period = period_param(request.query_params)
+        points, resolution = downsampling_params(request.query_params)
 
+        return self.cached_rates_response(
+            request, historical_key(from_currency, to_currency, period, points, resolution),
+            lambda: historical_payload(matrix, from_currency, to_currency, period, points, resolution),
+        )
 
-        if cached_data:
-         return Response(json.loads(cached_data))
+    def historical_range(self, request, matrix, from_currency, to_currency):
+        """historical from ?start= (default: the first day) to ?end= (default: the latest day).
 
-         
-        latest = self.get_queryset().latest('date')
-        previous = self.get_queryset().filter(date__lt=latest.date).latest('date')
-        
-        serializer = self.get_serializer(previous, context={'request': request})
-        data =serializer.data
-        redis_conn.setex(cache_key, 3600, json.dumps(data))
-        return Response(data)
-    
+        The series is put together from cached calendar-year chunks, sliced
+        at the ends with bisect, so any range reuses a pair's year keys
+        instead of caching one entry per range.
+        """
+        if request.query_params.get('points') or request.query_params.get('resolution'):
+            raise ValidationError({'start': 'points and resolution are not supported with start/end.'})
+        last_day = matrix.last_date
+        first_day = matrix.date_at(0) if len(matrix) else None
+        start = date_param(request.query_params, 'start', first_day)
+        end = date_param(request.query_params, 'end', last_day)
+        if start is None or end is None or start > end:
+            raise ValidationError({'start': 'start must be on or before end.'})
+
+        def build_body():
+            redis_conn = get_redis_connection("default")
+            chunks = []
+            for year in range(max(start, first_day).year, min(end, last_day).year + 1):
+                cached = cached_or_build(
+                    redis_conn, historical_year_key(from_currency, to_currency, year), 'identity',
+                    functools.partial(historical_year_payload, matrix, from_currency, to_currency, year),
+                )
+                if start > date(year, 1, 1) or end < date(year, 12, 31):
+                    chunks.append(slice_rows(cached.body, start, end))
+                else:
+                    chunks.append(cached.body[1:-1])
+
+            head = json.dumps({
+                'from': from_currency,
+                'to': to_currency,
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+            }, separators=(',', ':'))[:-1]
+            return f'{head},"data":['.encode() + b','.join(chunk for chunk in chunks if chunk) + b']}'
+
+        return self.assembled_response(request, build_body)
 
     @action(detail=False, methods=['get'])
-    def historical(self, request):
-        from_currency = request.query_params.get('from', 'USD')
-        to_currency = request.query_params.get('to', 'EUR')
-        period = request.query_params.get('period', '1w')
+    def historical_batch(self, request):
+        """Several pairs over one period, e.g. ?pairs=USD-EUR,GBP-JPY or ?base=USD&targets=EUR,GBP"""
+        period = period_param(request.query_params)
 
-        redis_conn = get_redis_connection("default")
-        cache_key = f"historical_rates_{from_currency}_{to_currency}_{period}"
-
-        cached_data = redis_conn.get(cache_key)
-        if cached_data:
-         return Response(json.loads(cached_data))
-        
-        periods = {
-            '1w': 7,
-            '1m': 30,
-            '1y': 365,
-            '5y': 365 * 5,
-            '10y': 365 * 10
-        }
-        
-        end_date = self.get_queryset().latest('date').date
-        start_date = end_date - timedelta(days=periods[period])
-
-        historical_rates = self.get_queryset().filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('date')
-
-        serializer = HistoricalRateSerializer(
-            historical_rates, 
-            many=True,
-            context={'request': request}
+        matrix = get_rate_matrix()
+        pairs = pairs_param(request.query_params, matrix)
+
+        return self.cached_rates_response(
+            request, historical_batch_key(pairs, period),
+            lambda: historical_batch_payload(matrix, pairs, period),
         )
+    
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """Per-pair statistics over a period for ?pairs= or ?base=&targets=.
 
-        response_data = {
-        'from': from_currency,
-        'to': to_currency,
-        'period': period,
-        'data': serializer.data
-        }
+        Each pair's returns, volatility, SMA/EMA, min/max and drawdown are
+        cached on their own and spliced into one response.
+        """
+        period = period_param(request.query_params)
+        matrix = get_rate_matrix()
+        pairs = pairs_param(request.query_params, matrix)
 
-        serialized_data = json.dumps(response_data, default=str)
+        def build_body():
+            redis_conn = get_redis_connection("default")
+            stats = [
+                json.dumps(f'{from_currency}/{to_currency}').encode() + b':' + cached_or_build(
+                    redis_conn, analytics_key(from_currency, to_currency, period), 'identity',
+                    functools.partial(analytics_payload, matrix, from_currency, to_currency, period),
+                ).body
+                for from_currency, to_currency in dict.fromkeys(pairs)
+            ]
+            return f'{{"period":"{period}","pairs":{{'.encode() + b','.join(stats) + b'}}'
+
+        return self.assembled_response(request, build_body)
+
+    @action(detail=False, methods=['get'])
+    @rates_conditional
+    def movers(self, request):
+        """Top ``k`` gainers and losers against ``base`` over a 1d/1w/1m/1y horizon.
+
+        A gainer's rate quoted against the base went up, as in the
+        dashboard's trend arrows.
+        """
+        base = request.query_params.get('base', 'USD')
+        horizon = request.query_params.get('horizon', '1d')
+        if horizon not in RateMatrix.MOVER_HORIZONS:
+            raise ValidationError({'horizon': f'Must be one of {", ".join(RateMatrix.MOVER_HORIZONS)}.'})
+        try:
+            k = int(request.query_params.get('k', 5))
+        except ValueError:
+            raise ValidationError({'k': 'Must be an integer.'})
+        if not 0 < k <= MAX_MOVERS:
+            raise ValidationError({'k': f'Must be between 1 and {MAX_MOVERS}.'})
+
+        matrix = get_rate_matrix()
+        if base not in matrix.index:
+            raise ValidationError({'base': f'Unknown currency {base!r}.'})
+        latest = matrix.latest_index()
+        since, growth = matrix.growth(horizon)
+        column = matrix.index[base]
+        changes = growth / growth[column] - 1
+        changes[column] = float('nan')
+
+        values = matrix.values
+        rates = values[latest] / values[latest, column]
+        previous_rates = values[since] / values[since, column]
+
+        def movers(indices):
+            return [
+                {
+                    'currency': matrix.currencies[i],
+                    'rate': float(rates[i]),
+                    'previous_rate': float(previous_rates[i]),
+                    'change': float(changes[i]),
+                }
+                for i in indices
+            ]
+
+        gainers, losers = top_movers(changes, k)
+        return Response({
+            'base': base,
+            'horizon': horizon,
+            'date': matrix.date_at(latest),
+            'since': matrix.date_at(since),
+            'gainers': movers(gainers),
+            'losers': movers(losers),
+        })
 
-        redis_conn.setex(
-        cache_key, 
-        3600, 
-        serialized_data
-    )
-        
-        return Response(response_data)
-    
     @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """Hit, miss and eviction counters of this process's local cache"""
+        return Response({'local': local_cache().stats()})
+
+    @action(detail=False, methods=['get'])
+    @rates_conditional
     def convert(self, request):
-        """Currency conversion calculator"""
-        amount = Decimal(request.query_params.get('amount', '1.0'))
+        """Currency conversion calculator; ?as_of= converts at the last day on or before it"""
+        amount = amount_param(request.query_params)
         from_currency = request.query_params.get('from', 'USD')
         to_currency = request.query_params.get('to', 'EUR')
 
-       
-        latest_rate = self.get_queryset().latest('date')
-        
-        
-        rate = latest_rate.get_rate(from_currency, to_currency)
-        converted_amount = amount * Decimal(str(rate))
+        matrix = get_rate_matrix()
+        i = as_of_row(matrix, request.query_params)
+        if i is None:
+            snapshot = get_latest_snapshot()
+            rate, day = snapshot_rate(matrix, snapshot, from_currency, to_currency), snapshot.date
+        else:
+            rate, day = rate_as_of(matrix, i, from_currency, to_currency), matrix.date_at(i)
+        converted_amount = converted(amount, rate)
 
-        return Response({
+        data = {
             'from': from_currency,
             'to': to_currency,
             'amount': float(amount),
             'rate': float(rate),
             'result': float(converted_amount),
-            'date': latest_rate.date
-        })
+            'date': day
+        }
+        if i is not None:
+            data['as_of'] = request.query_params['as_of']
+        return Response(data)
+
+    @action(detail=False, methods=['post'])
+    def convert_batch(self, request):
+        """Convert many amounts in one request.
+
+        Takes ``{"items": [{"amount", "from", "to", "date"?}, ...]}`` and answers
+        with the same items plus ``rate``, ``result`` and ``date``, or columnar
+        ``{"amount": [...], "from": [...], "to": [...], "date": [...]?}`` and
+        answers with columns. Amounts and results are decimal strings;
+        ``places`` rounds results half-even. Items without a date use the
+        latest day; with ``"as_of": true`` a date resolves to the last stored
+        day on or before it, for dates falling on weekends and holidays.
+        """
+        data = request.data
+        if not isinstance(data, dict):
+            raise ValidationError({'items': 'Expected a JSON object.'})
+        places = data.get('places')
+        if places is not None and (
+            not isinstance(places, int) or isinstance(places, bool) or not 0 <= places <= MAX_CONVERT_PLACES
+        ):
+            raise ValidationError({'places': f'Must be an integer between 0 and {MAX_CONVERT_PLACES}.'})
+        as_of = data.get('as_of', False)
+        if not isinstance(as_of, bool):
+            raise ValidationError({'as_of': 'Must be true or false.'})
+
+        columnar = 'items' not in data
+        if columnar:
+            columns = [data.get(field) for field in ('amount', 'from', 'to')]
+            dates = data.get('date')
+            if not all(isinstance(column, list) for column in columns) or not isinstance(dates, (list, type(None))):
+                raise ValidationError({'items': 'Expected an items list or amount, from and to lists.'})
+            amounts, from_codes, to_codes = columns
+        else:
+            items = data['items']
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                raise ValidationError({'items': 'Expected a list of objects.'})
+            try:
+                amounts = [item['amount'] for item in items]
+                from_codes = [item['from'] for item in items]
+                to_codes = [item['to'] for item in items]
+            except KeyError as missing:
+                raise ValidationError({'items': f'Every item needs amount, from and to; missing {missing}.'})
+            dates = [item.get('date') for item in items]
+
+        if not 0 < len(amounts) <= MAX_CONVERT_ITEMS:
+            raise ValidationError({'items': f'Between 1 and {MAX_CONVERT_ITEMS} items are required.'})
+
+        try:
+            rates, results, row_dates = convert_batch(
+                get_rate_matrix(), amounts, from_codes, to_codes, dates, places, as_of,
+            )
+        except ConversionError as error:
+            raise ValidationError({'items': str(error)})
 
+        if columnar:
+            return Response({
+                'from': from_codes,
+                'to': to_codes,
+                'amount': [str(amount) for amount in amounts],
+                'rate': rates,
+                'result': [str(result) for result in results],
+                'date': row_dates,
+            })
+        return Response({'items': [
+            {
+                'from': from_code,
+                'to': to_code,
+                'amount': str(amount),
+                'rate': rate,
+                'result': str(result),
+                'date': row_date,
+            }
+            for from_code, to_code, amount, rate, result, row_date
+            in zip(from_codes, to_codes, amounts, rates, results, row_dates)
+        ]})
@@ -58,6 +58,8 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'exchange.middleware.ServerTimingMiddleware',
+    'exchange.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -118,6 +120,55 @@ CACHES = {
     }
 }
 
+# Cached rate payloads are evicted when the days they cover change, so the
+# TTL only bounds memory for keys nobody asks for anymore
+RATES_CACHE_TTL = 60 * 60 * 24 * 7
+
+# Misses on one key are rebuilt by a single worker holding a lock for up to
+# this many seconds; meanwhile others get the copy evicted by the last
+# invalidation, which is kept for RATES_STALE_TTL seconds
+RATES_REBUILD_LOCK_TIMEOUT = 30
+RATES_STALE_TTL = 300
+
+# XFetch early refresh aggressiveness, 0 disables it
+RATES_EARLY_REFRESH_BETA = 1.0
+
+# Connection pool of the async views' redis.asyncio client (per event loop)
+RATES_ASYNC_REDIS_POOL_KWARGS = {'max_connections': 100}
+
+# Per-process LRU in front of Redis, kept coherent over pub/sub
+RATES_LOCAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RATES_LOCAL_CACHE_TTL = 300
+
+# Historical periods warm_rate_cache builds unless told otherwise
+RATES_WARM_PERIODS = ('1w', '1m')
+
+# Cache-Control max-age sent with rate responses; ETags keep revalidation cheap
+RATES_HTTP_MAX_AGE = 300
+
+# How often each process checks for days loaded by another process
+RATE_MATRIX_POLL_SECONDS = 60
+
+# Where ingest_rates reads new days from: an ingest.RateSource subclass, and
+# the directory FileDropSource picks <YYYY-MM-DD>.json files up from
+RATES_INGEST_SOURCE = 'exchange.ingest.FileDropSource'
+RATES_INGEST_DROP_DIR = BASE_DIR / 'backend' / 'exchange' / 'rates_drop'
+
+# Send per-phase timings (cache, db, build, encode, render) in a Server-Timing
+# header; /api/metrics/ aggregates them whether or not this is on
+RATES_SERVER_TIMING = True
+
+# Sampling profiler for exchange views: requests carrying a signed
+# X-Rates-Profile header (see `manage.py profile_rates token`), plus this
+# fraction of all requests, have their stacks sampled every
+# RATES_PROFILE_INTERVAL seconds into the newest RATES_PROFILE_MAX_COUNT
+# files of RATES_PROFILE_DIR
+RATES_PROFILE_SAMPLE_RATE = 0.0
+RATES_PROFILE_INTERVAL = 0.001
+RATES_PROFILE_DIR = BASE_DIR / 'profiles'
+RATES_PROFILE_MAX_COUNT = 200
+RATES_PROFILE_TOKEN_MAX_AGE = 60 * 60
+
 
 
 # Password validation